@@ -0,0 +1 @@
+"""Vectorized data preparation for the dashboard (pandas/NumPy), and the cross-user aggregate report (analytics.aggregate)."""
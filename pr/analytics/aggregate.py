@@ -0,0 +1,291 @@
+import argparse
+import datetime
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from storage import BACKEND_ENV, create_backend
+from storage.base import GOAL_STATUSES
+from storage.mood_store import NO_TIME, time_key
+from storage.writer import atomic_write_json, read_json
+
+# Anonymized statistics across every user: moods by weekday, journaling frequency and goal completion.
+# Each user is reduced to a small partial aggregate of counts; partials add up, so users can be
+# reduced in parallel (in chunks, on a process pool) and merged. The partials are kept in a state file
+# keyed by an HMAC of the username (under a secret key kept outside the state file), with the user's
+# data_version(), so a re-run only reduces the users that changed since the last one: their old partial
+# is subtracted from the total and the new one added.
+# Every partial also counts the users behind each bucket (1 per bucket the user shows up in), and the
+# report leaves out any figure that fewer than MIN_GROUP_SIZE users contributed to.
+
+REPORT_PATH = "analytics_report.json"
+STATE_PATH = "analytics_state.json"
+KEY_PATH = "analytics.key"
+KEY_ENV = "SOULSYNC_ANALYTICS_KEY" # Hex key for user keys; if unset, one is generated into KEY_PATH
+STATE_FORMAT = 2 # Bump when partials change shape, so old state files are ignored
+MIN_GROUP_SIZE = 5 # Figures fewer users than this contributed to are left out of the report, so no one can be singled out
+CHUNKS_PER_WORKER = 4 # Users are split into more chunks than workers so a slow chunk doesn't hold up the rest
+MIN_USERS_PER_WORKER = 200 # Starting a worker process costs more than reducing this many users
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+DAY_US = 24 * 3600 * 10 ** 6
+WEEK_US = 7 * DAY_US
+EPOCH_WEEKDAY = 3 # 1970-01-01 was a Thursday
+# Journaling frequency buckets: (name, upper bound in entries a week)
+FREQUENCY_BUCKETS = (("less than weekly", 1), ("1-3 a week", 4), ("4-6 a week", 7), ("daily or more", float("inf")))
+
+
+def load_key(key_path=KEY_PATH):
+    """
+    Returns the secret key user keys are derived with: from $SOULSYNC_ANALYTICS_KEY, else from key_path
+    (created, readable only by its owner, on first use). A new key just means every user is reduced again.
+    """
+    if os.environ.get(KEY_ENV):
+        return bytes.fromhex(os.environ[KEY_ENV])
+    try:
+        with open(key_path, "r") as file:
+            return bytes.fromhex(file.read().strip())
+    except FileNotFoundError:
+        key = secrets.token_bytes(32)
+        with os.fdopen(os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as file:
+            file.write(key.hex())
+        return key
+
+
+def user_key(key, username):
+    """Anonymous key a user's partial is stored under (without the secret key it can't be matched to a username)."""
+    return hmac.new(key, username.encode("utf-8"), hashlib.sha256).hexdigest()[:24]
+
+
+def merge(total, partial, sign=1):
+    """Adds (or with sign=-1, subtracts) a partial aggregate into total, in place. Counts that reach zero are dropped."""
+    for key, value in partial.items():
+        if isinstance(value, dict):
+            merged = merge(total.get(key, {}), value, sign)
+            if merged:
+                total[key] = merged
+            else:
+                total.pop(key, None)
+        else:
+            count = total.get(key, 0) + sign * value
+            if count:
+                total[key] = count
+            else:
+                total.pop(key, None)
+    return total
+
+
+def _mood_partial(arrays):
+    """
+    {'weekday': {'0': {mood: count}}, 'weekday_users': {'0': {mood: 1}}, 'undated': n, 'undated_users': 0 or 1}
+    from a user's mood arrays (vectorized).
+    """
+    epoch_us = np.frombuffer(arrays["epoch_us"], dtype=np.int64)
+    codes = np.frombuffer(arrays["code"], dtype=np.uint8)
+    dated = epoch_us != NO_TIME
+    weekdays = (epoch_us[dated] // DAY_US + EPOCH_WEEKDAY) % 7
+    moods = arrays["moods"]
+    counts = np.bincount(weekdays * len(moods) + codes[dated], minlength=7 * len(moods)).reshape(7, len(moods))
+    undated = int(len(epoch_us) - dated.sum())
+    partial = {"weekday": {}, "weekday_users": {}, "undated": undated, "undated_users": 1 if undated else 0}
+    for day, code in zip(*np.nonzero(counts)):
+        mood = moods[code] or "(none)"
+        partial["weekday"].setdefault(str(day), {})[mood] = int(counts[day, code])
+        partial["weekday_users"].setdefault(str(day), {})[mood] = 1
+    return partial
+
+
+def _journal_partial(entries):
+    """{'weekday': {'0': n}, 'weekday_users': {'0': 1}, 'entries': n, 'frequency': {bucket: 1}} from a user's journal entries."""
+    weekday = {}
+    keys = []
+    count = 0
+    for entry in entries:
+        count += 1
+        key = time_key(entry.get("timestamp"))
+        if key != NO_TIME:
+            keys.append(key)
+            day = str((key // DAY_US + EPOCH_WEEKDAY) % 7)
+            weekday[day] = weekday.get(day, 0) + 1
+    partial = {"weekday": weekday, "weekday_users": dict.fromkeys(weekday, 1), "entries": count, "frequency": {}}
+    if keys:
+        per_week = len(keys) / max(1.0, (max(keys) - min(keys)) / WEEK_US)
+        bucket = next(name for name, bound in FREQUENCY_BUCKETS if per_week < bound)
+        partial["frequency"][bucket] = 1
+    elif count:
+        partial["frequency"]["undated"] = 1
+    else:
+        partial["frequency"]["never"] = 1
+    return partial
+
+
+def user_partial(backend, username):
+    """Reduces one user to counts that can be summed across users (archived entries included)."""
+    statuses = {}
+    for goal in backend.list_goals(username):
+        statuses[goal["status"]] = statuses.get(goal["status"], 0) + 1
+    return {
+        "users": 1,
+        "moods": _mood_partial(backend.mood_arrays(username, archived=True)),
+        "journals": _journal_partial(backend.iter_entries(username, "journals", archived=True)),
+        "goals": {"status": statuses, "status_users": dict.fromkeys(statuses, 1), "users_with_goals": 1 if statuses else 0}
+    }
+
+
+def reduce_chunk(backend_name, sqlite_path, key, usernames):
+    """
+    Worker: reduces a chunk of users. Returns ({user key: partial}, the chunk's merged partial).
+    Runs in a pool process, so it opens its own backend.
+    """
+    backend = create_backend(backend_name, sqlite_path)
+    partials = {}
+    total = {}
+    for username in usernames:
+        partial = user_partial(backend, username)
+        partials[user_key(key, username)] = partial
+        merge(total, partial)
+    return partials, total
+
+
+def _chunks(items, count):
+    size = max(1, -(-len(items) // count))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _reported(value, users):
+    """value, or None if fewer than MIN_GROUP_SIZE users contributed to it."""
+    return value if users >= MIN_GROUP_SIZE else None
+
+
+def build_report(total, run):
+    """
+    Turns the merged partials into the report: shares and rates instead of raw per-user counts.
+    Figures from fewer than MIN_GROUP_SIZE users are None; shares and rates are taken over the reported buckets
+    only, so a left-out bucket can't be worked out from the rest.
+    """
+    users = total.get("users", 0)
+    moods = total.get("moods", {})
+    moods_by_weekday = {}
+    for day, name in enumerate(WEEKDAYS):
+        counts = moods.get("weekday", {}).get(str(day), {})
+        mood_users = moods.get("weekday_users", {}).get(str(day), {})
+        reported = {mood: count for mood, count in counts.items() if mood_users.get(mood, 0) >= MIN_GROUP_SIZE}
+        logged = sum(reported.values())
+        moods_by_weekday[name] = {
+            "moods": logged if reported else None,
+            "share": {mood: round(count / logged, 4) for mood, count in sorted(reported.items())}
+        }
+    journals = total.get("journals", {})
+    frequency = journals.get("frequency", {})
+    journal_weekday = journals.get("weekday", {})
+    journal_weekday_users = journals.get("weekday_users", {})
+    goals = total.get("goals", {})
+    statuses = {
+        status: count for status, count in goals.get("status", {}).items()
+        if goals.get("status_users", {}).get(status, 0) >= MIN_GROUP_SIZE
+    }
+    active_goals = sum(statuses.values()) - statuses.get("Cancelled", 0)
+    users_with_goals = goals.get("users_with_goals", 0)
+    return {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "users": _reported(users, users),
+        "moods_by_weekday": moods_by_weekday,
+        "undated_moods": _reported(moods.get("undated", 0), moods.get("undated_users", 0)),
+        "journal_entries": _reported(journals.get("entries", 0), users - frequency.get("never", 0)),
+        "journal_entries_by_weekday": {
+            name: _reported(journal_weekday.get(str(day), 0), journal_weekday_users.get(str(day), 0))
+            for day, name in enumerate(WEEKDAYS)
+        },
+        # Users per journaling frequency
+        "journaling_frequency": {
+            name: _reported(frequency.get(name, 0), frequency.get(name, 0))
+            for name in ["never", "undated"] + [b[0] for b in FREQUENCY_BUCKETS]
+        },
+        "goals": {
+            "by_status": {status: statuses.get(status) for status in GOAL_STATUSES},
+            # Cancelled goals don't count
+            "completion_rate": round(statuses["Completed"] / active_goals, 4) if active_goals and "Completed" in statuses else None,
+            "users_with_goals": _reported(users_with_goals, users_with_goals)
+        },
+        "run": run
+    }
+
+
+def run(backend_name, sqlite_path=None, workers=None, report_path=REPORT_PATH, state_path=STATE_PATH, full=False,
+        key_path=KEY_PATH):
+    """
+    Computes the report, reducing only users whose data changed since the run that wrote state_path
+    (everyone with full=True), and writes both files. Returns the report.
+    """
+    start = time.perf_counter()
+    backend = create_backend(backend_name, sqlite_path)
+    key = load_key(key_path)
+    state = None if full else read_json(state_path)
+    if not state or state.get("format") != STATE_FORMAT or state.get("backend") != backend_name:
+        state = {"format": STATE_FORMAT, "backend": backend_name, "users": {}, "total": {}}
+    cached = state["users"]
+    total = state["total"]
+
+    versions = {}
+    changed = []
+    keys = {}
+    for username in backend.list_usernames():
+        keys[username] = user_key(key, username)
+        versions[keys[username]] = backend.data_version(username)
+        if keys[username] not in cached or cached[keys[username]]["version"] != versions[keys[username]]:
+            changed.append(username)
+    # Take out the old partials of users that changed or are gone; the changed ones are added back below
+    removed = [user for user in cached if user not in versions]
+    for user in removed + [keys[username] for username in changed if keys[username] in cached]:
+        merge(total, cached.pop(user)["partial"], sign=-1)
+
+    workers = min(workers or os.cpu_count() or 1, max(1, len(changed) // MIN_USERS_PER_WORKER))
+    if workers == 1:
+        results = [reduce_chunk(backend_name, sqlite_path, key, changed)] if changed else []
+    else:
+        # spawn, not fork: the parent has storage threads (the writer) that a forked child would inherit half-way
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            chunks = _chunks(changed, workers * CHUNKS_PER_WORKER)
+            n = len(chunks)
+            results = list(pool.map(reduce_chunk, [backend_name] * n, [sqlite_path] * n, [key] * n, chunks))
+    for partials, chunk_total in results:
+        merge(total, chunk_total)
+        for user, partial in partials.items():
+            cached[user] = {"version": versions[user], "partial": partial}
+
+    report = build_report(total, {
+        "reduced": len(changed), "reused": len(versions) - len(changed), "removed": len(removed),
+        "workers": workers, "seconds": round(time.perf_counter() - start, 3)
+    })
+    atomic_write_json(state_path, state, indent=None)
+    atomic_write_json(report_path, report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m analytics.aggregate", description="Anonymized statistics across all SoulSync users")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default=os.environ.get(BACKEND_ENV, "json"))
+    parser.add_argument("--sqlite-path", default=None, help="SQLite database file (default: $SOULSYNC_SQLITE_PATH or soulsync.db)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU; 1 reduces in this process)")
+    parser.add_argument("--report", default=REPORT_PATH, help="Where to write the report")
+    parser.add_argument("--state", default=STATE_PATH, help="Per-user partials kept between runs")
+    parser.add_argument("--key-file", default=KEY_PATH, help=f"Secret key for the state file's user keys (ignored if ${KEY_ENV} is set)")
+    parser.add_argument("--full", action="store_true", help="Reduce every user again instead of only the changed ones")
+    args = parser.parse_args()
+
+    report = run(args.backend, args.sqlite_path, args.workers, args.report, args.state, args.full, args.key_file)
+    stats = report["run"]
+    print(
+        f"Reduced {stats['reduced']} user(s) on {stats['workers']} worker(s), reused {stats['reused']}, "
+        f"dropped {stats['removed']}, in {stats['seconds']:.2f} s. Report for {report['users'] or 'too few'} user(s) written to {args.report}."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from storage.rollups import MOOD_TO_VALUE
+
+# Charts get at most this many points/bars whatever the selected time range,
+# so the payload sent to the browser stays bounded as history grows
+MAX_LINE_POINTS = 500
+MAX_BARS = 120
+
+# Coarser and coarser buckets for the distribution chart: (name, pandas period frequency)
+RESOLUTIONS = (("day", "D"), ("week", "W-SUN"), ("month", "M"), ("quarter", "Q"), ("year", "Y"))
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling: returns the indices of at most threshold points of (x, y)
+    that keep the line's visual shape (peaks and dips survive, unlike plain averaging or striding).
+    x must be sorted. The first and last points are always kept.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0 # Point picked in the previous bucket
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # Keep the point of this bucket that makes the largest triangle with a and that average
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+
+def downsample_frame(frame, column, max_points=MAX_LINE_POINTS):
+    """Downsamples a time-sorted frame with a 'Datetime' column to at most max_points rows of `column` (LTTB)."""
+    if len(frame) <= max_points:
+        return frame
+    x = frame["Datetime"].to_numpy().astype("datetime64[us]").astype(np.int64)
+    keep = lttb(x, frame[column].to_numpy(), max_points)
+    return frame.iloc[keep]
+
+
+def pick_resolution(start, end, max_bars=MAX_BARS):
+    """Returns the finest (name, frequency) in RESOLUTIONS that covers [start, end) dates in at most max_bars buckets."""
+    for name, freq in RESOLUTIONS:
+        buckets = len(pd.period_range(start, end - pd.Timedelta(days=1), freq=freq)) if end > start else 1
+        if buckets <= max_bars:
+            return name, freq
+    return RESOLUTIONS[-1]
+
+
+def daily_counts(day_rollups, start, end):
+    """Turns {'2025-07-25': {mood: count}} rollups into a day x mood frame of counts, limited to [start, end) dates."""
+    days = {day: counts for day, counts in day_rollups.items() if start.isoformat() <= day < end.isoformat()}
+    if not days:
+        return pd.DataFrame()
+    frame = pd.DataFrame.from_dict(days, orient="index").fillna(0).astype(int)
+    frame.index = pd.to_datetime(frame.index)
+    return frame.sort_index()
+
+
+def bucket_counts(counts, freq):
+    """Sums a day x mood count frame into buckets of the given period frequency (indexed by bucket start)."""
+    if counts.empty or freq == "D":
+        return counts
+    buckets = counts.groupby(counts.index.to_period(freq)).sum()
+    buckets.index = buckets.index.start_time
+    return buckets
+
+
+def average_mood(counts):
+    """Mean mood value (MOOD_TO_VALUE) of each row of a bucket x mood count frame."""
+    values = np.array([MOOD_TO_VALUE.get(mood, 0) for mood in counts.columns], dtype=np.float64)
+    totals = counts.to_numpy().sum(axis=1)
+    weighted = counts.to_numpy() @ values
+    return pd.Series(np.divide(weighted, totals, out=np.zeros_like(weighted), where=totals > 0), index=counts.index)
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from storage.mood_store import NO_TIME
+from storage.rollups import MOOD_TO_VALUE
+
+
+def mood_frame_from_arrays(arrays):
+    """
+    Loads backend.mood_arrays() ({'epoch_us', 'code', 'moods'}) into a typed, time-sorted DataFrame:
+    'Datetime' (datetime64), 'Mood' (categorical) and 'Mood Value' (int8, via MOOD_TO_VALUE, 0 if unknown).
+    The arrays are wrapped as they are, with no timestamp strings to parse; rows without a usable
+    timestamp are dropped. Returns (frame, number of malformed timestamps).
+    """
+    epoch_us = np.frombuffer(arrays["epoch_us"], dtype=np.int64) if len(arrays["epoch_us"]) else np.empty(0, dtype=np.int64)
+    codes = np.frombuffer(arrays["code"], dtype=np.uint8) if len(arrays["code"]) else np.empty(0, dtype=np.uint8)
+    moods = pd.Categorical.from_codes(codes.astype(np.int16), categories=arrays["moods"])
+    value_lut = np.array([MOOD_TO_VALUE.get(mood, 0) for mood in arrays["moods"]], dtype=np.int8)
+
+    valid = epoch_us != NO_TIME
+    frame = pd.DataFrame({
+        "Datetime": epoch_us[valid].astype("datetime64[us]"),
+        "Mood": moods[valid],
+        "Mood Value": value_lut[codes[valid]]
+    })
+    if not np.all(frame["Datetime"].to_numpy()[1:] >= frame["Datetime"].to_numpy()[:-1]):
+        frame = frame.iloc[np.argsort(frame["Datetime"].to_numpy(), kind="stable")].reset_index(drop=True)
+    return frame, int((~valid).sum())
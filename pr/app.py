@@ -1,22 +1,77 @@
 import streamlit as st
 import os # Import the os module
+import time
+import importlib
+from functools import lru_cache
 from auth import login_or_register
-from modules.goals import goal_page
-from modules.mood import mood_page
-from modules.journal import journal_page
-from modules.dashboard import dashboard_page
+from metrics import metrics
+
+PERF_PANEL_ENV = "SOULSYNC_PERF_PANEL" # Set to 1 to show the performance panel in the sidebar
+
+# Page modules are imported on first navigation, so the login screen doesn't pay for pandas and friends
+PAGES = {
+    "Goals": ("modules.goals", "goal_page"),
+    "Mood Tracker": ("modules.mood", "mood_page"),
+    "Journal": ("modules.journal", "journal_page"),
+    "Visual Dashboard": ("modules.dashboard", "dashboard_page")
+}
 
 def main():
-    """Main function to run the SoulSync application."""
-    # Load custom CSS using an absolute path for robustness
+    """Runs one rerun of the app, timing it for the performance panel and the metrics export."""
+    metrics.start_run()
+    metrics.count("reruns")
+    st.session_state.rerun_count = st.session_state.get("rerun_count", 0) + 1
+    try:
+        render_app()
+        if os.environ.get(PERF_PANEL_ENV) == "1":
+            performance_panel()
+    finally:
+        metrics.finish_run() # Also when st.rerun() cuts the run short
+        metrics.maybe_export()
+
+
+def performance_panel():
+    """Shows where the current rerun's time went, slowest step first (steps can be nested)."""
+    run = metrics.current_run()
+    elapsed_ms = (time.perf_counter() - run["started"]) * 1000
+    with st.sidebar.expander("⏱️ Performance"):
+        st.write(f"This rerun: **{elapsed_ms:.1f} ms** (rerun #{st.session_state.rerun_count} in this session)")
+        steps = sorted(run["timers"].items(), key=lambda item: -item[1][1])
+        if steps:
+            rows = [f"| {name} | {calls} | {seconds * 1000:.1f} |" for name, (calls, seconds) in steps]
+            st.markdown("| Step | Calls | ms |\n|---|---:|---:|\n" + "\n".join(rows))
+        for name, value in sorted(run["counters"].items()):
+            st.write(f"{name}: {value:,}")
+
+
+def load_page(name):
+    """Returns a page's function, importing its module the first time the page is shown."""
+    module_name, function_name = PAGES[name]
+    with metrics.timer("page_import"):
+        return getattr(importlib.import_module(module_name), function_name)
+
+
+@lru_cache(maxsize=1)
+def load_css():
+    """Reads assets/style.css once per process. Returns None if it is missing."""
     # os.path.dirname(__file__) gets the directory of the current script (app.py)
     # os.path.join constructs a path safely across different operating systems
     css_file_path = os.path.join(os.path.dirname(__file__), "assets", "style.css")
     try:
         with open(css_file_path) as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+            return f.read()
     except FileNotFoundError:
-        st.error(f"Error: style.css not found at {css_file_path}. Please ensure it's in the 'assets' folder.")
+        return None
+
+
+def render_app():
+    """Main function to run the SoulSync application."""
+    # Load custom CSS (read from disk once, not on every rerun)
+    css = load_css()
+    if css is not None:
+        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+    else:
+        st.error("Error: style.css not found in the 'assets' folder next to app.py.")
 
 
     # Check if user is already logged in from session state
@@ -43,8 +98,8 @@ def main():
         # Sidebar navigation
         app_menu = st.sidebar.radio(
             "Navigation",
-            ["Goals", "Mood Tracker", "Journal", "Visual Dashboard"],
-            index=["Goals", "Mood Tracker", "Journal", "Visual Dashboard"].index(st.session_state.current_page)
+            list(PAGES),
+            index=list(PAGES).index(st.session_state.current_page)
         )
         st.session_state.current_page = app_menu # Update current page in session state
 
@@ -55,14 +110,7 @@ def main():
             st.rerun() # Rerun to go back to login page
         
         # Display the selected page
-        if st.session_state.current_page == "Goals":
-            goal_page(user)
-        elif st.session_state.current_page == "Mood Tracker":
-            mood_page(user)
-        elif st.session_state.current_page == "Journal":
-            journal_page(user)
-        elif st.session_state.current_page == "Visual Dashboard":
-            dashboard_page(user)
+        load_page(st.session_state.current_page)(user)
 
 
 if __name__ == "__main__":
@@ -1,37 +1,71 @@
 import streamlit as st
-import json
-import os
 
-USER_DATA_FILE = "users.json"
+from metrics import metrics
+from storage import get_backend
+
+USER_COLLECTIONS = ("goals", "moods", "journals") # Written separately by save_users, and only when they changed
+PROFILE_FIELDS = ("password", "email")
+
+
+def save_collection(backend, username, collection, before, after):
+    """
+    Persists the change from before to after of one of a user's collections, writing as little as possible:
+    only added, changed and removed goals, and only the new entries when moods/journals were just added to.
+    Returns whether anything was written.
+    """
+    if before == after:
+        return False
+    if collection == "goals":
+        old = {goal["id"]: goal for goal in before}
+        kept_ids = {goal["id"] for goal in after}
+        for goal_id in old:
+            if goal_id not in kept_ids:
+                backend.delete_goal(username, goal_id)
+        for goal in after:
+            if old.get(goal["id"]) != goal:
+                backend.upsert_goal(username, goal)
+    elif after[:len(before)] == before:
+        backend.append_entries(username, collection, after[len(before):])
+    else:
+        backend.replace_entries(username, collection, after)
+    return True
+
 
 def load_users():
-    """Loads user data from the JSON file."""
-    if os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, "r") as file:
-            try:
-                users = json.load(file)
-                # Ensure each user has 'goals', 'moods', and 'journals' keys
-                for user_data in users.values():
-                    if "goals" not in user_data:
-                        user_data["goals"] = []
-                    if "moods" not in user_data:
-                        user_data["moods"] = []
-                    if "journals" not in user_data: # Add journals initialization
-                        user_data["journals"] = []
-                return users
-            except json.JSONDecodeError:
-                return {}
-    return {}
+    """
+    Loads every user's data from the storage backend.
+    Pages should use get_backend() instead; this is only for tools that need the whole user base.
+    """
+    backend = get_backend()
+    users = {}
+    with metrics.timer("load_users"):
+        for username in backend.list_usernames():
+            user_data = backend.get_user(username)
+            if user_data is not None:
+                users[username] = user_data
+    return users
 
 def save_users(users):
-    """Saves user data to the JSON file."""
-    with open(USER_DATA_FILE, "w") as file:
-        json.dump(users, file, indent=4)
+    """
+    Saves every user in the given dict to the storage backend. Each user's password and email, goals, moods
+    and journals are compared with what is stored, and only the parts that differ are written (see save_collection).
+    """
+    backend = get_backend()
+    with metrics.timer("save_users"):
+        for username, user_data in users.items():
+            if not backend.user_exists(username):
+                backend.create_user(username, user_data.get("password", ""), user_data.get("email", ""))
+            stored = backend.get_user(username) or {} # The backend's own copy, so in-place edits to user_data show up as changes
+            profile = {field: user_data.get(field, "") for field in PROFILE_FIELDS}
+            if profile != {field: stored.get(field, "") for field in PROFILE_FIELDS}:
+                backend.update_profile(username, profile["password"], profile["email"])
+            for collection in USER_COLLECTIONS:
+                if save_collection(backend, username, collection, stored.get(collection, []), user_data.get(collection, [])):
+                    metrics.count("collections_saved")
 
 def login_or_register():
     """Handles user login and registration."""
     st.title("🔐 SoulSync Login")
-    users = load_users()
 
     # Use session state to manage the current view (Login/Register)
     if "login_menu" not in st.session_state:
@@ -50,7 +84,8 @@ def login_or_register():
         password = st.text_input("Password", type="password", key="login_password").strip()
 
         if st.button("Login", key="login_button"):
-            if username in users and users[username]["password"] == password:
+            profile = get_backend().get_profile(username) if username else None # Only this user's profile is read
+            if profile is not None and profile["password"] == password:
                 st.success(f"Welcome back, {username}!")
                 user = username
                 st.session_state.logged_in_user = username # Store logged-in user in session state
@@ -64,20 +99,19 @@ def login_or_register():
         email = st.text_input("Email", key="register_email").strip()
 
         if st.button("Register", key="register_button"):
-            if new_username in users:
+            if not new_username:
+                st.error("Username cannot be empty.")
+            elif get_backend().user_exists(new_username):
                 st.warning("Username already exists.")
             else:
-                users[new_username] = {
-                    "password": new_password,
-                    "email": email,
-                    "goals": [],
-                    "moods": [],
-                    "journals": [] # Initialize an empty list for journal entries for new users
-                }
-                save_users(users)
-                st.success("Account created! Please log in.")
-                st.session_state.login_menu = "Login" # Switch to login after registration
-                st.rerun() # Rerun to show login form
+                try:
+                    get_backend().create_user(new_username, new_password, email) # Goals, moods, and journals start empty
+                except ValueError:
+                    st.warning("Username already exists.") # Someone registered it in the meantime
+                else:
+                    st.success("Account created! Please log in.")
+                    st.session_state.login_menu = "Login" # Switch to login after registration
+                    st.rerun() # Rerun to show login form
 
     return user
 
@@ -0,0 +1 @@
+"""Benchmarks for SoulSync. Run from the app directory, e.g. python -m bench.mood_frame"""
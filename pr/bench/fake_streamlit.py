@@ -0,0 +1,131 @@
+import datetime
+import sys
+import types
+
+
+class RerunRequested(Exception):
+    """Raised by st.rerun(), which ends the current script run just like in Streamlit."""
+
+
+class SessionState(dict):
+    """dict with attribute access, like st.session_state."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        del self[name]
+
+
+class _Block:
+    """Stands in for columns, forms, containers and expanders."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeStreamlit(types.ModuleType):
+    """
+    Headless stand-in for the streamlit module, for benchmarks.
+    Widgets return their default value unless set in `values` (by key or label);
+    buttons return True only if their key or label is in `clicked`. Output calls just count elements,
+    so timings cover the app's own work, not Streamlit's rendering.
+    """
+
+    def __init__(self):
+        super().__init__("streamlit")
+        self.sidebar = self # Sidebar widgets behave like the main area ones
+        self.reset()
+
+    def reset(self, values=None, clicked=(), session_state=None):
+        self.values = dict(values or {})
+        self.clicked = set(clicked)
+        self.session_state = SessionState(session_state or {})
+        self.elements = 0
+
+    def _widget(self, label, key, default):
+        self.elements += 1
+        for name in (key, label):
+            if name in self.values:
+                return self.values[name]
+        return default
+
+    def _output(self, *args, **kwargs):
+        self.elements += 1
+
+    write = markdown = title = header = subheader = caption = _output
+    info = success = warning = error = _output
+    line_chart = bar_chart = _output
+
+    def text_input(self, label, value="", key=None, **kwargs):
+        return self._widget(label, key, value)
+
+    def text_area(self, label, value="", key=None, **kwargs):
+        return self._widget(label, key, value)
+
+    def checkbox(self, label, value=False, key=None, **kwargs):
+        return self._widget(label, key, value)
+
+    def selectbox(self, label, options, index=0, key=None, **kwargs):
+        options = list(options)
+        return self._widget(label, key, options[index] if options and index is not None else None)
+
+    def radio(self, label, options, index=0, key=None, **kwargs):
+        return self.selectbox(label, options, index, key)
+
+    def multiselect(self, label, options, default=None, key=None, **kwargs):
+        return self._widget(label, key, list(default or []))
+
+    def slider(self, label, min_value=None, max_value=None, value=None, key=None, **kwargs):
+        return self._widget(label, key, min_value if value is None else value)
+
+    def number_input(self, label, min_value=None, max_value=None, value=None, key=None, **kwargs):
+        return self._widget(label, key, min_value if value is None else value)
+
+    def date_input(self, label, value="today", key=None, **kwargs):
+        return self._widget(label, key, datetime.date.today() if value == "today" else value)
+
+    def button(self, label, key=None, **kwargs):
+        self.elements += 1
+        return (key or label) in self.clicked
+
+    form_submit_button = button
+
+    def columns(self, spec, **kwargs):
+        count = spec if isinstance(spec, int) else len(spec)
+        return [_Block() for _ in range(count)]
+
+    def form(self, *args, **kwargs):
+        return _Block()
+
+    container = expander = form
+
+    def fragment(self, func=None, run_every=None):
+        if func is None:
+            return lambda func: func # Used as @st.fragment(run_every=...)
+        return func
+
+    def write_stream(self, stream):
+        self.elements += 1
+        return "".join(str(chunk) for chunk in stream)
+
+    def rerun(self):
+        raise RerunRequested()
+
+
+def install():
+    """Registers a FakeStreamlit as the streamlit module. Call before importing the app's pages."""
+    fake = sys.modules.get("streamlit")
+    if not isinstance(fake, FakeStreamlit):
+        fake = FakeStreamlit()
+        sys.modules["streamlit"] = fake
+    return fake
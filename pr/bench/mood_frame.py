@@ -0,0 +1,77 @@
+import argparse
+import datetime
+import random
+import time
+
+import pandas as pd
+
+from analytics.downsample import downsample_frame
+from analytics.mood_frame import mood_frame_from_arrays
+from storage.mood_store import MOOD_EMOJIS, from_entries
+from storage.rollups import MOOD_TO_VALUE
+
+
+def synthetic_entries(count, malformed_ratio=0.001, seed=0):
+    """Builds mood entries spanning a few years of logging, with a sprinkling of bad timestamps."""
+    rng = random.Random(seed)
+    start = datetime.datetime(2022, 1, 1)
+    moods = list(MOOD_EMOJIS)
+    entries = []
+    for _ in range(count):
+        if rng.random() < malformed_ratio:
+            timestamp = "not-a-timestamp"
+        else:
+            timestamp = (start + datetime.timedelta(seconds=rng.randrange(3 * 365 * 86400))).isoformat()
+        mood = rng.choice(moods)
+        entries.append({"timestamp": timestamp, "mood_text": mood, "mood_emoji": MOOD_EMOJIS[mood], "description": ""})
+    return entries
+
+
+def legacy_pipeline(entries):
+    """The dashboard's original per-entry loop and row-wise apply over entry dicts, for comparison."""
+    mood_data = []
+    for entry in entries:
+        try:
+            timestamp_dt = datetime.datetime.fromisoformat(entry["timestamp"])
+        except ValueError:
+            continue
+        mood_value = MOOD_TO_VALUE.get(entry["mood_text"], 0)
+        mood_data.append({"Date": timestamp_dt.date(), "Time": timestamp_dt.time(), "Mood Value": mood_value, "Mood": entry["mood_text"]})
+    df_moods = pd.DataFrame(mood_data)
+    df_moods["Datetime"] = df_moods.apply(lambda row: datetime.datetime.combine(row["Date"], row["Time"]), axis=1)
+    return df_moods.sort_values(by="Datetime")
+
+
+def dashboard_pipeline(moods):
+    """What the dashboard does for "Show every logged mood": mood arrays -> typed frame -> downsampled line."""
+    frame, _ = mood_frame_from_arrays(moods.coded())
+    return downsample_frame(frame, "Mood Value")
+
+
+def best_of(fn, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the legacy per-entry mood frame with the dashboard's columnar one")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    entries = synthetic_entries(args.entries)
+    moods = from_entries(entries) # The same moods as loaded from a mood store
+    legacy = best_of(legacy_pipeline, entries, args.repeat)
+    columnar = best_of(dashboard_pipeline, moods, args.repeat)
+    print(f"entries:    {args.entries}")
+    print(f"legacy:     {legacy * 1000:9.1f} ms")
+    print(f"dashboard:  {columnar * 1000:9.1f} ms")
+    print(f"speedup:    {legacy / columnar:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.fake_streamlit import RerunRequested, install
+
+st = install() # Must happen before the pages import streamlit
+
+from auth import load_users, login_or_register, save_users
+from bench.synthetic import generate_users
+from modules.dashboard import dashboard_page
+from modules.goals import goal_page
+from modules.journal import journal_page
+from modules.mood import mood_page
+from storage import BACKEND_ENV, copy_users, create_backend, get_backend
+
+# p95 targets, checked on every run (the exit status is 1 if one is missed, or if any call raised).
+# Page renders are per rerun; load_users/save_users touch every user, so theirs are per 1000 users.
+TARGET_P95_MS = {
+    "login_or_register": 50,
+    "goal_page": 50,
+    "mood_page": 50,
+    "journal_page": 50,
+    "dashboard_page": 100
+}
+TARGET_P95_MS_PER_1000_USERS = {
+    "load_users": 2000,
+    "save_users": 1000
+}
+
+PAGES = {
+    "goal_page": goal_page,
+    "mood_page": mood_page,
+    "journal_page": journal_page,
+    "dashboard_page": dashboard_page
+}
+
+
+def render(page, username):
+    """Runs one page for one user the way a Streamlit rerun would."""
+    st.reset(session_state={"logged_in_user": username})
+    try:
+        page(username)
+    except RerunRequested:
+        pass
+
+
+def login(username):
+    st.reset(values={"login_username": username, "login_password": "password"}, clicked={"login_button"})
+    try:
+        assert login_or_register() == username, f"login failed for {username}"
+    except RerunRequested:
+        pass
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def measure(name, calls):
+    """Times each call, then runs the first one again under tracemalloc for its peak memory."""
+    latencies = []
+    errors = []
+    for call in calls:
+        start = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            errors.append(repr(e))
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        calls[0]()
+    except Exception:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies.sort()
+    return {
+        "name": name,
+        "runs": len(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "peak_mb": peak / 1024 / 1024,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None
+    }
+
+
+def target_ms(name, users):
+    if name in TARGET_P95_MS_PER_1000_USERS:
+        return TARGET_P95_MS_PER_1000_USERS[name] * max(1.0, users / 1000)
+    return TARGET_P95_MS[name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render every page headlessly against a synthetic dataset")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--moods", type=int, default=100, help="Mood entries per user")
+    parser.add_argument("--journals", type=int, default=20, help="Journal entries per user")
+    parser.add_argument("--goals", type=int, default=5, help="Goals per user")
+    parser.add_argument("--malformed", type=float, default=0.001, help="Fraction of entries with unparseable timestamps")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--samples", type=int, default=50, help="Users each page is rendered for")
+    parser.add_argument("--repeat", type=int, default=3, help="Renders per sampled user (the first one is cold)")
+    parser.add_argument("--bulk-repeat", type=int, default=1, help="Runs of load_users/save_users")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated data directory afterwards")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    workdir = tempfile.mkdtemp(prefix="soulsync-bench-")
+    os.chdir(workdir) # The stores use paths relative to the app's working directory
+    os.environ[BACKEND_ENV] = args.backend
+
+    start = time.perf_counter()
+    users = generate_users(args.users, args.moods, args.journals, args.goals, args.malformed)
+    with open("users.json", "w") as file:
+        json.dump(users, file)
+    del users
+    generated = time.perf_counter() - start
+
+    start = time.perf_counter()
+    backend = get_backend()
+    if args.backend == "sqlite":
+        copy_users(create_backend("json"), backend) # Migrates users.json into shards on the way
+    else:
+        backend.list_usernames() # Triggers the users.json migration
+    loaded = time.perf_counter() - start
+
+    rng = random.Random(0)
+    sample = rng.sample(backend.list_usernames(), min(args.samples, args.users))
+    results = [measure("login_or_register", [lambda u=u: login(u) for u in sample for _ in range(args.repeat)])]
+    for name, page in PAGES.items():
+        results.append(measure(name, [lambda p=page, u=u: render(p, u) for u in sample for _ in range(args.repeat)]))
+    results.append(measure("load_users", [load_users] * args.bulk_repeat))
+    snapshot = load_users()
+    results.append(measure("save_users", [lambda: save_users(snapshot)] * args.bulk_repeat))
+
+    entries = args.users * (args.moods + args.journals)
+    print(f"dataset:  {args.users} users, {entries} entries, {args.backend} backend" + (f" (kept in {workdir})" if args.keep else ""))
+    print(f"setup:    generated in {generated:.1f} s, loaded into storage in {loaded:.1f} s")
+    print(f"{'operation':<18} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak MB':>8} {'errors':>6} {'target':>9}")
+    failures = []
+    for result in results:
+        result["target_p95_ms"] = target_ms(result["name"], args.users)
+        print(
+            f"{result['name']:<18} {result['runs']:>5} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+            f"{result['p99_ms']:>9.2f} {result['max_ms']:>9.2f} {result['peak_mb']:>8.1f} {result['errors']:>6} "
+            f"{result['target_p95_ms']:>9.0f}"
+        )
+        if result["first_error"]:
+            print(f"    first error: {result['first_error']}")
+        if result["p95_ms"] > result["target_p95_ms"]:
+            failures.append(f"{result['name']} p95 {result['p95_ms']:.1f} ms > {result['target_p95_ms']:.0f} ms")
+        if result["errors"]:
+            failures.append(f"{result['name']} raised {result['errors']} time(s)")
+    if json_path:
+        with open(json_path, "w") as file:
+            json.dump({"args": vars(args), "results": results, "failures": failures}, file, indent=2)
+    if not args.keep:
+        os.chdir(os.path.dirname(workdir))
+        shutil.rmtree(workdir, ignore_errors=True)
+    print("FAIL: " + "; ".join(failures) if failures else "PASS: every operation within its target")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
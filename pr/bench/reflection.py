@@ -0,0 +1,82 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from reflection import ReflectionCache, ReflectionService, StubClient
+from reflection_jobs import RateLimiter, ReflectionQueue
+
+
+class _SavedReflections:
+    """Just enough of a storage backend to receive the background queue's results."""
+
+    def __init__(self):
+        self.saved = {}
+
+    def save_reflection(self, username, entry_id, text, created_at):
+        self.saved[(username, entry_id)] = text
+
+
+def bench_queue(args, service):
+    """Submits --requests saved entries to the background queue and waits for all of them."""
+    backend = _SavedReflections()
+    jobs = ReflectionQueue(
+        service=service, workers=args.workers, limiter=RateLimiter(rate=args.rate, burst=args.workers),
+        max_pending=args.requests, max_pending_per_user=args.requests
+    )
+    start = time.perf_counter()
+    for i in range(args.requests):
+        jobs.submit(backend, "bench", {"id": f"entry{i}", "timestamp": "2025-01-01T00:00:00", "content": f"Saved entry {i}"})
+    submitted = time.perf_counter() - start
+    jobs.join()
+    elapsed = time.perf_counter() - start
+    jobs.shutdown()
+    stats = jobs.stats()
+    print(f"queued:    {args.requests} saved entries in {submitted * 1000:.1f} ms ({args.workers} workers, {args.rate:g} calls/s)")
+    print(f"completed: {stats['completed']}, failed: {stats['failed']}, reflections saved: {len(backend.saved)}")
+    print(f"wall time: {elapsed:.2f} s ({stats['completed'] / elapsed:.1f} reflections/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline hit-rate/latency benchmark for AI reflections")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=50, help="Number of distinct journal texts")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated API latency in seconds")
+    parser.add_argument("--queue", action="store_true", help="Benchmark the background queue for saved entries instead")
+    parser.add_argument("--workers", type=int, default=4, help="Queue worker threads (with --queue)")
+    parser.add_argument("--rate", type=float, default=0, help="Queue API calls per second, 0 for no limit (with --queue)")
+    args = parser.parse_args()
+
+    stub = StubClient(latency=args.latency)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ReflectionCache(path=os.path.join(directory, "cache.sqlite"))
+        service = ReflectionService(client_factory=lambda: stub, cache=cache)
+        if args.queue:
+            bench_queue(args, service)
+            return
+        rng = random.Random(0)
+        texts = [f"Journal entry number {rng.randrange(args.distinct)}" for _ in range(args.requests)]
+
+        def timed(text):
+            start = time.perf_counter()
+            service.reflect(text)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            latencies = sorted(pool.map(timed, texts))
+        elapsed = time.perf_counter() - start
+
+    stats = service.stats()
+    print(f"requests:  {stats['requests']} ({args.distinct} distinct, {args.threads} threads)")
+    print(f"API calls: {stub.calls}")
+    print(f"hit rate:  {stats['hit_rate']:.1%} (cache hits {stats['hits']}, joined in-flight {stats['joined']})")
+    print(f"latency:   p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+    print(f"wall time: {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "groq") # Only the pages that need them should load these
+
+# Cold-start targets, checked on every run (the exit status is 1 if one is missed)
+TARGET_APP_IMPORT_MS = 50 # Importing app.py's own modules, with streamlit already imported
+TARGET_LOGIN_RENDER_MS = 100 # Importing app.py and rendering the login screen (stubbed streamlit)
+
+# Each probe runs in a fresh interpreter, so nothing is imported or cached yet
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+imported_streamlit = time.perf_counter()
+import app
+done = time.perf_counter()
+print(json.dumps({
+    "streamlit_ms": (imported_streamlit - start) * 1000,
+    "app_ms": (done - imported_streamlit) * 1000,
+    "heavy": [name for name in HEAVY_MODULES if name in sys.modules]
+}))
+"""
+
+RENDER_PROBE = """
+import json, sys, time
+from bench.fake_streamlit import RerunRequested, install
+st = install()
+timings = {}
+heavy = {}
+start = time.perf_counter()
+import app
+for page in [None] + list(PAGES):
+    st.reset(session_state={"logged_in_user": "user00000", "current_page": page} if page else {})
+    page_start = time.perf_counter()
+    try:
+        app.main()
+    except RerunRequested:
+        pass
+    timings[page or "login"] = (time.perf_counter() - (start if page is None else page_start)) * 1000
+    heavy[page or "login"] = [name for name in HEAVY_MODULES if name in sys.modules]
+print(json.dumps({"timings": timings, "heavy": heavy}))
+"""
+
+PAGES = ("Goals", "Mood Tracker", "Journal", "Visual Dashboard")
+
+
+def run_probe(code, workdir):
+    prelude = f"HEAVY_MODULES = {HEAVY_MODULES!r}\nPAGES = {PAGES!r}\n"
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    result = subprocess.run(
+        [sys.executable, "-c", prelude + code], cwd=workdir, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(workdir, top):
+    """Returns the modules with the largest cumulative import time when importing app (python -X importtime)."""
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=workdir, env=env,
+        capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import and first-render times against the targets")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement (the median is reported)")
+    parser.add_argument("--profile", type=int, default=15, help="Show the N slowest imports (0 to skip)")
+    args = parser.parse_args()
+
+    from bench.synthetic import generate_users
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "users.json"), "w") as file:
+            json.dump(generate_users(users=5), file)
+
+        imports = [run_probe(IMPORT_PROBE, workdir) for _ in range(args.runs)]
+        renders = [run_probe(RENDER_PROBE, workdir) for _ in range(args.runs)]
+        profile = import_profile(workdir, args.profile) if args.profile else []
+
+    app_ms = statistics.median(run["app_ms"] for run in imports)
+    streamlit_ms = statistics.median(run["streamlit_ms"] for run in imports)
+    print(f"import streamlit:           {streamlit_ms:8.1f} ms")
+    print(f"import app (own modules):   {app_ms:8.1f} ms  (target {TARGET_APP_IMPORT_MS} ms)")
+    print(f"heavy modules after import: {', '.join(imports[-1]['heavy']) or 'none'}")
+    print("first render (stubbed streamlit, includes importing the page):")
+    for page in ["login"] + list(PAGES):
+        page_ms = statistics.median(run["timings"][page] for run in renders)
+        target = f"  (target {TARGET_LOGIN_RENDER_MS} ms)" if page == "login" else ""
+        print(f"  {page:<24} {page_ms:8.1f} ms  heavy loaded: {', '.join(renders[-1]['heavy'][page]) or 'none'}{target}")
+    if profile:
+        print("slowest imports (cumulative ms, self ms):")
+        for cumulative, own, name in profile:
+            print(f"  {cumulative:8.1f} {own:8.1f}  {name}")
+
+    login_ms = statistics.median(run["timings"]["login"] for run in renders)
+    failures = []
+    if app_ms > TARGET_APP_IMPORT_MS:
+        failures.append(f"app import {app_ms:.1f} ms > {TARGET_APP_IMPORT_MS} ms")
+    if login_ms > TARGET_LOGIN_RENDER_MS:
+        failures.append(f"login render {login_ms:.1f} ms > {TARGET_LOGIN_RENDER_MS} ms")
+    if renders[-1]["heavy"]["login"]:
+        failures.append(f"login screen loaded {', '.join(renders[-1]['heavy']['login'])}")
+    print("FAIL: " + "; ".join(failures) if failures else "PASS: startup within targets")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import datetime
+import json
+import random
+import uuid
+
+from storage.base import GOAL_STATUSES
+from storage.mood_store import MOOD_EMOJIS
+
+WORDS = (
+    "work deadline exam family friends sleep walk gym coffee rain project meeting partner "
+    "weekend travel dinner music anxiety calm tired grateful lonely progress garden movie"
+).split()
+MALFORMED_TIMESTAMPS = ("not-a-timestamp", "2024-02-30T10:00:00", "")
+
+
+def _timestamps(rng, count, start, span_days, malformed_ratio):
+    """Returns count ISO timestamps in order, with a fraction replaced by unparseable ones."""
+    seconds = sorted(rng.randrange(span_days * 86400) for _ in range(count))
+    timestamps = [(start + datetime.timedelta(seconds=s)).isoformat() for s in seconds]
+    for i in range(count):
+        if rng.random() < malformed_ratio:
+            timestamps[i] = rng.choice(MALFORMED_TIMESTAMPS)
+    return timestamps
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _mood(rng, timestamp):
+    mood = rng.choice(list(MOOD_EMOJIS))
+    return {"timestamp": timestamp, "mood_text": mood, "mood_emoji": MOOD_EMOJIS[mood], "description": _text(rng, rng.randrange(0, 15))}
+
+
+def generate_user(rng, moods, journals, goals, malformed_ratio=0.0, span_days=730):
+    """Returns one users.json-shaped record with the given numbers of entries."""
+    start = datetime.datetime(2023, 1, 1)
+    return {
+        "password": "password",
+        "email": "user@example.com",
+        "goals": [
+            {
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "title": _text(rng, 3).capitalize(),
+                "description": _text(rng, 12),
+                "due_date": (start + datetime.timedelta(days=rng.randrange(span_days))).date().isoformat() if rng.random() < 0.7 else None,
+                "status": rng.choice(GOAL_STATUSES)
+            }
+            for _ in range(goals)
+        ],
+        "moods": [_mood(rng, timestamp) for timestamp in _timestamps(rng, moods, start, span_days, malformed_ratio)],
+        "journals": [
+            {
+                "id": uuid.UUID(int=rng.getrandbits(128)).hex,
+                "timestamp": timestamp,
+                "content": _text(rng, rng.randrange(20, 200))
+            }
+            for timestamp in _timestamps(rng, journals, start, span_days, malformed_ratio)
+        ]
+    }
+
+
+def generate_users(users=100, moods=100, journals=20, goals=5, malformed_ratio=0.001, seed=0):
+    """Returns a users.json-shaped dict of synthetic users named user00000, user00001, ..."""
+    rng = random.Random(seed)
+    return {
+        f"user{i:05d}": generate_user(rng, moods, journals, goals, malformed_ratio)
+        for i in range(users)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic users.json for benchmarks")
+    parser.add_argument("output", help="Path of the users.json to write")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--moods", type=int, default=100, help="Mood entries per user")
+    parser.add_argument("--journals", type=int, default=20, help="Journal entries per user")
+    parser.add_argument("--goals", type=int, default=5, help="Goals per user")
+    parser.add_argument("--malformed", type=float, default=0.001, help="Fraction of entries with unparseable timestamps")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    users = generate_users(args.users, args.moods, args.journals, args.goals, args.malformed, args.seed)
+    with open(args.output, "w") as file:
+        json.dump(users, file)
+    print(f"Wrote {args.users} user(s) to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import math
+import threading
+from collections import Counter
+
+from search import entry_id, tokenize
+from storage.cache import UserObjectCache
+from storage.rollups import bucket_keys
+
+MAX_CACHED_INSIGHTS = 32 # Users whose journal insights are kept in memory at once
+MIN_TERM_LENGTH = 3
+MIN_SUPPORT = 2 # A term must appear with a mood at least this often to count as a trigger
+
+# Common English words that say nothing about what an entry is about
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before being
+below between both but by can can't cannot could couldn't did didn't do does doesn't doing don't down
+during each even ever every few for from further get got had hadn't has hasn't have haven't having he
+he'd he'll he's her here here's hers herself him himself his how how's i i'd i'll i'm i've if in into
+is isn't it it's its itself just let's like me more most much mustn't my myself no nor not now of off
+on once only or other ought our ours ourselves out over own really same shan't she she'd she'll she's
+should shouldn't so some still such than that that's the their theirs them themselves then there
+there's these they they'd they'll they're they've thing things think this those through to today too
+under until up very was wasn't we we'd we'll we're we've were weren't what what's when when's where
+where's which while who who's whom why why's will with won't would wouldn't yet you you'd you'll you're
+you've your yours yourself yourselves feel feeling felt day
+""".split())
+
+
+def content_terms(text):
+    """Returns the meaningful words of a text (no stopwords, numbers or very short words) with their counts."""
+    return Counter(
+        token for token in tokenize(text)
+        if len(token) >= MIN_TERM_LENGTH and token not in STOPWORDS and not token.isdigit()
+    )
+
+
+def entry_day(entry):
+    """Returns the day ('2025-07-25') an entry was written, or None if its timestamp can't be parsed."""
+    keys = bucket_keys(entry.get("timestamp"))
+    return keys["day"] if keys else None
+
+
+class JournalInsights:
+    """
+    Running statistics over one user's journals and moods: how often each term is used and
+    how often it shows up on the same day as each mood. Entries are folded in one at a time,
+    so a new journal entry or mood only touches its own terms and day.
+    Themes and triggers are derived from the statistics on demand and cached until they change.
+    """
+
+    def __init__(self):
+        self.n_docs = 0
+        self.doc_freq = Counter() # term -> entries using it
+        self.term_freq = Counter() # term -> total uses
+        self.day_terms = {} # day -> Counter of term -> entries that day using it
+        self.day_moods = {} # day -> Counter of mood -> moods logged that day
+        self.mood_counts = Counter() # mood -> moods logged (any day)
+        self.cooccurrence = {} # term -> Counter of mood -> (entry, mood) pairs on the same day
+        self._seen = set() # Ids of folded journal entries, so an entry is never counted twice
+        self._lock = threading.Lock() # Sessions read while others save entries
+        self._themes = None
+        self._triggers = None
+
+    def add_journal(self, entry):
+        with self._lock:
+            doc_id = entry_id(entry)
+            if doc_id in self._seen:
+                return
+            self._seen.add(doc_id)
+            terms = content_terms(entry.get("content", ""))
+            self.n_docs += 1
+            self.doc_freq.update(terms.keys())
+            self.term_freq.update(terms)
+            day = entry_day(entry)
+            if day is not None:
+                self.day_terms.setdefault(day, Counter()).update(terms.keys())
+                moods = self.day_moods.get(day)
+                if moods:
+                    for term in terms:
+                        self.cooccurrence.setdefault(term, Counter()).update(moods)
+            self._themes = self._triggers = None
+
+    def add_mood(self, entry):
+        with self._lock:
+            mood = entry.get("mood_text", "")
+            if not mood:
+                return
+            self.mood_counts[mood] += 1
+            day = entry_day(entry)
+            if day is not None:
+                self.day_moods.setdefault(day, Counter())[mood] += 1
+                for term, count in self.day_terms.get(day, {}).items():
+                    self.cooccurrence.setdefault(term, Counter())[mood] += count
+            self._themes = self._triggers = None
+
+    def themes(self, limit=10):
+        """
+        Returns the user's recurring themes as (term, score) pairs, best first.
+        The score is the term's TF-IDF summed over all entries, so words used often
+        but not in every single entry rank highest.
+        """
+        with self._lock:
+            if self._themes is None:
+                min_docs = min(MIN_SUPPORT, self.n_docs)
+                scores = {
+                    term: self.term_freq[term] * math.log(1 + self.n_docs / df)
+                    for term, df in self.doc_freq.items() if df >= min_docs
+                }
+                self._themes = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            return self._themes[:limit]
+
+    def triggers(self, limit=5):
+        """
+        Returns {mood: [(term, times together, lift), ...]} for each logged mood.
+        Lift is how much more likely the mood is on days the term is written about than on
+        any day (above 1 means they go together); only terms seen with the mood
+        at least MIN_SUPPORT times are listed.
+        """
+        with self._lock:
+            if self._triggers is None:
+                total_moods = sum(self.mood_counts.values())
+                triggers = {}
+                for term, moods in self.cooccurrence.items():
+                    term_total = sum(moods.values())
+                    for mood, together in moods.items():
+                        if together < MIN_SUPPORT:
+                            continue
+                        lift = (together / term_total) / (self.mood_counts[mood] / total_moods)
+                        if lift > 1:
+                            triggers.setdefault(mood, []).append((term, together, lift))
+                for pairs in triggers.values():
+                    pairs.sort(key=lambda pair: (-pair[2], -pair[1], pair[0]))
+                self._triggers = triggers
+            return {mood: pairs[:limit] for mood, pairs in self._triggers.items()}
+
+
+_insights = UserObjectCache(MAX_CACHED_INSIGHTS)
+
+
+def insights_version(backend, username):
+    """Returns the version token the user's insights are stamped with."""
+    return (backend.journal_version(username), backend.mood_version(username))
+
+
+def get_insights(backend, username):
+    """
+    Returns the user's journal insights, shared by every session in the process.
+    They are built from the backend on first use and rebuilt only if the journals or moods changed behind their back.
+    """
+    def build():
+        insights = JournalInsights()
+        for mood in backend.list_moods(username):
+            insights.add_mood(mood)
+        for entry in backend.list_journals(username):
+            insights.add_journal(entry)
+        return insights
+
+    return _insights.get(username, insights_version(backend, username), build)
+
+
+def record_journal(backend, username, entry, previous):
+    """
+    Folds a just-saved journal entry into the user's insights (if they are loaded).
+    previous is insights_version() from before the entry was saved; insights at another version
+    missed someone else's change, so they are dropped and rebuilt on next use.
+    """
+    _insights.update(username, lambda insights: insights.add_journal(entry), insights_version(backend, username), previous)
+
+
+def record_mood(backend, username, entry, previous):
+    """Folds a just-logged mood into the user's insights (if they are loaded); previous as for record_journal."""
+    _insights.update(username, lambda insights: insights.add_mood(entry), insights_version(backend, username), previous)
@@ -0,0 +1,157 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_PATH_ENV = "SOULSYNC_METRICS_PATH" # If set, metrics are exported here (.prom = Prometheus text, else JSON)
+EXPORT_INTERVAL_SECONDS = 10.0 # Exports are throttled to one per interval
+MAX_SAMPLES = 1000 # Recent durations kept per timer for percentiles
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Metrics:
+    """
+    Process-wide counters and timers for the app's hot paths, shared by every session.
+    Timers keep a call count, total and maximum, and the last MAX_SAMPLES durations for percentiles.
+    Anything recorded on a thread that is running a tracked rerun (see start_run)
+    is also added to that rerun's own breakdown, for the sidebar performance panel.
+    Work done for a rerun on another thread (e.g. the storage writer's commits) is added to it
+    by running that work inside recording_for(runs).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {}
+        self.timers = {} # name -> {"count", "seconds", "max", "samples"}
+        self._last_export = 0.0
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+            for run in self._runs():
+                run["counters"][name] = run["counters"].get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = {"count": 0, "seconds": 0.0, "max": 0.0, "samples": deque(maxlen=MAX_SAMPLES)}
+            timer["count"] += 1
+            timer["seconds"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+            timer["samples"].append(seconds)
+            for run in self._runs():
+                calls, total = run["timers"].get(name, (0, 0.0))
+                run["timers"][name] = (calls + 1, total + seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Times the block under name (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    # --- Per-rerun breakdown ---
+    def start_run(self):
+        """Starts collecting a breakdown for the rerun running on this thread and returns it."""
+        self._local.run = {"started": time.perf_counter(), "counters": {}, "timers": {}}
+        return self._local.run
+
+    def current_run(self):
+        return getattr(self._local, "run", None)
+
+    @contextmanager
+    def recording_for(self, runs):
+        """Also adds what this thread records inside the block to runs (breakdowns from current_run() on other threads)."""
+        previous = getattr(self._local, "extra_runs", ())
+        unique = {}
+        for run in runs:
+            if run is not None:
+                unique[id(run)] = run
+        self._local.extra_runs = list(unique.values())
+        try:
+            yield
+        finally:
+            self._local.extra_runs = previous
+
+    def _runs(self):
+        # Under self._lock: a run can be fed from several threads at once (its own and the writer's)
+        runs = list(getattr(self._local, "extra_runs", ()))
+        run = self.current_run()
+        if run is not None and all(run is not other for other in runs):
+            runs.append(run)
+        return runs
+
+    def finish_run(self):
+        """Stops collecting for this thread's rerun, records its duration, and returns the breakdown."""
+        run = self.current_run()
+        self._local.run = None
+        if run is not None:
+            run["seconds"] = time.perf_counter() - run["started"]
+            self.observe("rerun", run["seconds"])
+        return run
+
+    # --- Export ---
+    def snapshot(self):
+        """Returns every counter and timer summary (count, sum, max, and quantiles in seconds)."""
+        with self._lock:
+            counters = dict(self.counters)
+            timers = {}
+            for name, timer in self.timers.items():
+                samples = sorted(timer["samples"])
+                summary = {"count": timer["count"], "sum": timer["seconds"], "max": timer["max"]}
+                for q in QUANTILES:
+                    summary[f"p{int(q * 100)}"] = samples[min(len(samples) - 1, int(len(samples) * q))]
+                timers[name] = summary
+        return {"counters": counters, "timers": timers}
+
+    def to_prometheus(self):
+        """Renders the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"soulsync_{_metric_name(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, summary in sorted(snapshot["timers"].items()):
+            metric = f"soulsync_{_metric_name(name)}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                lines.append(f'{metric}{{quantile="{q}"}} {summary[f"p{int(q * 100)}"]}')
+            lines += [f"{metric}_sum {summary['sum']}", f"{metric}_count {summary['count']}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Writes the metrics to path: Prometheus text for .prom files, JSON otherwise."""
+        if path.endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp" # Its own, so concurrent exports don't replace each other's
+        with open(tmp_path, "w") as file:
+            file.write(text)
+        os.replace(tmp_path, path) # A scraper never sees a half-written file
+
+    def maybe_export(self):
+        """Exports to $SOULSYNC_METRICS_PATH if it is set and the last export is old enough."""
+        path = os.environ.get(METRICS_PATH_ENV)
+        if not path:
+            return
+        now = time.monotonic()
+        with self._lock: # Reruns finish on many threads at once; only one of them exports
+            if now - self._last_export < EXPORT_INTERVAL_SECONDS:
+                return
+            self._last_export = now
+        self.export(path)
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+metrics = Metrics()
@@ -1,61 +1,96 @@
 import streamlit as st
-import pandas as pd
 import datetime
-from auth import load_users
+import pandas as pd
+from storage import get_backend
+from analytics.downsample import average_mood, bucket_counts, daily_counts, downsample_frame, pick_resolution
+from analytics.mood_frame import mood_frame_from_arrays
+from insights import get_insights
+from metrics import metrics
+
+RANGE_PRESETS = {"Last 30 days": 30, "Last 90 days": 90, "Last year": 365, "All time": None, "Custom": None}
+
+
+def select_range(logged_days):
+    """Shows the time-range selector and returns the chosen [start, end) dates. logged_days is sorted."""
+    today = datetime.date.today()
+    first_day = datetime.date.fromisoformat(logged_days[0])
+    last_day = max(today, datetime.date.fromisoformat(logged_days[-1]))
+    choice = st.radio("Time range", list(RANGE_PRESETS), index=2, horizontal=True, key="dashboard_range")
+    if choice == "All time":
+        return first_day, last_day + datetime.timedelta(days=1)
+    if choice == "Custom":
+        col_from, col_to = st.columns(2)
+        with col_from:
+            date_from = st.date_input("From", value=max(first_day, today - datetime.timedelta(days=365)), key="dashboard_range_from")
+        with col_to:
+            date_to = st.date_input("To", value=today, key="dashboard_range_to")
+        return date_from, max(date_from, date_to) + datetime.timedelta(days=1) # Include the whole "To" day
+    return today - datetime.timedelta(days=RANGE_PRESETS[choice] - 1), today + datetime.timedelta(days=1)
+
 
 def dashboard_page(username):
     """
     Displays the visual dashboard for the logged-in user.
-    Includes mood trends, goal summaries, and placeholders for other insights.
+    Includes mood trends, goal summaries, and themes and triggers from journal entries.
     """
     st.title(f"📊 {username}'s Visual Dashboard")
 
-    users = load_users()
-    user_data = users.get(username, {})
-    user_moods = user_data.get("moods", [])
-    user_goals = user_data.get("goals", [])
-    user_journals = user_data.get("journals", [])
+    backend = get_backend()
+    mood_rollups = backend.get_mood_rollups(username) # Kept up to date by the Mood Tracker, no history scan
+    goal_counts = backend.count_goals_by_status(username) # Grouped count, no goal records loaded
 
     st.markdown("---")
 
     # --- Mood Trend Visualization ---
     st.header("Mood Trends Over Time")
 
-    if not user_moods:
-        st.info("No mood data available. Log your moods in the 'Mood Tracker' to see trends here!")
+    archive = backend.archive_summary(username) # Archived months stay in the charts through the rollups
+    if archive:
+        st.caption(
+            f"Older entries are archived: {archive['moods']} moods and {archive['journals']} journal entries "
+            f"from before {archive['horizon'][:10]}."
+        )
+
+    total_days = len(mood_rollups["day"])
+    if not total_days:
+        if mood_rollups["skipped"]:
+            st.info("No valid mood entries to display.")
+        else:
+            st.info("No mood data available. Log your moods in the 'Mood Tracker' to see trends here!")
     else:
-        # Map mood text to numerical values for charting
-        mood_to_value = {
-            "Happy": 5, "Excited": 4, "Neutral": 3,
-            "Anxious": 2, "Stressed": 2, "Sad": 1, "Angry": 1
-        }
-        
-        # Prepare data for DataFrame
-        mood_data = []
-        for entry in user_moods:
-            try:
-                timestamp_dt = datetime.datetime.fromisoformat(entry["timestamp"])
-                mood_value = mood_to_value.get(entry["mood_text"], 0) # Default to 0 if mood not found
-                mood_data.append({"Date": timestamp_dt.date(), "Time": timestamp_dt.time(), "Mood Value": mood_value, "Mood": entry["mood_text"]})
-            except ValueError:
-                st.warning(f"Could not parse timestamp: {entry['timestamp']}. Skipping this mood entry.")
-                continue
-
-        if mood_data:
-            df_moods = pd.DataFrame(mood_data)
-            df_moods["Datetime"] = df_moods.apply(lambda row: datetime.datetime.combine(row["Date"], row["Time"]), axis=1)
-            df_moods = df_moods.sort_values(by="Datetime")
+        if mood_rollups["skipped"]:
+            st.warning(f"Skipped {mood_rollups['skipped']} mood entries with timestamps that could not be parsed.")
 
-            st.write("### Your Mood Over Time")
-            st.line_chart(df_moods.set_index("Datetime")["Mood Value"])
+        start, end = select_range(sorted(mood_rollups["day"]))
 
-            st.write("### Daily Mood Distribution")
-            # Group by date and count mood occurrences
-            daily_mood_counts = df_moods.groupby(['Date', 'Mood']).size().unstack(fill_value=0)
-            st.bar_chart(daily_mood_counts)
+        # Charts are built from the precomputed daily counts, summed into buckets coarse enough
+        # that no chart gets more than MAX_BARS points, however long the range
+        with metrics.timer("dashboard_frames"):
+            counts = daily_counts(mood_rollups["day"], start, end)
+            resolution, freq = pick_resolution(pd.Timestamp(start), pd.Timestamp(end))
+            buckets = bucket_counts(counts, freq)
 
+        if counts.empty:
+            st.info("No moods logged in this time range.")
         else:
-            st.info("No valid mood entries to display.")
+            st.write("### Your Mood Over Time")
+            st.caption(f"Average mood per {resolution}")
+            st.line_chart(average_mood(buckets).rename("Average Mood Value"))
+
+            st.write("### Mood Distribution")
+            st.caption(f"Moods logged per {resolution}")
+            st.bar_chart(buckets)
+
+            # Individual entries are only loaded on request, and downsampled before charting
+            if st.checkbox("Show every logged mood"):
+                with metrics.timer("dashboard_frames"):
+                    arrays = backend.mood_arrays(username, start.isoformat(), end.isoformat(), archived=True)
+                    df_moods, _ = mood_frame_from_arrays(arrays)
+                    shown = downsample_frame(df_moods, "Mood Value")
+                st.write("### Every Mood Entry")
+                if len(shown) < len(df_moods):
+                    st.caption(f"Showing {len(shown)} of {len(df_moods)} entries, picked to keep the shape of the line.")
+                st.line_chart(shown.set_index("Datetime")["Mood Value"])
 
 
     st.markdown("---")
@@ -63,14 +98,14 @@ def dashboard_page(username):
     # --- Goal Achievement Summary ---
     st.header("Goal Progress Summary")
 
-    if not user_goals:
+    total_goals = sum(goal_counts.values())
+    if not total_goals:
         st.info("No goals set yet. Add goals in the 'Goals' section to see your progress here!")
     else:
-        total_goals = len(user_goals)
-        completed_goals = sum(1 for goal in user_goals if goal["status"] == "Completed")
-        in_progress_goals = sum(1 for goal in user_goals if goal["status"] == "In Progress")
-        to_do_goals = sum(1 for goal in user_goals if goal["status"] == "To Do")
-        cancelled_goals = sum(1 for goal in user_goals if goal["status"] == "Cancelled")
+        completed_goals = goal_counts["Completed"]
+        in_progress_goals = goal_counts["In Progress"]
+        to_do_goals = goal_counts["To Do"]
+        cancelled_goals = goal_counts["Cancelled"]
 
         st.write(f"**Total Goals:** {total_goals}")
         st.write(f"**Completed:** {completed_goals}")
@@ -94,11 +129,26 @@ def dashboard_page(username):
 
     st.markdown("---")
 
-    # --- Common Triggers from Journal Entries (Placeholder) ---
+    # --- Common Triggers from Journal Entries ---
     st.header("Common Triggers & Insights from Journal Entries")
-    if not user_journals:
+    insights = get_insights(backend, username) # Kept up to date as entries are saved, no text rescan
+    if not insights.n_docs:
         st.info("No journal entries available. Write some entries in the 'Journal' section to unlock insights here!")
     else:
-        st.info("This section will analyze your journal entries to identify common themes, emotions, or triggers over time. (Coming Soon!)")
-        st.markdown("*(Future features could include keyword extraction, sentiment analysis, and correlation with mood data.)*")
+        themes = insights.themes(limit=10)
+        if not themes:
+            st.info("Write a few more entries to see the themes that come up most often.")
+        else:
+            st.write("### Recurring Themes")
+            st.bar_chart(pd.DataFrame(themes, columns=["Theme", "Score"]).set_index("Theme"))
+
+        st.write("### Possible Mood Triggers")
+        triggers = insights.triggers(limit=5)
+        if not triggers:
+            st.info("Log moods on the days you journal to see which topics tend to come with which moods.")
+        else:
+            st.caption("Words you often write about on days you log each mood.")
+            for mood, pairs in sorted(triggers.items()):
+                words = ", ".join(f"**{term}** ({together}x)" for term, together, lift in pairs)
+                st.write(f"**{mood}:** {words}")
 
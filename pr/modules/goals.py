@@ -1,6 +1,6 @@
 import streamlit as st
 import uuid # For generating unique IDs for goals
-from auth import load_users, save_users # Import functions from auth.py
+from storage import get_backend # Pluggable storage backend
 
 def goal_page(username):
     """
@@ -9,9 +9,8 @@ def goal_page(username):
     """
     st.title(f"🎯 {username}'s Goals")
 
-    users = load_users()
-    user_data = users.get(username, {})
-    user_goals = user_data.get("goals", [])
+    backend = get_backend()
+    goal_counts = backend.count_goals_by_status(username) # Answered from the goal index, no goal records copied
 
     # --- Add New Goal ---
     st.header("Add a New Goal")
@@ -31,10 +30,7 @@ def goal_page(username):
                     "due_date": str(goal_due_date) if goal_due_date else None,
                     "status": goal_status
                 }
-                user_goals.append(new_goal)
-                user_data["goals"] = user_goals
-                users[username] = user_data
-                save_users(users)
+                backend.upsert_goal(username, new_goal)
                 st.success("Goal added successfully!")
                 st.rerun() # Rerun to update the displayed goals
             else:
@@ -45,24 +41,16 @@ def goal_page(username):
     # --- View and Manage Goals ---
     st.header("Your Current Goals")
 
-    if not user_goals:
+    if not sum(goal_counts.values()):
         st.info("You haven't set any goals yet. Add one above!")
     else:
         # Filter and sort options
         status_filter = st.sidebar.multiselect("Filter by Status", ["To Do", "In Progress", "Completed", "Cancelled"], default=["To Do", "In Progress"])
         sort_by = st.sidebar.selectbox("Sort by", ["None", "Due Date (Asc)", "Due Date (Desc)", "Status"])
 
-        filtered_goals = [goal for goal in user_goals if goal["status"] in status_filter]
-
-        if sort_by == "Due Date (Asc)":
-            filtered_goals.sort(key=lambda x: (x["due_date"] is None, x["due_date"]))
-        elif sort_by == "Due Date (Desc)":
-            filtered_goals.sort(key=lambda x: (x["due_date"] is None, x["due_date"]), reverse=True)
-        elif sort_by == "Status":
-            # Define a custom order for status
-            status_order = {"To Do": 0, "In Progress": 1, "Completed": 2, "Cancelled": 3}
-            filtered_goals.sort(key=lambda x: status_order.get(x["status"], 99))
-
+        # Filtered and sorted by the storage layer's goal index instead of here
+        goal_order = {"None": None, "Due Date (Asc)": "due_asc", "Due Date (Desc)": "due_desc", "Status": "status"}[sort_by]
+        filtered_goals = backend.list_goals(username, statuses=status_filter, order=goal_order)
 
         for i, goal in enumerate(filtered_goals):
             expander_title = f"**{goal['title']}** - Status: {goal['status']}"
@@ -87,16 +75,13 @@ def goal_page(username):
                     if st.button(f"Delete Goal", key=f"delete_{goal['id']}"):
                         # Implement a confirmation dialog if needed in a real app
                         # For now, directly delete
-                        user_goals.remove(goal)
-                        user_data["goals"] = user_goals
-                        users[username] = user_data
-                        save_users(users)
+                        backend.delete_goal(username, goal["id"])
                         st.success("Goal deleted successfully!")
                         st.rerun() # Rerun to update the displayed goals
 
         # --- Edit Goal Form (appears when a goal is selected for editing) ---
         if "editing_goal_id" in st.session_state and st.session_state.editing_goal_id:
-            goal_to_edit = next((g for g in user_goals if g["id"] == st.session_state.editing_goal_id), None)
+            goal_to_edit = backend.get_goal(username, st.session_state.editing_goal_id)
 
             if goal_to_edit:
                 st.markdown("---")
@@ -126,17 +111,14 @@ def goal_page(username):
 
                     if update_submitted:
                         if edited_title:
-                            # Update the goal in the list
-                            for i, g in enumerate(user_goals):
-                                if g["id"] == goal_to_edit["id"]:
-                                    user_goals[i]["title"] = edited_title
-                                    user_goals[i]["description"] = edited_description
-                                    user_goals[i]["due_date"] = str(edited_due_date) if edited_due_date else None
-                                    user_goals[i]["status"] = edited_status
-                                    break
-                            user_data["goals"] = user_goals
-                            users[username] = user_data
-                            save_users(users)
+                            # Update the goal in place (same id)
+                            backend.upsert_goal(username, {
+                                "id": goal_to_edit["id"],
+                                "title": edited_title,
+                                "description": edited_description,
+                                "due_date": str(edited_due_date) if edited_due_date else None,
+                                "status": edited_status
+                            })
                             st.success("Goal updated successfully!")
                             st.session_state.editing_goal_id = None # Clear editing state
                             st.rerun()
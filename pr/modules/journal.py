@@ -1,38 +1,40 @@
 import streamlit as st
 import datetime
 import random # For optional prompts
-from auth import load_users, save_users # Import functions from auth.py
-import os
-from groq import Groq
+import uuid # For generating unique IDs for journal entries
+from storage import get_backend # Pluggable storage backend
+from reflection import MissingApiKeyError, ReflectionTimeout, get_reflection_service
+from reflection_jobs import QueueFull, get_reflection_queue
+from search import entry_id, get_journal_index, index_journal_entry, journal_index_version
+from insights import insights_version, record_journal
 
-# Function to get AI reflection using Groq API
-def get_ai_reflection(journal_entry):
-    # Get API key from environment variables
-    api_key = os.environ.get("GROQ_API_KEY")
+POLL_SECONDS = 2 # How often past entries refresh themselves while their reflections are being written
 
-    if not api_key:
+
+# Turns an error from the reflection service into a message for the user
+def reflection_error_message(error):
+    if isinstance(error, MissingApiKeyError):
         return "Groq API key not found in environment variables. Please set the 'GROQ_API_KEY' environment variable."
-    
+    return f"Error getting AI reflection: {error}. Please ensure your 'GROQ_API_KEY' is correct and you have an internet connection."
+
+
+# Function to get AI reflection using Groq API: yields the reflection piece by piece as it is generated
+# (cached and de-duplicated by the reflection service)
+def stream_ai_reflection(journal_entry):
     try:
-        client = Groq(api_key=api_key)
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a compassionate and empathetic AI. Provide a gentle, supportive, and reflective response to the user's journal entry. Keep it concise and encouraging, focusing on emotional well-being. Do not offer advice unless explicitly asked, instead, reflect on their feelings. If the entry is short, you can ask a gentle follow-up question."
-                },
-                {
-                    "role": "user",
-                    "content": f"My journal entry: {journal_entry}"
-                }
-            ],
-            model="llama-3.3-70b-versatile", # Using the model specified by the user
-            temperature=0.7, # Adjust for creativity
-            max_tokens=150 # Limit response length
-        )
-        return chat_completion.choices[0].message.content
+        yield from get_reflection_service().stream(journal_entry)
+    except ReflectionTimeout:
+        yield "\n\n*(The reflection took too long and was stopped. Please try again.)*"
     except Exception as e:
-        return f"Error getting AI reflection: {e}. Please ensure your 'GROQ_API_KEY' is correct and you have an internet connection."
+        yield reflection_error_message(e)
+
+
+# Formats an entry's timestamp for display; timestamps that can't be parsed are shown as stored
+def format_timestamp(timestamp):
+    try:
+        return datetime.datetime.fromisoformat(timestamp).strftime('%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return timestamp
 
 
 def journal_page(username):
@@ -42,9 +44,7 @@ def journal_page(username):
     """
     st.title(f"📓 {username}'s Digital Confessional")
 
-    users = load_users()
-    user_data = users.get(username, {})
-    user_journals = user_data.get("journals", [])
+    backend = get_backend()
 
     # --- Write New Journal Entry ---
     st.header("Write Your Entry")
@@ -76,14 +76,17 @@ def journal_page(username):
         if st.button("Save Entry"):
             if journal_entry_text.strip():
                 new_entry = {
+                    "id": uuid.uuid4().hex, # Unique ID, used by the search index
                     "timestamp": datetime.datetime.now().isoformat(),
                     "content": journal_entry_text.strip()
                 }
-                user_journals.append(new_entry)
-                user_data["journals"] = user_journals
-                users[username] = user_data
-                save_users(users)
+                index_before = journal_index_version(backend, username) # Before saving, so a save from elsewhere in between is noticed
+                insights_before = insights_version(backend, username)
+                backend.append_journal(username, new_entry) # One small append instead of rewriting the whole history
+                index_journal_entry(backend, username, new_entry, index_before) # Update the search index incrementally
+                record_journal(backend, username, new_entry, insights_before) # ...and the dashboard's theme/trigger statistics
                 st.success("Your entry has been saved!")
+                st.session_state[f"journal_history_cursors_{username}"] = [None] # Back to the newest page to show it
                 st.rerun() # Rerun to update the displayed history
             else:
                 st.warning("Please write something before saving your entry.")
@@ -94,17 +97,21 @@ def journal_page(username):
     st.subheader("AI Reflection")
     # Removed st.text_input for API key
 
+    streamed_now = False
     with col_ai:
-        if st.button("Get AI Reflection", disabled=not journal_entry_text.strip()):
-            if journal_entry_text.strip():
-                with st.spinner("Generating AI reflection..."):
-                    # Call get_ai_reflection without passing API key, it will read from env
-                    reflection = get_ai_reflection(journal_entry_text.strip())
-                    st.session_state.ai_reflection = reflection # Store reflection in session state
-            else:
-                st.warning("Please write a journal entry first to get an AI reflection.")
-    
-    if "ai_reflection" in st.session_state and st.session_state.ai_reflection:
+        get_reflection = st.button("Get AI Reflection", disabled=not journal_entry_text.strip())
+
+    if get_reflection:
+        if journal_entry_text.strip():
+            # Render the reflection token by token as it arrives instead of waiting for all of it
+            with st.container(border=True):
+                reflection = st.write_stream(stream_ai_reflection(journal_entry_text.strip()))
+            st.session_state.ai_reflection = reflection # Store the finished reflection in session state
+            streamed_now = True
+        else:
+            st.warning("Please write a journal entry first to get an AI reflection.")
+
+    if not streamed_now and "ai_reflection" in st.session_state and st.session_state.ai_reflection:
         st.info(st.session_state.ai_reflection)
         # Clear reflection after displaying, or keep it if user wants to see it persist
         # del st.session_state.ai_reflection # Uncomment if you want it to disappear on next rerun
@@ -112,21 +119,113 @@ def journal_page(username):
 
     st.markdown("---")
 
+    # --- Search Past Entries ---
+    st.header("Search Your Entries")
+    search_query = st.text_input('Search for words or "exact phrases"', key="journal_search_query")
+
+    if search_query.strip():
+        col_from, col_to = st.columns(2)
+        with col_from:
+            date_from = st.date_input("From (Optional)", value=None, key="journal_search_from")
+        with col_to:
+            date_to = st.date_input("To (Optional)", value=None, key="journal_search_to")
+        start = date_from.isoformat() if date_from else None
+        end = (date_to + datetime.timedelta(days=1)).isoformat() if date_to else None # Include the whole "To" day
+
+        # Archived entries are only searched when asked for, or when the dates reach back that far
+        archive_horizon = backend.archive_horizon(username)
+        search_archive = archive_horizon is not None and start is not None and start < archive_horizon
+        if archive_horizon is not None and not search_archive:
+            search_archive = st.checkbox(f"Also search archived entries (before {archive_horizon[:10]})", key="journal_search_archived")
+
+        per_page = 10
+        index = get_journal_index(backend, username, archived=search_archive)
+        results, total = index.search(search_query, start=start, end=end, page=1, per_page=per_page)
+        if total == 0:
+            st.info("No entries match your search.")
+        else:
+            total_pages = (total + per_page - 1) // per_page
+            page = 1
+            if total_pages > 1:
+                page = st.number_input(f"Page (of {total_pages})", min_value=1, max_value=total_pages, value=1, key="journal_search_page")
+                if page > 1:
+                    results, total = index.search(search_query, start=start, end=end, page=page, per_page=per_page)
+            st.caption(f"{total} matching entries")
+            for entry in results:
+                st.write(f"**{format_timestamp(entry['timestamp'])}**")
+                st.markdown(f"```\n{entry['content']}\n```")
+                st.markdown("---")
+
+    st.markdown("---")
+
     # --- Recent Journal History ---
     st.header("Your Past Entries")
+    past_entries(backend, username)
 
-    if not user_journals:
-        st.info("You haven't written any journal entries yet. Start by writing one above!")
-    else:
-        # Display entries in reverse chronological order (most recent first)
-        recent_entries = sorted(user_journals, key=lambda x: x["timestamp"], reverse=True)
 
-        # Show a slider for number of entries to display
-        display_count = st.slider("Show last X entries:", 1, len(recent_entries), min(5, len(recent_entries)))
-
-        for entry in recent_entries[:display_count]:
-            timestamp_dt = datetime.datetime.fromisoformat(entry["timestamp"])
-            st.write(f"**{timestamp_dt.strftime('%Y-%m-%d %H:%M')}**")
+def past_entries(backend, username):
+    """
+    Shows a page of past entries with their AI reflections, which are written in the background.
+    While any are being written, this part of the page reruns itself every POLL_SECONDS (the rest of the page doesn't).
+    """
+    reflection_queue = get_reflection_queue()
+    polling = reflection_queue.pending(username) > 0
+
+    @st.fragment(run_every=POLL_SECONDS if polling else None)
+    def history():
+        # Only the page being shown is read, newest first; the cursors of the pages visited so far are kept for "Newer"
+        cursors = st.session_state.setdefault(f"journal_history_cursors_{username}", [None])
+        recent_entries, older_cursor = backend.page_entries(username, "journals", 5, cursor=cursors[-1])
+
+        if not recent_entries and len(cursors) == 1:
+            st.info("You haven't written any journal entries yet. Start by writing one above!")
+            return
+
+        reflections = backend.get_reflections(username)
+        jobs = reflection_queue.status(username, [entry_id(entry) for entry in recent_entries])
+        for entry in recent_entries:
+            st.write(f"**{format_timestamp(entry['timestamp'])}**")
             st.markdown(f"```\n{entry['content']}\n```") # Display content in a code block for better formatting
+            key = entry_id(entry)
+            job = jobs.get(key)
+            if key in reflections:
+                st.info(reflections[key]["text"])
+            elif job is not None and job["state"] == "queued":
+                st.caption("⏳ Waiting to reflect on this entry...")
+            elif job is not None and job["state"] == "running":
+                st.caption("✍️ Writing a reflection...")
+            else:
+                if job is not None:
+                    st.caption(reflection_error_message(job["error"]))
+                if st.button("Try again" if job is not None else "Reflect on this entry", key=f"journal_reflect_{key}"):
+                    try:
+                        reflection_queue.submit(backend, username, entry) # Returns right away; the page polls for the result
+                        st.rerun()
+                    except QueueFull:
+                        st.warning("Too many reflections are waiting right now. Please try again in a minute.")
             st.markdown("---")
 
+        col_newer, col_older = st.columns(2)
+        with col_newer:
+            if len(cursors) > 1 and st.button("← Newer entries", key="journal_history_newer"):
+                cursors.pop()
+                st.rerun()
+        with col_older:
+            if older_cursor is not None and st.button("Older entries →", key="journal_history_older"):
+                cursors.append(older_cursor)
+                st.rerun()
+
+        pending = reflection_queue.pending(username)
+        if pending:
+            st.caption(f"Reflections being written in the background: {pending}. You can keep using SoulSync meanwhile.")
+        if st.button("Reflect on all past entries", key="journal_reflect_backfill", help="Writes a reflection for every entry that doesn't have one yet"):
+            try:
+                if reflection_queue.backfill(backend, username):
+                    st.rerun()
+                st.info("Every entry already has a reflection, or is waiting for one.")
+            except QueueFull:
+                st.warning("Too many reflections are waiting right now. Please try again in a minute.")
+        if polling and not pending:
+            st.rerun() # Everything is done: rerun the whole page once so it stops polling
+
+    history()
@@ -1,6 +1,7 @@
 import streamlit as st
 import datetime
-from auth import load_users, save_users # Import functions from auth.py
+from storage import MOOD_EMOJIS, get_backend # Pluggable storage backend
+from insights import insights_version, record_mood
 
 def mood_page(username):
     """
@@ -9,22 +10,12 @@ def mood_page(username):
     """
     st.title(f"🧠 {username}'s Mood Tracker")
 
-    users = load_users()
-    user_data = users.get(username, {})
-    user_moods = user_data.get("moods", [])
+    backend = get_backend()
 
     # --- Log New Mood ---
     st.header("How are you feeling today?")
     
-    mood_options = {
-        "Happy": "😀",
-        "Sad": "😢",
-        "Angry": "😡",
-        "Stressed": "😣",
-        "Anxious": "😰",
-        "Excited": "🤩",
-        "Neutral": "😐"
-    }
+    mood_options = MOOD_EMOJIS # Mood -> emoji; the emoji isn't stored, it is looked up again when shown
 
     # Create buttons for mood selection
     selected_mood_text = st.radio(
@@ -44,11 +35,11 @@ def mood_page(username):
             "mood_emoji": selected_mood_emoji,
             "description": mood_description
         }
-        user_moods.append(new_mood_entry)
-        user_data["moods"] = user_moods
-        users[username] = user_data
-        save_users(users)
+        insights_before = insights_version(backend, username) # Before saving, so a save from elsewhere in between is noticed
+        backend.append_mood(username, new_mood_entry) # One small append instead of rewriting the whole history
+        record_mood(backend, username, new_mood_entry, insights_before) # Keep the dashboard's trigger statistics up to date
         st.success(f"Your mood '{selected_mood_text} {selected_mood_emoji}' has been logged!")
+        st.session_state[f"mood_history_cursors_{username}"] = [None] # Back to the newest page to show it
         st.rerun() # Rerun to update the displayed history
 
     st.markdown("---")
@@ -56,19 +47,31 @@ def mood_page(username):
     # --- Recent Mood History ---
     st.header("Your Recent Mood History")
 
-    if not user_moods:
+    # Only the page being shown is read, newest first; the cursors of the pages visited so far are kept for "Newer"
+    cursors = st.session_state.setdefault(f"mood_history_cursors_{username}", [None])
+    recent_moods, older_cursor = backend.page_entries(username, "moods", 10, cursor=cursors[-1])
+
+    if not recent_moods and len(cursors) == 1:
         st.info("You haven't logged any moods yet. Log one above!")
     else:
-        # Display moods in reverse chronological order (most recent first)
-        recent_moods = sorted(user_moods, key=lambda x: x["timestamp"], reverse=True)
-
-        # Show only the last 10 entries for brevity, or all if less than 10
-        display_count = st.slider("Show last X entries:", 1, len(recent_moods), min(10, len(recent_moods)))
-        
-        for entry in recent_moods[:display_count]:
-            timestamp_dt = datetime.datetime.fromisoformat(entry["timestamp"])
-            st.write(f"**{timestamp_dt.strftime('%Y-%m-%d %H:%M')}** - {entry['mood_emoji']} {entry['mood_text']}")
+        for entry in recent_moods:
+            try:
+                shown_time = datetime.datetime.fromisoformat(entry["timestamp"]).strftime('%Y-%m-%d %H:%M')
+            except (TypeError, ValueError):
+                shown_time = entry["timestamp"] # Unparseable timestamps are shown as stored
+            mood_emoji = mood_options.get(entry["mood_text"], entry.get("mood_emoji", ""))
+            st.write(f"**{shown_time}** - {mood_emoji} {entry['mood_text']}")
             if entry["description"]:
                 st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;*\"{entry['description']}\"*")
             st.markdown("---")
 
+        col_newer, col_older = st.columns(2)
+        with col_newer:
+            if len(cursors) > 1 and st.button("← Newer entries", key="mood_history_newer"):
+                cursors.pop()
+                st.rerun()
+        with col_older:
+            if older_cursor is not None and st.button("Older entries →", key="mood_history_older"):
+                cursors.append(older_cursor)
+                st.rerun()
+
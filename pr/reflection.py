@@ -0,0 +1,396 @@
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from metrics import metrics
+
+SYSTEM_PROMPT = "You are a compassionate and empathetic AI. Provide a gentle, supportive, and reflective response to the user's journal entry. Keep it concise and encouraging, focusing on emotional well-being. Do not offer advice unless explicitly asked, instead, reflect on their feelings. If the entry is short, you can ask a gentle follow-up question."
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+DEFAULT_TEMPERATURE = 0.7 # Adjust for creativity
+DEFAULT_MAX_TOKENS = 150 # Limit response length
+
+CACHE_PATH = os.environ.get("SOULSYNC_REFLECTION_CACHE", "reflection_cache.sqlite")
+CACHE_TTL_SECONDS = int(os.environ.get("SOULSYNC_REFLECTION_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.environ.get("SOULSYNC_REFLECTION_CACHE_SIZE", "5000"))
+CLIENT_POOL_SIZE = int(os.environ.get("SOULSYNC_AI_POOL_SIZE", "4"))
+STREAM_TIMEOUT_SECONDS = float(os.environ.get("SOULSYNC_AI_STREAM_TIMEOUT", "30"))
+
+
+class MissingApiKeyError(RuntimeError):
+    """Raised when GROQ_API_KEY isn't set."""
+
+
+class ReflectionTimeout(TimeoutError):
+    """Raised when a streamed reflection doesn't finish within its timeout."""
+
+
+def build_messages(journal_entry):
+    """Chat messages sent to the model for one journal entry."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"My journal entry: {journal_entry}"}
+    ]
+
+
+def groq_client_factory():
+    """Creates a Groq client from GROQ_API_KEY. groq is only imported when a reflection is actually requested."""
+    api_key = os.environ.get("GROQ_API_KEY")
+    if not api_key:
+        raise MissingApiKeyError("GROQ_API_KEY is not set")
+    from groq import Groq
+    return Groq(api_key=api_key)
+
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class StubClient:
+    """
+    Offline stand-in for the Groq client with the same chat.completions.create() shape.
+    reply(journal_entry) builds the response text; latency (seconds) simulates the network call.
+    With stream=True the reply is sent back word by word, chunk_delay seconds apart.
+    """
+
+    def __init__(self, reply=None, latency=0.0, chunk_delay=0.0):
+        self.reply = reply or (lambda entry: f"Thank you for sharing. It sounds like a lot is on your mind: {entry[:60]}")
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self.chat = _Namespace(completions=_Namespace(create=self._create))
+
+    def _create(self, messages, model, temperature, max_tokens, stream=False, **kwargs):
+        self.calls += 1
+        entry = messages[-1]["content"].removeprefix("My journal entry: ")
+        if stream:
+            return self._stream(self.reply(entry))
+        if self.latency:
+            time.sleep(self.latency)
+        message = _Namespace(content=self.reply(entry))
+        return _Namespace(choices=[_Namespace(message=message)])
+
+    def _stream(self, text):
+        if self.latency:
+            time.sleep(self.latency) # Time to first chunk
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            delta = _Namespace(content=word if i == len(words) - 1 else word + " ")
+            yield _Namespace(choices=[_Namespace(delta=delta)])
+
+
+class ClientPool:
+    """Reuses API clients (and their HTTP connections) instead of building one per click."""
+
+    def __init__(self, factory, max_size=CLIENT_POOL_SIZE):
+        self.factory = factory
+        self._idle = queue.LifoQueue(maxsize=max_size)
+
+    @contextmanager
+    def client(self):
+        try:
+            client = self._idle.get_nowait()
+        except queue.Empty:
+            client = self.factory()
+        try:
+            yield client
+        finally:
+            try:
+                self._idle.put_nowait(client)
+            except queue.Full:
+                pass # Pool is full, let this one go
+
+
+class _SharedStream:
+    """One streamed API call in flight, read by every stream() caller asking for the same reflection."""
+
+    def __init__(self):
+        self.parts = []
+        self.finished = False
+        self.error = None
+        self.readers = 0
+        self.stop = threading.Event() # Set once nobody is reading any more
+        self.changed = threading.Condition()
+
+    def publish(self, part=None, error=None, finished=False):
+        with self.changed:
+            if part is not None:
+                self.parts.append(part)
+            self.error = error
+            self.finished = finished
+            self.changed.notify_all()
+
+
+class ReflectionCache:
+    """
+    Persistent reflection cache in a small SQLite file.
+    Entries expire after ttl seconds; beyond max_entries the least recently used are evicted.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL") # It's a cache: losing the last few writes on a crash is fine
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reflections (key TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reflections_used ON reflections (used_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT text, created_at FROM reflections WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM reflections WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE reflections SET used_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, text):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reflections (key, text, created_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, text, now, now)
+            )
+            self._conn.execute("DELETE FROM reflections WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM reflections WHERE key IN (SELECT key FROM reflections ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reflections").fetchone()[0]
+
+
+class ReflectionService:
+    """
+    Gets AI reflections with a persistent cache, request de-duplication, and a client pool.
+    Identical requests (same text, model, and parameters) are answered from the cache; concurrent
+    identical requests share a single in-flight API call (streamed or not).
+    """
+
+    def __init__(self, client_factory=groq_client_factory, cache=None, model=DEFAULT_MODEL,
+                 temperature=DEFAULT_TEMPERATURE, max_tokens=DEFAULT_MAX_TOKENS):
+        self.pool = ClientPool(client_factory)
+        self.cache = cache if cache is not None else ReflectionCache()
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self._inflight = {} # cache key -> Future shared by everyone waiting on it
+        self._streams = {} # cache key -> _SharedStream read by everyone streaming it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0 # Requests that piggybacked on an identical in-flight call
+        self.api_seconds = 0.0
+
+    def cache_key(self, journal_entry):
+        payload = json.dumps([self.model, self.temperature, self.max_tokens, SYSTEM_PROMPT, journal_entry])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def reflect(self, journal_entry):
+        """Returns the reflection for journal_entry. API errors are raised, and never cached."""
+        key = self.cache_key(journal_entry)
+        cached = self.cache.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            metrics.count("ai_cache_hits")
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+                metrics.count("ai_cache_misses")
+            else:
+                self.joined += 1
+        if not leader:
+            return future.result()
+
+        try:
+            text = self._call_api(journal_entry)
+            self.cache.put(key, text)
+            future.set_result(text)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result()
+
+    def _call_api(self, journal_entry):
+        start = time.perf_counter()
+        with self.pool.client() as client:
+            chat_completion = client.chat.completions.create(
+                messages=build_messages(journal_entry),
+                model=self.model,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            )
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.api_seconds += elapsed
+        metrics.observe("ai_call", elapsed)
+        return chat_completion.choices[0].message.content
+
+    def stream(self, journal_entry, timeout=STREAM_TIMEOUT_SECONDS):
+        """
+        Yields the reflection in chunks as the model produces them.
+        A cached reflection is yielded in one piece; a caller asking while an identical stream is in flight
+        reads that stream (from its first chunk) instead of making another call. The full text is cached once
+        the stream completes. Raises ReflectionTimeout if the whole reflection takes longer than timeout seconds.
+        Stopping iteration early (e.g. Streamlit rerunning the script) stops the API call once no one else reads it.
+        """
+        key = self.cache_key(journal_entry)
+        cached = self.cache.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            metrics.count("ai_cache_hits")
+            yield cached
+            return
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = _SharedStream()
+                self.misses += 1
+            else:
+                self.joined += 1
+            shared.readers += 1
+        if leader:
+            metrics.count("ai_cache_misses")
+            # The API stream is read on a helper thread so waiting for the next chunk can time out
+            run = metrics.current_run() # The pump's timing goes to the rerun that started the call
+            threading.Thread(target=self._pump, args=(key, journal_entry, shared, run), name="soulsync-reflection-stream", daemon=True).start()
+
+        deadline = time.perf_counter() + timeout
+        read = 0
+        try:
+            while True:
+                with shared.changed:
+                    shared.changed.wait_for(
+                        lambda: len(shared.parts) > read or shared.finished, max(0.0, deadline - time.perf_counter())
+                    )
+                    parts = shared.parts[read:]
+                    finished, error = shared.finished, shared.error
+                if not parts and not finished:
+                    raise ReflectionTimeout(f"No complete reflection after {timeout:g} seconds")
+                for part in parts:
+                    read += 1
+                    yield part
+                if finished:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            with self._lock:
+                shared.readers -= 1
+                if not shared.readers:
+                    shared.stop.set()
+                    if self._streams.get(key) is shared:
+                        del self._streams[key] # A later request starts a fresh call rather than join one that is stopping
+
+    def _pump(self, key, journal_entry, shared, run=None):
+        start = time.perf_counter()
+        error = None
+        try:
+            complete = False
+            with self.pool.client() as client:
+                response = client.chat.completions.create(
+                    messages=build_messages(journal_entry),
+                    model=self.model,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True
+                )
+                try:
+                    for chunk in response:
+                        if shared.stop.is_set():
+                            break
+                        content = chunk.choices[0].delta.content
+                        if content:
+                            shared.publish(content)
+                    else:
+                        complete = True
+                finally:
+                    close = getattr(response, "close", None)
+                    if close is not None:
+                        close()
+            if complete:
+                self.cache.put(key, "".join(shared.parts))
+        except Exception as e:
+            error = e
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.api_seconds += elapsed
+                if self._streams.get(key) is shared:
+                    del self._streams[key]
+            with metrics.recording_for([run]):
+                metrics.observe("ai_stream", elapsed)
+            shared.publish(error=error, finished=True)
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses + self.joined
+            return {
+                "requests": requests,
+                "hits": self.hits,
+                "misses": self.misses,
+                "joined": self.joined,
+                "hit_rate": (self.hits + self.joined) / requests if requests else 0.0,
+                "avg_api_ms": self.api_seconds / self.misses * 1000 if self.misses else 0.0,
+                "cached_entries": len(self.cache)
+            }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_reflection_service():
+    """
+    Returns the process-wide reflection service. SOULSYNC_AI_CLIENT=stub uses the offline StubClient,
+    answering after SOULSYNC_AI_STUB_LATENCY seconds (default 0).
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            factory = groq_client_factory
+            if os.environ.get("SOULSYNC_AI_CLIENT") == "stub":
+                latency = float(os.environ.get("SOULSYNC_AI_STUB_LATENCY", "0"))
+                factory = lambda: StubClient(latency=latency)
+            _service = ReflectionService(client_factory=factory)
+        return _service
+
+
+def set_reflection_service(service):
+    """Replaces the process-wide reflection service (e.g. with one built on a StubClient)."""
+    global _service
+    with _service_lock:
+        _service = service
@@ -0,0 +1,229 @@
+import datetime
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+from reflection import get_reflection_service
+from search import entry_id
+
+# Background reflections for saved journal entries. Pages submit jobs and return right away;
+# a small thread pool calls the API (at most RATE calls a second, in bursts of up to BURST) and
+# attaches each reflection to its entry through the storage backend. Pages poll status() to see progress.
+WORKERS = int(os.environ.get("SOULSYNC_AI_WORKERS", "2"))
+RATE = float(os.environ.get("SOULSYNC_AI_RATE", "0.5")) # API calls per second; 0 for no limit
+BURST = int(os.environ.get("SOULSYNC_AI_BURST", "3"))
+MAX_PENDING = int(os.environ.get("SOULSYNC_AI_MAX_PENDING", "1000")) # Queued or running jobs across all users
+MAX_PENDING_PER_USER = int(os.environ.get("SOULSYNC_AI_MAX_PENDING_PER_USER", "100")) # So one backfill can't starve everyone else
+
+QUEUED = "queued"
+RUNNING = "running"
+FAILED = "failed"
+PENDING_STATES = (QUEUED, RUNNING)
+
+
+class QueueFull(RuntimeError):
+    """Raised when a job can't be queued because too many are already waiting."""
+
+
+class RateLimiter:
+    """Token bucket: on average at most rate acquisitions a second, with bursts of up to burst."""
+
+    def __init__(self, rate=RATE, burst=BURST, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a call may go ahead. Returns the seconds spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            self.sleep(delay) # Outside the lock, so other workers can check in meanwhile
+            waited += delay
+
+
+class _Job:
+    def __init__(self, backend, username, entry_id, content):
+        self.backend = backend
+        self.username = username
+        self.entry_id = entry_id
+        self.content = content
+        self.state = QUEUED
+        self.error = None
+        self.future = None
+        self.submitted = time.perf_counter()
+
+
+class ReflectionQueue:
+    """
+    Generates reflections for saved journal entries on background threads.
+    Each entry has at most one job at a time; finished jobs are dropped once their reflection is
+    saved (the backend has it from then on), failed ones are kept until the entry is submitted again.
+    """
+
+    def __init__(self, service=None, workers=WORKERS, limiter=None, max_pending=MAX_PENDING,
+                 max_pending_per_user=MAX_PENDING_PER_USER):
+        self.service = service
+        self.workers = workers
+        self.limiter = limiter if limiter is not None else RateLimiter()
+        self.max_pending = max_pending
+        self.max_pending_per_user = max_pending_per_user
+        self._jobs = {} # (username, entry id) -> _Job
+        self._pending = {} # username -> queued or running jobs
+        self._executor = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="soulsync-reflection")
+        return self._executor
+
+    def submit(self, backend, username, entry):
+        """
+        Queues a reflection for a saved journal entry and returns its id right away.
+        An entry that already has a queued or running job isn't queued twice.
+        Raises QueueFull if too many jobs are waiting (overall or for this user).
+        """
+        key = (username, entry_id(entry))
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.state in PENDING_STATES:
+                return key[1]
+            total = sum(self._pending.values())
+            if total >= self.max_pending or self._pending.get(username, 0) >= self.max_pending_per_user:
+                raise QueueFull(f"{total} reflections are already waiting")
+            job = self._jobs[key] = _Job(backend, username, key[1], entry["content"])
+            self._pending[username] = self._pending.get(username, 0) + 1
+            job.future = self._ensure_started().submit(self._run, job)
+        metrics.count("ai_jobs_submitted")
+        return key[1]
+
+    def backfill(self, backend, username):
+        """
+        Queues reflections for a user's saved entries that don't have one yet (archived ones too), newest first.
+        Stops early once the queue is full. Returns how many jobs were queued
+        (0 if there was nothing to queue); raises QueueFull if there was, but none of it fit.
+        """
+        reflected = backend.get_reflections(username)
+        entries = [e for e in backend.iter_entries(username, "journals", archived=True) if entry_id(e) not in reflected]
+        known = self.status(username)
+        queued = 0
+        for entry in reversed(entries):
+            if entry_id(entry) in known:
+                continue # Already queued, running, or failed (failed ones are retried one by one)
+            try:
+                self.submit(backend, username, entry)
+            except QueueFull:
+                if not queued:
+                    raise
+                break
+            queued += 1
+        return queued
+
+    def status(self, username, entry_ids=None):
+        """Returns {entry id: {'state', 'error'}} for the user's queued, running and failed jobs (optionally only entry_ids)."""
+        with self._lock:
+            jobs = [job for (name, _), job in self._jobs.items() if name == username]
+        wanted = None if entry_ids is None else set(entry_ids)
+        return {
+            job.entry_id: {"state": job.state, "error": job.error}
+            for job in jobs if wanted is None or job.entry_id in wanted
+        }
+
+    def pending(self, username=None):
+        """Returns how many jobs are queued or running (for one user, or for everyone)."""
+        with self._lock:
+            return self._pending.get(username, 0) if username is not None else sum(self._pending.values())
+
+    def join(self, timeout=None):
+        """Waits until no job is queued or running. Returns False if timeout ran out first."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not any(self._pending.values()), timeout)
+
+    def _run(self, job):
+        service = self.service or get_reflection_service()
+        with self._lock:
+            job.state = RUNNING
+        metrics.observe("ai_job_wait", time.perf_counter() - job.submitted)
+        try:
+            if service.cache.get(service.cache_key(job.content)) is None:
+                metrics.observe("ai_rate_limited", self.limiter.acquire()) # Cached reflections cost no API call
+            text = service.reflect(job.content)
+            job.backend.save_reflection(job.username, job.entry_id, text, datetime.datetime.now().isoformat())
+        except Exception as e:
+            with self._lock:
+                job.state = FAILED
+                job.error = e
+                self.failed += 1
+            metrics.count("ai_jobs_failed")
+        else:
+            with self._lock:
+                del self._jobs[(job.username, job.entry_id)]
+                self.completed += 1
+            metrics.count("ai_jobs_completed")
+        finally:
+            with self._idle:
+                self._pending[job.username] -= 1
+                if not self._pending[job.username]:
+                    del self._pending[job.username]
+                self._idle.notify_all()
+            metrics.observe("ai_job", time.perf_counter() - job.submitted)
+
+    def shutdown(self, wait=True):
+        """Stops the worker threads; jobs that haven't started are dropped."""
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._executor = None
+        with self._idle:
+            for key, job in list(self._jobs.items()):
+                if job.future.cancelled():
+                    del self._jobs[key]
+                    self._pending[job.username] -= 1
+                    if not self._pending[job.username]:
+                        del self._pending[job.username]
+            self._idle.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {"pending": sum(self._pending.values()), "completed": self.completed, "failed": self.failed}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_reflection_queue():
+    """Returns the process-wide reflection queue (it uses the process-wide reflection service)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ReflectionQueue()
+        return _queue
+
+
+def set_reflection_queue(reflection_queue):
+    """Replaces the process-wide reflection queue (e.g. with one built on a StubClient service)."""
+    global _queue
+    with _queue_lock:
+        if _queue is not None and _queue is not reflection_queue:
+            _queue.shutdown(wait=False)
+        _queue = reflection_queue
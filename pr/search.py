@@ -0,0 +1,183 @@
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+
+from storage.cache import UserObjectCache
+from storage.mood_store import NO_TIME, time_key
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+MAX_CACHED_INDEXES = 32 # Users whose journal index is kept in memory at once
+MAX_CACHED_QUERIES = 16 # Ranked results kept per index, so paging and reruns don't re-rank
+
+# BM25 ranking parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    """Lowercases text and splits it into word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def entry_id(entry):
+    """Returns a journal entry's id. Entries saved before ids existed get a stable id from their content."""
+    if entry.get("id"):
+        return entry["id"]
+    digest = hashlib.sha1(f"{entry['timestamp']}\n{entry['content']}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def parse_query(query):
+    """Splits a query into quoted phrases (token lists) and free terms."""
+    phrases = [tokenize(phrase) for phrase in PHRASE_PATTERN.findall(query)]
+    phrases = [phrase for phrase in phrases if phrase]
+    terms = tokenize(PHRASE_PATTERN.sub(" ", query))
+    return phrases, terms
+
+
+class JournalIndex:
+    """
+    Inverted index over one user's journal entries: term -> {entry id: [token positions]}.
+    Entries are added incrementally; queries touch only the postings of the query terms.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.entries = {} # entry id -> entry dict (shared, not copied)
+        self.lengths = {} # entry id -> number of tokens
+        self.total_length = 0
+        self._lock = threading.Lock() # Sessions search while others save entries
+        self._results = OrderedDict() # (query, start, end) -> ranked entry ids
+
+    def add(self, entry):
+        with self._lock:
+            self._add(entry)
+
+    def _add(self, entry):
+        doc_id = entry_id(entry)
+        if doc_id in self.entries:
+            return
+        tokens = tokenize(entry["content"])
+        positions = {}
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, []).append(position)
+        postings = self.postings
+        for token, token_positions in positions.items():
+            postings.setdefault(token, {})[doc_id] = token_positions
+        self.entries[doc_id] = entry
+        self.lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+        self._results.clear() # Rankings depend on every entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _has_phrase(self, doc_id, phrase):
+        # Positions of each following word must line up one after another
+        starts = set(self.postings[phrase[0]][doc_id])
+        for offset, token in enumerate(phrase[1:], start=1):
+            positions = self.postings[token][doc_id]
+            starts &= {position - offset for position in positions}
+            if not starts:
+                return False
+        return True
+
+    def search(self, query, start=None, end=None, page=1, per_page=10):
+        """
+        Ranks entries matching every word of query (BM25); "quoted phrases" must appear verbatim.
+        start/end limit results to ISO timestamps in [start, end). Returns (entries for the page, total matches).
+        """
+        with self._lock:
+            key = (query, start, end)
+            ranked = self._results.get(key)
+            if ranked is None:
+                ranked = self._rank(query, start, end)
+                self._results[key] = ranked
+                while len(self._results) > MAX_CACHED_QUERIES:
+                    self._results.popitem(last=False)
+            else:
+                self._results.move_to_end(key)
+            first = (page - 1) * per_page
+            return [self.entries[doc_id] for doc_id in ranked[first:first + per_page]], len(ranked)
+
+    def _rank(self, query, start, end):
+        """Returns the ids of all matching entries, best first."""
+        phrases, terms = parse_query(query)
+        required = set(terms)
+        for phrase in phrases:
+            required.update(phrase)
+        if not required or any(token not in self.postings for token in required):
+            return []
+
+        # Intersect starting from the rarest term to keep the candidate set small
+        ordered = sorted(required, key=lambda token: len(self.postings[token]))
+        candidates = set(self.postings[ordered[0]])
+        for token in ordered[1:]:
+            candidates.intersection_update(self.postings[token])
+            if not candidates:
+                return []
+
+        entries = self.entries
+        if start is not None or end is not None:
+            # Compared as parsed times, not strings; entries without a usable timestamp match no range
+            start = time_key(start) if start is not None else NO_TIME + 1
+            end = time_key(end) if end is not None else None
+            keys = {doc_id: time_key(entries[doc_id].get("timestamp")) for doc_id in candidates}
+            candidates = {doc_id for doc_id, key in keys.items() if key >= start and (end is None or key < end)}
+        if phrases:
+            candidates = {doc_id for doc_id in candidates if all(self._has_phrase(doc_id, p) for p in phrases)}
+
+        # BM25 score per candidate
+        n_docs = len(entries)
+        avg_length = self.total_length / n_docs if n_docs else 1
+        lengths = self.lengths
+        norms = {doc_id: K1 * (1 - B + B * lengths[doc_id] / avg_length) for doc_id in candidates}
+        scores = dict.fromkeys(candidates, 0.0)
+        for token in required:
+            postings = self.postings[token]
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id in candidates:
+                tf = len(postings[doc_id])
+                scores[doc_id] += idf * tf * (K1 + 1) / (tf + norms[doc_id])
+
+        # Best score first; ties go to the most recent entry
+        return sorted(candidates, key=lambda doc_id: (scores[doc_id], time_key(entries[doc_id].get("timestamp"))), reverse=True)
+
+
+_indexes = UserObjectCache(MAX_CACHED_INDEXES)
+_archived_indexes = UserObjectCache(MAX_CACHED_INDEXES) # Also covering archived entries, only built when asked for
+
+
+def journal_index_version(backend, username):
+    """Returns the version token the user's journal indexes are stamped with."""
+    return (backend.journal_version(username), backend.archive_horizon(username))
+
+
+def get_journal_index(backend, username, archived=False):
+    """
+    Returns the user's journal index, shared by every session in the process.
+    It is built from the backend on first use and rebuilt only if the journals changed behind its back.
+    With archived=True the index also covers archived entries (their segments are read to build it).
+    """
+    def build():
+        index = JournalIndex()
+        for entry in backend.iter_entries(username, "journals", archived=archived):
+            index.add(entry)
+        return index
+
+    cache = _archived_indexes if archived else _indexes
+    return cache.get(username, journal_index_version(backend, username), build)
+
+
+def index_journal_entry(backend, username, entry, previous):
+    """
+    Adds a just-saved entry to the user's indexes (those that are loaded) instead of rebuilding them.
+    previous is journal_index_version() from before the entry was saved; an index at another version
+    also missed someone else's entry, so it is dropped and rebuilt on next use.
+    """
+    version = journal_index_version(backend, username)
+    for cache in (_indexes, _archived_indexes):
+        cache.update(username, lambda index: index.add(entry), version, previous)
@@ -0,0 +1,51 @@
+"""
+Storage layer for SoulSync.
+Pages get a backend from get_backend() and only use the StorageBackend methods.
+Set SOULSYNC_BACKEND=sqlite to use SQLite instead of the per-user JSON shards.
+"""
+import os
+
+from storage.base import GOAL_ORDERS, GOAL_STATUSES, StorageBackend
+from storage.json_backend import JsonBackend
+from storage.mood_store import MOOD_EMOJIS
+from storage.shards import DATA_DIR
+
+BACKEND_ENV = "SOULSYNC_BACKEND"
+SQLITE_PATH_ENV = "SOULSYNC_SQLITE_PATH"
+DEFAULT_SQLITE_PATH = "soulsync.db"
+
+_backend = None
+
+
+def create_backend(name, sqlite_path=None):
+    """Builds a backend by name ('json' or 'sqlite')."""
+    if name == "json":
+        return JsonBackend()
+    if name == "sqlite":
+        from storage.sqlite_backend import SqliteBackend
+        return SqliteBackend(sqlite_path or os.environ.get(SQLITE_PATH_ENV, DEFAULT_SQLITE_PATH))
+    raise ValueError(f"Unknown storage backend: {name!r}")
+
+
+def get_backend():
+    """Returns the process-wide backend selected by SOULSYNC_BACKEND (default: json)."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(os.environ.get(BACKEND_ENV, "json"))
+    return _backend
+
+
+def copy_users(source, target):
+    """Copies every user from one backend into another. Users already in target are skipped."""
+    copied = 0
+    for username in source.list_usernames():
+        if target.user_exists(username):
+            continue
+        user_data = source.get_user(username, include_entries=False)
+        target.create_user(username, user_data.get("password", ""), user_data.get("email", ""))
+        for goal in user_data["goals"]:
+            target.upsert_goal(username, goal)
+        for collection in ("moods", "journals"): # Archived entries too; the target can archive them again
+            target.replace_entries(username, collection, list(source.iter_entries(username, collection, archived=True)))
+        copied += 1
+    return copied
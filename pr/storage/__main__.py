@@ -0,0 +1,91 @@
+import argparse
+
+from storage import copy_users, create_backend, get_backend
+from storage.archive import DEFAULT_ARCHIVE_DAYS, horizon_for
+from storage.ndjson import BATCH_SIZE, export_ndjson, import_ndjson
+from storage.shards import LEGACY_USER_DATA_FILE, archive_user, compact_user, list_usernames, migrate_users_json, rebuild_credentials, rebuild_rollups
+
+
+def main():
+    """Command line entry point: python -m storage <command>"""
+    parser = argparse.ArgumentParser(prog="python -m storage", description="SoulSync storage maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="Split the legacy users.json into per-user shards")
+    migrate.add_argument("--source", default=LEGACY_USER_DATA_FILE, help="Path to the legacy users.json")
+
+    compact = commands.add_parser("compact", help="Compact the append-only mood/journal logs")
+    compact.add_argument("usernames", nargs="*", help="Users to compact (default: everyone)")
+
+    rollups = commands.add_parser("rebuild-rollups", help="Recompute the dashboard's mood rollups from the mood logs")
+    rollups.add_argument("usernames", nargs="*", help="Users to rebuild (default: everyone)")
+
+    archive = commands.add_parser("archive", help="Move old moods and journal entries into compressed monthly archives")
+    archive.add_argument("usernames", nargs="*", help="Users to archive (default: everyone)")
+    archive.add_argument("--days", type=int, default=DEFAULT_ARCHIVE_DAYS, help="Archive entries older than this many days (default: $SOULSYNC_ARCHIVE_DAYS or 365)")
+
+    commands.add_parser("rebuild-credentials", help="Recompute the login credential index from the user profiles")
+
+    copy = commands.add_parser("copy", help="Copy every user from one backend to another")
+    copy.add_argument("source", choices=["json", "sqlite"])
+    copy.add_argument("target", choices=["json", "sqlite"])
+    copy.add_argument("--sqlite-path", default=None, help="SQLite database file (default: $SOULSYNC_SQLITE_PATH or soulsync.db)")
+
+    export = commands.add_parser("export", help="Stream every user to an NDJSON backup (resumes from its checkpoint)")
+    export.add_argument("output", help="NDJSON file to write")
+    export.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+
+    restore = commands.add_parser("import", help="Stream users from an NDJSON backup into storage (resumes from its checkpoint)")
+    restore.add_argument("input", help="NDJSON file to read")
+    restore.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    restore.add_argument("--accept-invalid", action="store_true", help="Import entries that fail validation anyway (they are still reported)")
+    restore.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Entries written to storage at a time")
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        count = migrate_users_json(args.source)
+        print(f"Migrated {count} user(s) from {args.source}.")
+    elif args.command == "compact":
+        usernames = args.usernames or list_usernames()
+        for username in usernames:
+            compact_user(username)
+        print(f"Compacted logs for {len(usernames)} user(s).")
+    elif args.command == "rebuild-rollups":
+        usernames = args.usernames or list_usernames()
+        for username in usernames:
+            rebuild_rollups(username)
+        print(f"Rebuilt mood rollups for {len(usernames)} user(s).")
+    elif args.command == "archive":
+        horizon = horizon_for(args.days)
+        usernames = args.usernames or list_usernames()
+        moved = {"moods": 0, "journals": 0}
+        for username in usernames:
+            for collection, count in archive_user(username, horizon).items():
+                moved[collection] += count
+        print(f"Archived {moved['moods']} mood(s) and {moved['journals']} journal entries from before {horizon} for {len(usernames)} user(s).")
+    elif args.command == "rebuild-credentials":
+        rebuild_credentials()
+        print(f"Rebuilt the credential index for {len(list_usernames())} user(s).")
+    elif args.command == "copy":
+        source = create_backend(args.source, args.sqlite_path)
+        target = create_backend(args.target, args.sqlite_path)
+        count = copy_users(source, target)
+        print(f"Copied {count} user(s) from {args.source} to {args.target}.")
+    elif args.command == "export":
+        stats = export_ndjson(get_backend(), args.output, restart=args.restart)
+        print(f"Exported {stats['users']} user(s), {stats['goals']} goal(s), {stats['moods']} mood(s) and {stats['journals']} journal entries to {args.output}.")
+        if stats["invalid"]:
+            print(f"{stats['invalid']} record(s) would fail validation on import (exported as they are).")
+    elif args.command == "import":
+        stats = import_ndjson(get_backend(), args.input, restart=args.restart, accept_invalid=args.accept_invalid, batch_size=args.batch_size)
+        print(
+            f"Imported {stats['users']} user(s), {stats['goals']} goal(s), {stats['moods']} mood(s) and {stats['journals']} journal entries "
+            f"from {args.input} ({stats['skipped_users']} existing user(s) skipped)."
+        )
+        if stats["invalid"]:
+            action = "imported anyway where possible" if args.accept_invalid else "skipped"
+            print(f"{stats['invalid']} invalid record(s) {action}; see {args.input}.rejects.")
+
+
+if __name__ == "__main__":
+    main()
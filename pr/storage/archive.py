@@ -0,0 +1,124 @@
+import datetime
+import gzip
+import json
+import os
+
+from metrics import metrics
+from storage.mood_store import NO_TIME, format_time, time_key
+from storage.rollups import add_mood, empty_rollups, merge_rollups
+
+# Cold tier for old moods and journal entries. Entries older than a horizon are moved out of a user's
+# hot store into one gzip-compressed JSON Lines segment per collection and month:
+#   <shard>/archive/moods/2024-03.jsonl.gz, <shard>/archive/journals/2024-03.jsonl.gz
+# plus <shard>/archive/summary.json, small enough to read on every dashboard render:
+#   {"horizon": "2024-06-01T00:00:00", "moods": {"2024-03": {"count": 41, "rollups": {...}}}, "journals": {"2024-03": {"count": 9}}}
+# Segments are only opened when someone browses or searches past the horizon.
+
+ARCHIVE_DIR = "archive"
+SUMMARY_FILE = "summary.json"
+ARCHIVE_DAYS_ENV = "SOULSYNC_ARCHIVE_DAYS"
+DEFAULT_ARCHIVE_DAYS = int(os.environ.get(ARCHIVE_DAYS_ENV, "365")) # Entries older than this are archived
+
+
+def horizon_for(days, today=None):
+    """Returns the ISO timestamp (midnight, `days` days ago) before which entries are archived."""
+    today = today or datetime.date.today()
+    return datetime.datetime.combine(today - datetime.timedelta(days=days), datetime.time()).isoformat()
+
+
+def segment_path(archive_dir, collection, month):
+    return os.path.join(archive_dir, collection, f"{month}.jsonl.gz")
+
+
+def sort_key(entry):
+    return time_key(entry.get("timestamp"))
+
+
+def split(entries, horizon):
+    """
+    Splits entries into (kept, {month: archived entries}) around horizon.
+    Entries whose timestamp can't be parsed are never archived, since their age is unknown.
+    """
+    limit = time_key(horizon)
+    kept = []
+    by_month = {}
+    for entry in entries:
+        key = sort_key(entry)
+        if key == NO_TIME or key >= limit:
+            kept.append(entry)
+        else:
+            by_month.setdefault(format_time(key)[:7], []).append(entry)
+    return kept, by_month
+
+
+def read_segment(path):
+    """Returns the entries of one archived month, oldest first (empty if the segment doesn't exist)."""
+    if not os.path.exists(path):
+        return []
+    with metrics.timer("archive_read"), gzip.open(path, "rt", encoding="utf-8") as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+    metrics.count("bytes_read", os.path.getsize(path))
+    return entries
+
+
+def write_segment(path, entries):
+    """
+    Adds entries to a month's segment (rewritten atomically) and returns its full contents.
+    Entries already in the segment aren't added twice, so an interrupted archive run can simply be repeated.
+    """
+    existing = read_segment(path)
+    seen = {json.dumps(entry, sort_keys=True) for entry in existing}
+    merged = list(existing)
+    for entry in entries:
+        key = json.dumps(entry, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            merged.append(entry)
+    merged.sort(key=sort_key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+        for entry in merged:
+            file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    with open(tmp_path, "rb") as file:
+        os.fsync(file.fileno())
+    metrics.count("bytes_written", os.path.getsize(tmp_path))
+    os.replace(tmp_path, path)
+    return merged
+
+
+def month_summary(collection, entries):
+    """Summarizes one archived month: its entry count, plus mood rollups for moods."""
+    summary = {"count": len(entries)}
+    if collection == "moods":
+        rollups = empty_rollups()
+        for entry in entries:
+            add_mood(rollups, entry)
+        summary["rollups"] = rollups
+    return summary
+
+
+def update_summary(summary, collection, horizon, months):
+    """Records freshly written months ({month: full segment contents}) in an archive summary and returns it."""
+    summary = summary or {"horizon": None, "moods": {}, "journals": {}}
+    if summary["horizon"] is None or horizon > summary["horizon"]:
+        summary["horizon"] = horizon
+    for month, entries in months.items():
+        summary[collection][month] = month_summary(collection, entries)
+    return summary
+
+
+def archived_rollups(summary):
+    """Returns the mood rollups of every archived month combined."""
+    rollups = empty_rollups()
+    for month in (summary or {}).get("moods", {}).values():
+        merge_rollups(rollups, month["rollups"])
+    return rollups
+
+
+def months_in_range(summary, collection, start=None, end=None):
+    """Returns the archived months of a collection (oldest first) that can hold timestamps in [start, end)."""
+    months = sorted((summary or {}).get(collection, {}))
+    first = format_time(time_key(start))[:7] if start is not None and time_key(start) != NO_TIME else None
+    last = format_time(time_key(end))[:7] if end is not None and time_key(end) != NO_TIME else None
+    return [m for m in months if (first is None or m >= first) and (last is None or m <= last)]
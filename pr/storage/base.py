@@ -0,0 +1,208 @@
+from array import array
+
+from storage.mood_store import MOOD_CODES, time_key
+
+GOAL_STATUSES = ["To Do", "In Progress", "Completed", "Cancelled"]
+GOAL_ORDERS = ("due_asc", "due_desc", "status") # Orders list_goals() can return goals in besides the order they were added
+
+
+def in_range(timestamp, start=None, end=None):
+    """Checks an ISO timestamp string against an optional [start, end) range of ISO strings."""
+    if start is not None and timestamp < start:
+        return False
+    if end is not None and timestamp >= end:
+        return False
+    return True
+
+
+class StorageBackend:
+    """
+    Interface every storage engine implements.
+    Pages only talk to these methods, never to the files or tables behind them.
+    Timestamps are ISO 8601 strings; ranges are half-open [start, end).
+    Backends may move old entries to an archive (see archive_horizon). Entry reads cover the hot entries
+    unless they pass archived=True; paging through history carries on into the archive by itself.
+    """
+
+    # --- Users ---
+    def list_usernames(self):
+        """Returns every registered username, sorted."""
+        raise NotImplementedError
+
+    def user_exists(self, username):
+        """Checks whether a username is registered."""
+        raise NotImplementedError
+
+    def get_profile(self, username):
+        """Returns {'password', 'email'} for a user, or None if they don't exist."""
+        raise NotImplementedError
+
+    def create_user(self, username, password, email):
+        """Registers a new user with empty goals, moods, and journals. Raises ValueError if the username is taken."""
+        raise NotImplementedError
+
+    def update_profile(self, username, password, email):
+        """Changes a user's password and email. Raises KeyError if the user doesn't exist."""
+        raise NotImplementedError
+
+    def get_user(self, username, include_entries=True):
+        """
+        Returns the full user record in the original users.json shape, or None. The record is the caller's own copy.
+        Pass include_entries=False to skip moods and journals. Archived entries are left out.
+        """
+        profile = self.get_profile(username)
+        if profile is None:
+            return None
+        user_data = dict(profile)
+        user_data["goals"] = self.list_goals(username)
+        if include_entries:
+            user_data["moods"] = self.list_moods(username)
+            user_data["journals"] = self.list_journals(username)
+        return user_data
+
+    # --- Moods ---
+    def append_mood(self, username, entry):
+        """Stores one mood entry."""
+        raise NotImplementedError
+
+    def list_moods(self, username, start=None, end=None, archived=False):
+        """
+        Returns a user's mood entries in timestamp order, optionally limited to [start, end).
+        With archived=True, archived moods in the range are included (their months are read on demand).
+        """
+        raise NotImplementedError
+
+    def mood_columns(self, username, start=None, end=None):
+        """
+        Returns a user's moods as parallel columns {'timestamp': [...], 'mood_text': [...]} in timestamp order,
+        ready to be loaded into typed arrays without building a dict per entry.
+        """
+        moods = self.list_moods(username, start, end)
+        return {
+            "timestamp": [entry["timestamp"] for entry in moods],
+            "mood_text": [entry["mood_text"] for entry in moods]
+        }
+
+    def mood_arrays(self, username, start=None, end=None, archived=False):
+        """
+        Returns a user's moods as typed arrays in timestamp order: {'epoch_us': int64 microseconds since 1970
+        (mood_store.NO_TIME if unparseable), 'code': uint8 index into 'moods', 'moods': list of mood names}.
+        Optionally limited to [start, end); see list_moods for archived.
+        Backends with a compact mood store hand these out without building anything per entry.
+        """
+        columns = self.mood_columns(username, start, end)
+        moods = list(MOOD_CODES)
+        codes = array("B")
+        for mood in columns["mood_text"]:
+            mood = mood or ""
+            if mood not in moods:
+                moods.append(mood)
+            codes.append(moods.index(mood))
+        epoch_us = array("q", [time_key(timestamp) for timestamp in columns["timestamp"]])
+        return {"epoch_us": epoch_us, "code": codes, "moods": moods}
+
+    def mood_version(self, username):
+        """Like journal_version, but for a user's moods."""
+        raise NotImplementedError
+
+    def data_version(self, username):
+        """
+        Returns a string that changes whenever anything in a user's profile, goals, moods or journals changes.
+        Unlike journal_version and mood_version it stays comparable across processes and restarts,
+        so batch jobs can skip users that haven't changed since their last run.
+        """
+        raise NotImplementedError
+
+    def get_mood_rollups(self, username):
+        """
+        Returns precomputed mood counts: {'day': {'2025-07-25': {mood: count}}, 'skipped': n}.
+        They are updated incrementally by append_mood, so reading them doesn't depend on history length.
+        """
+        raise NotImplementedError
+
+    # --- Journals ---
+    def append_journal(self, username, entry):
+        """Stores one journal entry."""
+        raise NotImplementedError
+
+    def list_journals(self, username, start=None, end=None, archived=False):
+        """Returns a user's journal entries in timestamp order, optionally limited to [start, end). See list_moods for archived."""
+        raise NotImplementedError
+
+    def journal_version(self, username):
+        """
+        Returns a cheap token that changes whenever a user's journals change,
+        so in-memory structures built from them (like the search index) know when to rebuild.
+        """
+        raise NotImplementedError
+
+    def page_entries(self, username, collection, limit, cursor=None):
+        """
+        Returns a page of a user's 'moods' or 'journals', newest first, as (entries, cursor).
+        Only the page itself is read. Pass cursor back to get the next older page; it is None on the last page.
+        """
+        raise NotImplementedError
+
+    def replace_entries(self, username, collection, entries):
+        """Replaces all of a user's 'moods' or 'journals' at once (migrations and bulk saves)."""
+        raise NotImplementedError
+
+    def append_entries(self, username, collection, entries):
+        """Appends a batch of 'moods' or 'journals' (bulk imports). Backends write the batch in one go."""
+        append = {"moods": self.append_mood, "journals": self.append_journal}[collection]
+        for entry in entries:
+            append(username, entry)
+
+    def iter_entries(self, username, collection, archived=False):
+        """
+        Yields a user's 'moods' or 'journals' oldest first (archived ones first, with archived=True).
+        Backends stream them instead of loading them all.
+        """
+        entries = self.list_moods(username, archived=archived) if collection == "moods" else self.list_journals(username, archived=archived)
+        yield from entries
+
+    # --- Reflections ---
+    def save_reflection(self, username, entry_id, text, created_at):
+        """Attaches an AI reflection to a journal entry (by search.entry_id), replacing any earlier one."""
+        raise NotImplementedError
+
+    def get_reflections(self, username):
+        """Returns {entry id: {'text', 'timestamp'}} for every journal entry of a user that has a reflection."""
+        raise NotImplementedError
+
+    # --- Archive ---
+    def archive_horizon(self, username):
+        """Returns the ISO timestamp before which a user's entries may have been archived, or None if none were."""
+        return None
+
+    def archive_summary(self, username):
+        """Returns {'horizon', 'moods', 'journals'} (archived entry counts) for a user, or None if nothing is archived."""
+        return None
+
+    # --- Goals ---
+    def list_goals(self, username, statuses=None, order=None):
+        """
+        Returns a user's goals, optionally only those whose status is in statuses.
+        order is one of GOAL_ORDERS ('due_asc', 'due_desc', 'status'), or None for the order they were added in.
+        """
+        raise NotImplementedError
+
+    def get_goal(self, username, goal_id):
+        """Returns one goal by id, or None."""
+        raise NotImplementedError
+
+    def upsert_goal(self, username, goal):
+        """Inserts a goal, or replaces the goal with the same id."""
+        raise NotImplementedError
+
+    def delete_goal(self, username, goal_id):
+        """Deletes a goal by id. Deleting a missing goal is a no-op."""
+        raise NotImplementedError
+
+    def count_goals_by_status(self, username):
+        """Returns {status: count} for every status in GOAL_STATUSES."""
+        counts = {status: 0 for status in GOAL_STATUSES}
+        for goal in self.list_goals(username):
+            if goal["status"] in counts:
+                counts[goal["status"]] += 1
+        return counts
@@ -0,0 +1,142 @@
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import metrics
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get("SOULSYNC_CACHE_MB", "64")) * 1024 * 1024)
+
+
+class FileCache:
+    """
+    Process-wide cache of parsed files, shared by every Streamlit session.
+    An entry is reused while the file's (mtime, size) and its write version are unchanged.
+    Writers in this process call invalidate() so a change is seen even when mtime doesn't move.
+    Paths whose own stat doesn't change on a write (like a mood store directory) pass a stamp function
+    that returns a token which does (None if the path doesn't exist).
+    Memory is bounded by the on-disk size of the cached files (or a value's own nbytes, for values
+    cached under a directory like the mood store); the least recently used are evicted first.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # path -> (stamp, size, value)
+        self._versions = {} # path -> write version counter
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _stamp(self, path, stamp=None):
+        token = stamp(path) if stamp is not None else _stat_token(path)
+        if token is None:
+            return None
+        return (token, self._versions.get(path, 0))
+
+    def get(self, path, loader, stamp=None):
+        """Returns the parsed contents of path, calling loader(path) only if the file changed (see stamp above)."""
+        with self._lock:
+            stamp = self._stamp(path, stamp)
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                metrics.count("file_cache_hits")
+                return cached[2]
+            self.misses += 1
+            metrics.count("file_cache_misses")
+        # Parse outside the lock so one slow file doesn't block every other session
+        value = loader(path)
+        size = getattr(value, "nbytes", None)
+        if size is None:
+            size = stamp[0][1] if stamp else 0 # The file's size on disk
+        with self._lock:
+            self._drop(path)
+            if size <= self.max_bytes:
+                self._entries[path] = (stamp, size, value)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    self._drop(next(iter(self._entries)))
+        return value
+
+    def version(self, path, stamp=None):
+        """Returns a token that changes whenever path changes, for objects derived from its contents."""
+        with self._lock:
+            return self._stamp(path, stamp)
+
+    def invalidate(self, path):
+        """Bumps the write version of path so the next get() re-reads it."""
+        with self._lock:
+            self._versions[path] = self._versions.get(path, 0) + 1
+            self._drop(path)
+
+    def _drop(self, path):
+        cached = self._entries.pop(path, None)
+        if cached is not None:
+            self._bytes -= cached[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns hit/miss counters and current memory use, for debugging."""
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+def _stat_token(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+file_cache = FileCache()
+
+
+class UserObjectCache:
+    """
+    Keeps per-user objects derived from stored data (e.g. the journal search index) in memory,
+    shared by every session. Each object remembers the backend version token it was built from;
+    a different token means the data changed behind its back and it is rebuilt.
+    At most max_users objects are kept; the least recently used are dropped.
+    """
+
+    def __init__(self, max_users):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._objects = OrderedDict() # username -> (version, object)
+
+    def get(self, username, version, build):
+        """Returns the cached object for username if it matches version, else build() (outside the lock)."""
+        with self._lock:
+            cached = self._objects.get(username)
+            if cached is not None and cached[0] == version:
+                self._objects.move_to_end(username)
+                return cached[1]
+        obj = build()
+        with self._lock:
+            self._objects[username] = (version, obj)
+            self._objects.move_to_end(username)
+            while len(self._objects) > self.max_users:
+                self._objects.popitem(last=False)
+        return obj
+
+    def update(self, username, apply, version, previous):
+        """
+        Applies apply(obj) to a loaded object and records the new version. Does nothing if it isn't loaded.
+        previous is the version read before the change was saved: an object at any other version
+        missed some other change, so it is dropped instead, to be rebuilt on next use.
+        """
+        with self._lock:
+            cached = self._objects.get(username)
+            if cached is None:
+                return
+            if cached[0] != previous:
+                del self._objects[username]
+                return
+            apply(cached[1])
+            self._objects[username] = (version, cached[1])
@@ -0,0 +1,197 @@
+import json
+import os
+
+from metrics import metrics
+
+# Appending one entry is a single small write + fsync. Readers tolerate a torn last line
+# (e.g. the process died mid-append) and compaction cleans it up afterwards.
+# Logs are kept in timestamp order, so the newest entries can be read from the end of the file.
+
+READ_BLOCK = 16 * 1024 # Bytes read at a time when reading a log backwards
+
+
+def _has_torn_tail(path):
+    """Checks whether a log's last line is missing its newline."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, "rb") as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) != b"\n"
+
+
+def _parse_line(line):
+    """Parses one log line, or returns None for blank and corrupt lines."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return None
+
+
+def read_tail(path, limit, before=None):
+    """
+    Reads up to limit entries from the end of a log, newest first, without reading the rest of the file.
+    Returns (entries, cursor): pass cursor as before to get the next older page; it is None once the start
+    of the log is reached. A cursor is a byte offset, so after a compaction rewrites the log
+    a page may repeat or skip a few entries.
+    """
+    if not os.path.exists(path):
+        return [], None
+    entries = []
+    cursor = None
+    with open(path, "rb") as file:
+        position = file.seek(0, os.SEEK_END) if before is None else before
+        carry = b"" # Start of a line that began in an earlier block
+        while position > 0:
+            size = min(READ_BLOCK, position)
+            position -= size
+            file.seek(position)
+            buffer = file.read(size) + carry
+            metrics.count("bytes_read", size)
+            lines = buffer.split(b"\n")
+            carry = lines[0]
+            line_end = position + len(buffer)
+            for line in reversed(lines[1:]):
+                line_start = line_end - len(line)
+                entry = _parse_line(line)
+                if entry is not None:
+                    if len(entries) == limit:
+                        return entries, cursor # One more entry exists, so there is an older page
+                    entries.append(entry)
+                    cursor = line_start
+                line_end = line_start - 1 # Skip the newline
+        entry = _parse_line(carry) # First line of the file
+        if entry is not None:
+            if len(entries) == limit:
+                return entries, cursor
+            entries.append(entry)
+    return entries, None
+
+
+def _in_order(path, entries):
+    """Checks whether appending entries keeps a log in timestamp order."""
+    timestamps = [str(entry.get("timestamp", "")) for entry in entries]
+    if timestamps != sorted(timestamps):
+        return False
+    last, _ = read_tail(path, 1)
+    return not last or str(last[0].get("timestamp", "")) <= timestamps[0]
+
+
+def append_entries(path, entries):
+    """
+    Appends entries to a JSON Lines log with a single write and fsync.
+    Entries older than the end of the log (e.g. imported history) are merged in with a compaction instead,
+    so the log stays in timestamp order.
+    """
+    if entries and not _in_order(path, entries):
+        compact(path, _scan(path)[0] + list(entries))
+        return
+    data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+    if _has_torn_tail(path):
+        data = "\n" + data # Don't glue the new entries onto a half-written line
+    with open(path, "a") as file:
+        file.write(data)
+        metrics.count("bytes_written", len(data.encode("utf-8")))
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def append_entry(path, entry):
+    """Appends one entry to a JSON Lines log and fsyncs it to disk."""
+    append_entries(path, [entry])
+
+
+def _scan(path):
+    """
+    Reads every valid entry from a log.
+    Returns (entries, needs_compaction) where needs_compaction is True if corrupt lines
+    or out-of-order timestamps were found.
+    """
+    entries = []
+    needs_compaction = False
+    if not os.path.exists(path):
+        return entries, needs_compaction
+    last_timestamp = ""
+    with metrics.timer("log_parse"), open(path, "r") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                needs_compaction = True # Torn write or garbage, drop it on the next compaction
+                continue
+            timestamp = str(entry.get("timestamp", ""))
+            if timestamp < last_timestamp:
+                needs_compaction = True
+            last_timestamp = max(last_timestamp, timestamp)
+            entries.append(entry)
+        metrics.count("bytes_read", file.tell())
+    return entries, needs_compaction
+
+
+def iter_entries(path):
+    """Yields a log's valid entries in file order, one line at a time (for streaming exports)."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as file:
+        for line in file:
+            entry = _parse_line(line)
+            if entry is not None:
+                yield entry
+        metrics.count("bytes_read", file.tell())
+
+
+def _clean(entries):
+    """Orders entries by timestamp and drops exact duplicates (e.g. from a retried append)."""
+    seen = set()
+    cleaned = []
+    for entry in sorted(entries, key=lambda e: str(e.get("timestamp", ""))):
+        key = json.dumps(entry, sort_keys=True)
+        if key in seen:
+            continue
+        seen.add(key)
+        cleaned.append(entry)
+    return cleaned
+
+
+def read_entries(path, on_dirty=None):
+    """
+    Rebuilds a collection from its log.
+    If the log needs cleaning up, the entries are cleaned in memory and on_dirty(path) is called
+    so the caller can schedule a compaction; by default the log is compacted right away.
+    """
+    entries, needs_compaction = _scan(path)
+    if needs_compaction:
+        if on_dirty is None:
+            return compact(path, entries)
+        entries = _clean(entries)
+        on_dirty(path)
+    return entries
+
+
+def write_entries(path, entries):
+    """Atomically replaces a log with the given entries (temp file + rename)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        for entry in entries:
+            file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        metrics.count("bytes_written", file.tell())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def compact(path, entries=None):
+    """
+    Rewrites a log without corrupt lines or exact duplicates, ordered by timestamp.
+    Returns the compacted entries.
+    """
+    if entries is None:
+        entries, _ = _scan(path)
+    compacted = _clean(entries)
+    write_entries(path, compacted)
+    return compacted
@@ -0,0 +1,56 @@
+import heapq
+
+from storage.base import GOAL_ORDERS, GOAL_STATUSES
+
+
+class GoalIndex:
+    """
+    Lookup structures over one user's goals: by id, by status, and by due date.
+    Built once per profile version and shared read-only, so filtering and sorting
+    on the goals page is a walk over the right bucket instead of a scan and sort.
+    Goals without a due date sort after dated ones ascending and before them descending.
+    """
+
+    def __init__(self, goals):
+        self.goals = list(goals) # In the order they were added
+        self.positions = {goal["id"]: i for i, goal in enumerate(self.goals)}
+        self.by_id = {goal["id"]: goal for goal in self.goals}
+        self.by_status = {} # status -> goals in added order
+        for goal in self.goals:
+            self.by_status.setdefault(goal["status"], []).append(goal)
+        undated = [goal for goal in self.goals if goal.get("due_date") is None]
+        dated = [goal for goal in self.goals if goal.get("due_date") is not None]
+        # Stable sorts, so goals due the same day stay in added order either way
+        self.by_due_asc = sorted(dated, key=lambda goal: goal["due_date"]) + undated
+        self.by_due_desc = undated + sorted(dated, key=lambda goal: goal["due_date"], reverse=True)
+
+    def get(self, goal_id):
+        return self.by_id.get(goal_id)
+
+    def counts(self):
+        """Returns {status: count} for every status in GOAL_STATUSES."""
+        return {status: len(self.by_status.get(status, ())) for status in GOAL_STATUSES}
+
+    def query(self, statuses=None, order=None):
+        """Returns the goals whose status is in statuses (all if None), in the given GOAL_ORDERS order."""
+        if order not in (None,) + GOAL_ORDERS:
+            raise ValueError(f"Unknown goal order: {order}")
+        if order == "status":
+            # Known statuses in workflow order, then any others in added order
+            known = [status for status in GOAL_STATUSES if statuses is None or status in statuses]
+            goals = [goal for status in known for goal in self.by_status.get(status, ())]
+            others = [status for status in self.by_status if status not in GOAL_STATUSES and (statuses is None or status in statuses)]
+            return goals + list(heapq.merge(*(self.by_status[status] for status in others), key=self._position))
+        if order is not None:
+            ordered = self.by_due_asc if order == "due_asc" else self.by_due_desc
+            if statuses is None:
+                return list(ordered)
+            statuses = set(statuses)
+            return [goal for goal in ordered if goal["status"] in statuses]
+        if statuses is None:
+            return list(self.goals)
+        buckets = [self.by_status[status] for status in set(statuses) if status in self.by_status]
+        return list(heapq.merge(*buckets, key=self._position))
+
+    def _position(self, goal):
+        return self.positions[goal["id"]]
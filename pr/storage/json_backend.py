@@ -0,0 +1,171 @@
+import os
+
+from storage import mood_store, shards
+from storage.archive import sort_key
+from storage.entry_log import iter_entries
+from storage.mood_store import from_entries
+from storage.base import StorageBackend, in_range
+from storage.cache import file_cache
+
+
+class JsonBackend(StorageBackend):
+    """
+    The original JSON storage: one shard directory per user with an append-only journal log
+    and a compact mood store (storage.mood_store).
+    Parsed files are shared across sessions through storage.cache.file_cache.
+    """
+
+    def list_usernames(self):
+        return shards.list_usernames()
+
+    def user_exists(self, username):
+        return shards.user_exists(username)
+
+    def get_profile(self, username):
+        return shards.get_credentials(username) # From the credential index, no shard is read
+
+    def create_user(self, username, password, email):
+        shards.create_user(username, password, email)
+
+    def update_profile(self, username, password, email):
+        shards.set_credentials(username, password, email)
+
+    def get_user(self, username, include_entries=True):
+        return shards.load_user(username, include_entries=include_entries)
+
+    def _list_entries(self, username, collection, start, end):
+        shards.ensure_migrated()
+        entries = shards.read_log(username, collection)
+        if start is None and end is None:
+            return entries
+        return [e for e in entries if in_range(e["timestamp"], start, end)]
+
+    def append_mood(self, username, entry):
+        shards.append_mood(username, entry)
+
+    def list_moods(self, username, start=None, end=None, archived=False):
+        shards.ensure_migrated()
+        moods = shards.load_moods(username)
+        entries = moods.entries(*moods.bounds(start, end)) # Binary search; only the rows in range become dicts
+        if archived and self._reaches_archive(username, start):
+            entries = sorted(shards.read_archive(username, "moods", start, end) + entries, key=sort_key)
+        return entries
+
+    def mood_columns(self, username, start=None, end=None):
+        shards.ensure_migrated()
+        moods = shards.load_moods(username)
+        return moods.columns(*moods.bounds(start, end))
+
+    def mood_arrays(self, username, start=None, end=None, archived=False):
+        shards.ensure_migrated()
+        if archived and self._reaches_archive(username, start):
+            return from_entries(self.list_moods(username, start, end, archived=True)).coded() # Archived months are plain entries
+        moods = shards.load_moods(username)
+        return moods.coded(*moods.bounds(start, end))
+
+    def get_mood_rollups(self, username):
+        return shards.load_rollups(username)
+
+    def append_journal(self, username, entry):
+        shards.append_journal(username, entry)
+
+    def list_journals(self, username, start=None, end=None, archived=False):
+        entries = self._list_entries(username, "journals", start, end)
+        if archived and self._reaches_archive(username, start):
+            entries = sorted(shards.read_archive(username, "journals", start, end) + entries, key=lambda e: str(e.get("timestamp", "")))
+        return entries
+
+    def _reaches_archive(self, username, start):
+        horizon = self.archive_horizon(username)
+        return horizon is not None and (start is None or start < horizon)
+
+    def journal_version(self, username):
+        return self._log_version(username, "journals")
+
+    def mood_version(self, username):
+        return file_cache.version(shards.mood_store_path(username), mood_store.stamp) # Changes with every write to the store, from any process
+
+    def data_version(self, username):
+        shards.ensure_migrated()
+        return shards.data_version(username)
+
+    def _log_version(self, username, collection):
+        try:
+            stat = os.stat(shards.log_path(username, collection))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def page_entries(self, username, collection, limit, cursor=None):
+        shards.ensure_migrated()
+        return shards.read_log_page(username, collection, limit, cursor)
+
+    def replace_entries(self, username, collection, entries):
+        shards.replace_entries(username, collection, entries)
+
+    def append_entries(self, username, collection, entries):
+        shards.append_entries(username, collection, entries)
+
+    def iter_entries(self, username, collection, archived=False):
+        shards.ensure_migrated()
+        if archived:
+            yield from shards.iter_archive(username, collection)
+        if collection == "journals":
+            yield from iter_entries(shards.log_path(username, "journals"))
+            return
+        moods = shards.load_moods(username)
+        for i in range(len(moods)):
+            yield moods.entry(i) # One dict at a time from the compact arrays
+
+    def save_reflection(self, username, entry_id, text, created_at):
+        shards.save_reflection(username, entry_id, text, created_at)
+
+    def get_reflections(self, username):
+        return shards.load_reflections(username)
+
+    def archive_horizon(self, username):
+        summary = shards.load_archive_summary(username)
+        return summary["horizon"] if summary else None
+
+    def archive_summary(self, username):
+        summary = shards.load_archive_summary(username)
+        if not summary:
+            return None
+        return {
+            "horizon": summary["horizon"],
+            "moods": sum(month["count"] for month in summary["moods"].values()),
+            "journals": sum(month["count"] for month in summary["journals"].values())
+        }
+
+    # Goal reads are answered from a per-user GoalIndex, rebuilt only when the profile changes
+    def list_goals(self, username, statuses=None, order=None):
+        return shards.load_goal_index(username).query(statuses, order)
+
+    def get_goal(self, username, goal_id):
+        return shards.load_goal_index(username).get(goal_id)
+
+    def count_goals_by_status(self, username):
+        return shards.load_goal_index(username).counts()
+
+    # Goal changes are applied by the group-commit writer to the latest profile on disk,
+    # so two sessions editing goals at the same time don't lose each other's updates.
+    def upsert_goal(self, username, goal):
+        def upsert(profile):
+            if profile is None:
+                raise KeyError(username)
+            goals = profile.get("goals", [])
+            if any(g["id"] == goal["id"] for g in goals):
+                # Keep the goal in its original position
+                profile["goals"] = [goal if g["id"] == goal["id"] else g for g in goals]
+            else:
+                profile["goals"] = goals + [goal]
+            return profile
+        shards.update_profile(username, upsert)
+
+    def delete_goal(self, username, goal_id):
+        def delete(profile):
+            if profile is None:
+                return None
+            profile["goals"] = [g for g in profile.get("goals", []) if g["id"] != goal_id]
+            return profile
+        shards.update_profile(username, delete)
@@ -0,0 +1,326 @@
+import bisect
+import datetime
+import json
+import os
+import shutil
+import sys
+from array import array
+
+from metrics import metrics
+
+# Compact per-user mood history. Instead of one JSON object per mood, a store is a directory of
+# fixed-width little-endian arrays plus a side file for descriptions:
+#   CURRENT             name of the generation directory in use (rewrites build a new one, then switch)
+#   <gen>/timestamps.i64  int64 microseconds since 1970-01-01 (naive local time), in timestamp order
+#   <gen>/codes.u8        uint8 index into MOOD_CODES, or IRREGULAR
+#   <gen>/desc_ends.u64   uint64 end offset of each entry's description in descriptions.bin
+#   <gen>/descriptions.bin  UTF-8 descriptions, back to back
+# The arrays can be memory-mapped as they are (e.g. numpy.memmap). Appends write the timestamp last,
+# so an append cut short by a crash is ignored (and trimmed on the next append).
+# Entries that can't be stored exactly this way (unparseable timestamps, unknown moods, extra fields)
+# get code IRREGULAR, and the whole entry is kept as JSON in place of their description.
+
+MOOD_EMOJIS = {
+    "Happy": "😀",
+    "Sad": "😢",
+    "Angry": "😡",
+    "Stressed": "😣",
+    "Anxious": "😰",
+    "Excited": "🤩",
+    "Neutral": "😐"
+}
+MOOD_CODES = list(MOOD_EMOJIS) # A mood's code is its position here; only ever append to this list
+IRREGULAR = 255
+IRREGULAR_BYTE = bytes([IRREGULAR])
+NO_TIME = -2 ** 63 # Timestamp of entries whose timestamp can't be parsed (they sort first)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+ENTRY_KEYS = {"timestamp", "mood_text", "mood_emoji", "description"}
+FILES = (("timestamps.i64", "q"), ("codes.u8", "B"), ("desc_ends.u64", "Q"))
+CURRENT_FILE = "CURRENT"
+DESCRIPTIONS_FILE = "descriptions.bin"
+
+
+def time_key(timestamp):
+    """Returns the epoch microseconds a timestamp sorts by (its wall-clock time), or NO_TIME if it can't be parsed."""
+    try:
+        dt = datetime.datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return NO_TIME
+    return (dt.replace(tzinfo=None) - EPOCH) // ONE_MICROSECOND
+
+
+def format_time(micros):
+    """Turns stored epoch microseconds back into the ISO timestamp the app writes."""
+    return (EPOCH + datetime.timedelta(microseconds=micros)).isoformat()
+
+
+def encode(entry):
+    """Returns (timestamp, code, description bytes) for one mood entry."""
+    timestamp = entry.get("timestamp")
+    micros = time_key(timestamp)
+    mood = entry.get("mood_text")
+    regular = (
+        set(entry) == ENTRY_KEYS and micros != NO_TIME and format_time(micros) == timestamp
+        and mood in MOOD_EMOJIS and entry["mood_emoji"] == MOOD_EMOJIS[mood] and isinstance(entry["description"], str)
+    )
+    if regular:
+        return micros, MOOD_CODES.index(mood), entry["description"].encode("utf-8")
+    return micros, IRREGULAR, json.dumps(entry, separators=(",", ":")).encode("utf-8")
+
+
+def from_entries(entries):
+    """Builds MoodArrays in memory from entry dicts (e.g. archived moods), sorted by timestamp."""
+    encoded = sorted((encode(entry) for entry in entries), key=lambda item: item[0])
+    ends = array("Q")
+    end = 0
+    for _, _, side in encoded:
+        end += len(side)
+        ends.append(end)
+    return MoodArrays(
+        array("q", [micros for micros, _, _ in encoded]), array("B", [code for _, code, _ in encoded]), ends,
+        b"".join(side for _, _, side in encoded)
+    )
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class MoodArrays:
+    """
+    One user's moods as loaded from a store: parallel arrays, no per-entry objects.
+    Entry dicts are only built for the rows a caller asks for.
+    """
+
+    def __init__(self, timestamps=None, codes=None, desc_ends=None, descriptions=b""):
+        self.timestamps = timestamps if timestamps is not None else array("q")
+        self.codes = codes if codes is not None else array("B")
+        self.desc_ends = desc_ends if desc_ends is not None else array("Q")
+        self.descriptions = descriptions
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def nbytes(self):
+        """Approximate memory use, for the file cache's budget."""
+        return len(self) * 17 + len(self.descriptions)
+
+    def _side(self, i):
+        start = self.desc_ends[i - 1] if i else 0
+        return self.descriptions[start:self.desc_ends[i]].decode("utf-8")
+
+    def entry(self, i):
+        """Builds the entry dict for row i (the emoji is filled in from MOOD_EMOJIS)."""
+        code = self.codes[i]
+        if code == IRREGULAR:
+            return json.loads(self._side(i))
+        mood = MOOD_CODES[code]
+        return {
+            "timestamp": format_time(self.timestamps[i]),
+            "mood_text": mood,
+            "mood_emoji": MOOD_EMOJIS[mood],
+            "description": self._side(i)
+        }
+
+    def entries(self, lo=0, hi=None):
+        hi = len(self) if hi is None else hi
+        return [self.entry(i) for i in range(lo, hi)]
+
+    def bounds(self, start=None, end=None):
+        """Returns the row range [lo, hi) with start <= timestamp < end, by binary search."""
+        lo = 0 if start is None else bisect.bisect_left(self.timestamps, time_key(start))
+        hi = len(self) if end is None else bisect.bisect_left(self.timestamps, time_key(end))
+        if start is not None or end is not None:
+            lo = max(lo, bisect.bisect_right(self.timestamps, NO_TIME)) # Unparseable timestamps match no range
+        return lo, max(lo, hi)
+
+    def irregular_rows(self):
+        """Returns the rows whose entry is kept whole in the side store (found with a bytes scan, not a loop)."""
+        rows = []
+        raw = self.codes.tobytes()
+        i = raw.find(IRREGULAR_BYTE)
+        while i != -1:
+            rows.append(i)
+            i = raw.find(IRREGULAR_BYTE, i + 1)
+        return rows
+
+    def columns(self, lo=0, hi=None):
+        """Returns {'timestamp': [...], 'mood_text': [...]} for rows [lo, hi), without building entry dicts."""
+        hi = len(self) if hi is None else hi
+        timestamps = [format_time(micros) if micros != NO_TIME else None for micros in self.timestamps[lo:hi]]
+        moods = [MOOD_CODES[code] if code != IRREGULAR else None for code in self.codes[lo:hi]]
+        for i in self.irregular_rows():
+            if lo <= i < hi:
+                entry = json.loads(self._side(i))
+                timestamps[i - lo] = entry.get("timestamp")
+                moods[i - lo] = entry.get("mood_text", "")
+        return {"timestamp": timestamps, "mood_text": moods}
+
+    def coded(self, lo=0, hi=None):
+        """
+        Returns rows [lo, hi) as {'epoch_us': int64 array, 'code': uint8 array, 'moods': names by code} for vectorized readers.
+        Irregular rows get a code for their own mood name; rows without a usable timestamp have NO_TIME.
+        """
+        hi = len(self) if hi is None else hi
+        whole = lo == 0 and hi == len(self)
+        codes = self.codes if whole else self.codes[lo:hi]
+        moods = list(MOOD_CODES)
+        irregular = [i for i in self.irregular_rows() if lo <= i < hi]
+        if irregular:
+            codes = array("B", codes)
+            for i in irregular:
+                mood = json.loads(self._side(i)).get("mood_text") or ""
+                if mood not in moods:
+                    moods.append(mood)
+                codes[i - lo] = moods.index(mood)
+        return {"epoch_us": self.timestamps if whole else self.timestamps[lo:hi], "code": codes, "moods": moods}
+
+
+def _generation(directory):
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), "r") as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def exists(directory):
+    return _generation(directory) is not None
+
+
+def generation_path(directory):
+    """Returns the directory of the generation in use, or None if there is no store yet."""
+    generation = _generation(directory)
+    return os.path.join(directory, generation) if generation is not None else None
+
+
+def stamp(directory):
+    """
+    Returns a token that changes with every write to a store, also one made by another process: the generation
+    in use (rewrites switch it) and the stat of its timestamps file (appends write it last). None if there is no store.
+    """
+    generation = _generation(directory)
+    if generation is None:
+        return None
+    try:
+        stat = os.stat(os.path.join(directory, generation, FILES[0][0]))
+    except FileNotFoundError:
+        return (generation, None) # Switched generations just now; the next call sees the new one
+    return (generation, stat.st_mtime_ns, stat.st_size)
+
+
+def read_store(directory):
+    """Loads a store into MoodArrays (empty if there is no store yet)."""
+    while True:
+        generation = _generation(directory)
+        if generation is None:
+            return MoodArrays()
+        try:
+            return _read_generation(os.path.join(directory, generation))
+        except FileNotFoundError:
+            if _generation(directory) == generation:
+                raise
+            # A rewrite switched generations (and removed this one) while we were reading; read the new one
+
+
+def _read_generation(path):
+    with metrics.timer("mood_store_read"):
+        arrays = []
+        for name, typecode in FILES:
+            values = array(typecode)
+            with open(os.path.join(path, name), "rb") as file:
+                data = file.read()
+            metrics.count("bytes_read", len(data))
+            values.frombytes(data[:len(data) - len(data) % values.itemsize])
+            arrays.append(_little_endian(values))
+        with open(os.path.join(path, DESCRIPTIONS_FILE), "rb") as file:
+            descriptions = file.read()
+        metrics.count("bytes_read", len(descriptions))
+    timestamps, codes, desc_ends = arrays
+    count = min(len(timestamps), len(codes), len(desc_ends)) # The timestamp is written last, so it decides
+    return MoodArrays(timestamps[:count], codes[:count], desc_ends[:count], descriptions)
+
+
+def _write_generation(directory, generation, entries):
+    path = os.path.join(directory, generation)
+    os.makedirs(path, exist_ok=True)
+    moods = from_entries(entries)
+    for (name, _), values in zip(FILES, (moods.timestamps, moods.codes, moods.desc_ends)):
+        _write_file(os.path.join(path, name), _little_endian(values).tobytes())
+    _write_file(os.path.join(path, DESCRIPTIONS_FILE), moods.descriptions)
+
+
+def _write_file(path, data, mode="wb"):
+    with open(path, mode) as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    metrics.count("bytes_written", len(data))
+
+
+def write_entries(directory, entries):
+    """Replaces a store's contents with entries (sorted by timestamp), switching generations atomically."""
+    old = _generation(directory)
+    generation = str(int(old) + 1 if old and old.isdigit() else 1)
+    _write_generation(directory, generation, entries)
+    tmp_path = os.path.join(directory, f"{CURRENT_FILE}.tmp")
+    _write_file(tmp_path, generation.encode("ascii"))
+    os.replace(tmp_path, os.path.join(directory, CURRENT_FILE))
+    if old is not None:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+
+
+def _read_value(path, name, typecode, i):
+    """Reads row i of one of a generation's arrays without loading the rest of it."""
+    values = array(typecode)
+    with open(os.path.join(path, name), "rb") as file:
+        file.seek(i * values.itemsize)
+        values.frombytes(file.read(values.itemsize))
+    metrics.count("bytes_read", values.itemsize)
+    return _little_endian(values)[0]
+
+
+def append_entries(directory, entries):
+    """
+    Appends entries to a store. Entries older than its newest one (e.g. imported history)
+    are merged in with a rewrite instead, so the store stays in timestamp order.
+    """
+    encoded = [encode(entry) for entry in entries]
+    generation = _generation(directory)
+    keys = [micros for micros, _, _ in encoded]
+    if generation is None:
+        write_entries(directory, entries)
+        return
+    path = os.path.join(directory, generation)
+    # Only the file sizes and the last row are read, so an append costs the same however long the history is
+    count = min(os.path.getsize(os.path.join(path, name)) // array(typecode).itemsize for name, typecode in FILES)
+    if keys != sorted(keys) or (count and _read_value(path, "timestamps.i64", "q", count - 1) > keys[0]):
+        write_entries(directory, read_store(directory).entries() + list(entries))
+        return
+    desc_end = _read_value(path, "desc_ends.u64", "Q", count - 1) if count else 0
+    # Trim whatever a previous append left behind before its timestamp was fully written (a partial
+    # timestamp row too, or every later row would be misaligned)
+    trims = ((DESCRIPTIONS_FILE, desc_end), ("codes.u8", count), ("desc_ends.u64", count * 8), ("timestamps.i64", count * 8))
+    for name, size in trims:
+        file_path = os.path.join(path, name)
+        if os.path.getsize(file_path) > size:
+            os.truncate(file_path, size)
+    ends = array("Q")
+    for _, _, side in encoded:
+        desc_end += len(side)
+        ends.append(desc_end)
+    _write_file(os.path.join(path, DESCRIPTIONS_FILE), b"".join(side for _, _, side in encoded), "ab")
+    _write_file(os.path.join(path, "desc_ends.u64"), _little_endian(ends).tobytes(), "ab")
+    _write_file(os.path.join(path, "codes.u8"), bytes(code for _, code, _ in encoded), "ab")
+    _write_file(os.path.join(path, "timestamps.i64"), _little_endian(array("q", keys)).tobytes(), "ab") # Commits the append
+
+
+def compact(directory):
+    """Rewrites a store into a fresh generation, dropping anything left over from an interrupted append."""
+    write_entries(directory, read_store(directory).entries())
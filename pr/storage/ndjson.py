@@ -0,0 +1,223 @@
+import datetime
+import json
+import os
+
+from storage.base import GOAL_STATUSES
+from storage.mood_store import MOOD_EMOJIS
+from storage.writer import atomic_write_json, read_json
+
+# Streaming backups: one JSON record per line, grouped by user, so neither side ever holds more
+# than one batch of entries in memory.
+#   {"type": "user", "username": "alice", "password": "...", "email": "..."}
+#   {"type": "goal", "username": "alice", "goal": {...}}
+#   {"type": "mood", "username": "alice", "entry": {...}}
+#   {"type": "journal", "username": "alice", "entry": {...}}
+# A user's goals and entries follow their "user" record; entries are oldest first.
+# Both directions save a checkpoint (<file>.checkpoint) as they go and pick up from it when re-run.
+
+BATCH_SIZE = 1000 # Entries written to the backend at a time while importing
+COLLECTIONS = {"mood": "moods", "journal": "journals"}
+# Fields a goal or entry can't be stored without (the backends read them directly), even with accept_invalid
+REQUIRED_FIELDS = {"goal": ("id", "title", "status"), "mood": ("timestamp", "mood_text"), "journal": ("timestamp", "content")}
+
+
+def _is_timestamp(value):
+    try:
+        datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def validate(record):
+    """Returns why a record can't be imported as it is, or None if it is valid."""
+    kind = record.get("type")
+    if not isinstance(record.get("username"), str) or not record["username"]:
+        return "missing username"
+    if kind == "user":
+        if not isinstance(record.get("password"), str) or not isinstance(record.get("email", ""), str):
+            return "password and email must be strings"
+        return None
+    if kind == "goal":
+        goal = record.get("goal")
+        if not isinstance(goal, dict) or not isinstance(goal.get("id"), str) or not isinstance(goal.get("title"), str):
+            return "goal needs a string id and title"
+        if goal.get("status") not in GOAL_STATUSES:
+            return f"unknown goal status {goal.get('status')!r}"
+        if goal.get("due_date") is not None and not _is_timestamp(goal["due_date"]):
+            return f"unparseable due date {goal['due_date']!r}"
+        return None
+    if kind not in COLLECTIONS:
+        return f"unknown record type {kind!r}"
+    entry = record.get("entry")
+    if not isinstance(entry, dict):
+        return "missing entry"
+    if not _is_timestamp(entry.get("timestamp")):
+        return f"unparseable timestamp {entry.get('timestamp')!r}"
+    if kind == "mood":
+        if entry.get("mood_text") not in MOOD_EMOJIS:
+            return f"unknown mood {entry.get('mood_text')!r}"
+        if not isinstance(entry.get("description", ""), str):
+            return "description must be a string"
+    elif not isinstance(entry.get("content"), str):
+        return "journal content must be a string"
+    return None
+
+
+def _importable(record):
+    """Checks whether a record that failed validation still has the fields the backends need (for accept_invalid)."""
+    kind = record.get("type")
+    if not isinstance(record.get("username"), str) or not record["username"]:
+        return False
+    if kind == "user":
+        return True
+    required = REQUIRED_FIELDS.get(kind)
+    item = record.get("goal" if kind == "goal" else "entry")
+    return required is not None and isinstance(item, dict) and all(key in item for key in required)
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _load_checkpoint(path, restart):
+    if restart or path is None:
+        return None
+    return read_json(path)
+
+
+def _save_checkpoint(path, state):
+    if path is not None:
+        atomic_write_json(path, state, indent=None)
+
+
+def _finish(path):
+    if path is not None and os.path.exists(path):
+        os.remove(path)
+
+
+def export_ndjson(backend, path, checkpoint_path=None, restart=False):
+    """
+    Streams every user in backend to an NDJSON file, entry by entry.
+    Invalid records are exported as they are (a backup must not lose data) but counted.
+    Resumes from checkpoint_path (default <path>.checkpoint) unless restart is set.
+    Returns counts of what was written.
+    """
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+    state = _load_checkpoint(checkpoint_path, restart) or {
+        "offset": 0, "last_user": None,
+        "stats": {"users": 0, "goals": 0, "moods": 0, "journals": 0, "invalid": 0}
+    }
+    stats = state["stats"]
+    with open(path, "r+b" if state["offset"] else "wb") as file:
+        file.truncate(state["offset"]) # Drop anything written after the checkpoint
+        file.seek(state["offset"])
+        for username in backend.list_usernames():
+            if state["last_user"] is not None and username <= state["last_user"]:
+                continue # Exported before the checkpoint (usernames come sorted)
+            profile = backend.get_profile(username)
+            if profile is None:
+                continue
+            records = [{"type": "user", "username": username, "password": profile.get("password", ""), "email": profile.get("email", "")}]
+            records += [{"type": "goal", "username": username, "goal": goal} for goal in backend.list_goals(username)]
+            stats["users"] += 1
+            stats["goals"] += len(records) - 1
+            for record in records:
+                stats["invalid"] += validate(record) is not None
+                file.write(_dumps(record).encode("utf-8"))
+            for kind, collection in COLLECTIONS.items():
+                for entry in backend.iter_entries(username, collection, archived=True):
+                    record = {"type": kind, "username": username, "entry": entry}
+                    stats[collection] += 1
+                    stats["invalid"] += validate(record) is not None
+                    file.write(_dumps(record).encode("utf-8"))
+            # Checkpoint once the user's records are safely on disk
+            file.flush()
+            os.fsync(file.fileno())
+            state["offset"] = file.tell()
+            state["last_user"] = username
+            _save_checkpoint(checkpoint_path, state)
+    _finish(checkpoint_path)
+    return stats
+
+
+def import_ndjson(backend, path, checkpoint_path=None, rejects_path=None, restart=False, accept_invalid=False, batch_size=BATCH_SIZE):
+    """
+    Streams an NDJSON export into backend, validating each record on the way.
+    Invalid records are skipped (or imported anyway with accept_invalid) and written to
+    rejects_path (default <path>.rejects) with the reason. Users that already exist are skipped,
+    like storage.copy_users. Entries are appended in batches of batch_size, and a checkpoint
+    (default <path>.checkpoint) is saved after every batch and user; re-running resumes from it.
+    If the process dies between a write and its checkpoint, a resume appends that batch again
+    (or skips a user whose record was just created, as if it had existed before).
+    Returns counts of what was imported.
+    """
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+    rejects_path = rejects_path or f"{path}.rejects"
+    state = _load_checkpoint(checkpoint_path, restart) or {
+        "offset": 0, "line": 0, "rejects_offset": 0, "username": None, "importing": False,
+        "stats": {"users": 0, "skipped_users": 0, "goals": 0, "moods": 0, "journals": 0, "invalid": 0}
+    }
+    stats = state["stats"]
+    pending = {collection: [] for collection in COLLECTIONS.values()}
+
+    def flush(offset, line_number):
+        for collection, entries in pending.items():
+            if entries:
+                backend.append_entries(state["username"], collection, entries)
+                stats[collection] += len(entries)
+                entries.clear()
+        rejects.flush()
+        state.update(offset=offset, line=line_number, rejects_offset=rejects.tell())
+        _save_checkpoint(checkpoint_path, state)
+
+    with open(path, "rb") as file, open(rejects_path, "r+" if state["rejects_offset"] else "w") as rejects:
+        rejects.truncate(state["rejects_offset"])
+        rejects.seek(state["rejects_offset"])
+        file.seek(state["offset"])
+        offset, line_number = state["offset"], state["line"]
+        for raw in file:
+            line_start = offset
+            offset += len(raw)
+            line_number += 1
+            text = raw.decode("utf-8").strip()
+            if not text:
+                continue
+            try:
+                record = json.loads(text)
+                error = validate(record) if isinstance(record, dict) else "not a JSON object"
+            except json.JSONDecodeError as e:
+                record, error = None, f"invalid JSON: {e.msg}"
+            if error is not None:
+                rejects.write(_dumps({"line": line_number, "error": error, "text": text}))
+                stats["invalid"] += 1
+                if not accept_invalid or not isinstance(record, dict) or not _importable(record):
+                    continue
+            username = record["username"]
+            if record.get("type") == "user":
+                flush(line_start, line_number - 1) # Finish the previous user before starting this one
+                state["username"] = username
+                state["importing"] = not backend.user_exists(username)
+                if state["importing"]:
+                    backend.create_user(username, record.get("password", ""), record.get("email", ""))
+                    stats["users"] += 1
+                else:
+                    stats["skipped_users"] += 1
+                flush(offset, line_number) # Past the user record, so a resume doesn't mistake the new user for an existing one
+                continue
+            if username != state["username"]:
+                rejects.write(_dumps({"line": line_number, "error": "record does not follow its user", "text": text}))
+                stats["invalid"] += 1
+                continue
+            if not state["importing"]:
+                continue
+            if record["type"] == "goal":
+                backend.upsert_goal(username, record["goal"]) # Idempotent, so a resumed import can repeat it
+                stats["goals"] += 1
+                continue
+            pending[COLLECTIONS[record["type"]]].append(record["entry"])
+            if sum(len(entries) for entries in pending.values()) >= batch_size:
+                flush(offset, line_number)
+        flush(offset, line_number)
+    _finish(checkpoint_path)
+    return stats
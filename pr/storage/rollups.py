@@ -0,0 +1,65 @@
+import datetime
+
+# Map mood text to numerical values for charting (moods not listed here count as 0)
+MOOD_TO_VALUE = {
+    "Happy": 5, "Excited": 4, "Neutral": 3,
+    "Anxious": 2, "Stressed": 2, "Sad": 1, "Angry": 1
+}
+
+# Only daily counts are kept: the dashboard's coarser resolutions are summed from the days in the selected range
+PERIODS = ("day",)
+DROPPED_PERIODS = ("week",) # Kept by older versions; ignored when read and removed when rewritten
+
+
+def empty_rollups():
+    """Returns rollups for a user with no moods: {'day': {}, 'skipped': 0}."""
+    return {"day": {}, "skipped": 0}
+
+
+def bucket_keys(timestamp):
+    """Returns the day ('2025-07-25') bucket of an ISO timestamp, or None if it can't be parsed."""
+    try:
+        day = datetime.datetime.fromisoformat(timestamp).date()
+    except (TypeError, ValueError):
+        return None
+    return {"day": day.isoformat()}
+
+
+def add_mood(rollups, entry):
+    """Folds one mood entry into the rollups in place and returns them."""
+    keys = bucket_keys(entry.get("timestamp"))
+    if keys is None:
+        rollups["skipped"] = rollups.get("skipped", 0) + 1 # Counted so the dashboard can mention it once
+        return rollups
+    mood = entry.get("mood_text", "")
+    for period in PERIODS:
+        counts = rollups[period].setdefault(keys[period], {})
+        counts[mood] = counts.get(mood, 0) + 1
+    return rollups
+
+
+def build_rollups(entries):
+    """Builds rollups from scratch for a full mood history."""
+    rollups = empty_rollups()
+    for entry in entries:
+        add_mood(rollups, entry)
+    return rollups
+
+
+def merge_rollups(rollups, other):
+    """Adds the counts of other into rollups in place and returns them."""
+    for period in PERIODS:
+        for bucket, counts in other.get(period, {}).items():
+            target = rollups[period].setdefault(bucket, {})
+            for mood, count in counts.items():
+                target[mood] = target.get(mood, 0) + count
+    rollups["skipped"] = rollups.get("skipped", 0) + other.get("skipped", 0)
+    return rollups
+
+
+def mean_value(counts):
+    """Mean mood value (using MOOD_TO_VALUE) of a {mood: count} bucket."""
+    total = sum(counts.values())
+    if not total:
+        return 0.0
+    return sum(MOOD_TO_VALUE.get(mood, 0) * count for mood, count in counts.items()) / total
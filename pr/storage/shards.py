@@ -0,0 +1,580 @@
+import copy
+import json
+import os
+import threading
+from urllib.parse import quote, unquote
+
+from storage import entry_log, mood_store
+from storage.archive import (
+    ARCHIVE_DIR, SUMMARY_FILE, archived_rollups, months_in_range, read_segment, segment_path, sort_key, split,
+    update_summary, write_segment
+)
+from storage.cache import UserObjectCache, file_cache
+from storage.goal_index import GoalIndex
+from storage.entry_log import read_entries, read_tail
+from storage.mood_store import time_key
+from storage.rollups import DROPPED_PERIODS, add_mood, build_rollups, merge_rollups
+from storage.writer import read_json, writer
+
+DATA_DIR = "user_data" # One sub-directory (shard) per user lives in here
+LEGACY_USER_DATA_FILE = "users.json" # The old single-file store, kept around as a backup after migration
+USER_FILE = "user.json" # Profile fields and goals
+ROLLUPS_FILE = "mood_rollups.json" # Daily mood counts, kept in step with the mood log
+CREDENTIALS_FILE = "credentials.json" # username -> password and email for every user, so login reads no shard
+LOG_COLLECTIONS = ("moods", "journals") # Kept out of USER_FILE: moods in a mood store, journals in journals.jsonl
+MOOD_STORE_DIR = "moods" # Compact mood arrays (see storage.mood_store); replaced moods.jsonl
+REFLECTIONS_FILE = "reflections.jsonl" # AI reflections attached to journal entries, by entry id
+MIGRATION_MARKER = ".migrated"
+MAX_CACHED_GOAL_INDEXES = 64 # Users whose goal index is kept in memory at once
+
+_migration_checked = False
+_migrating = False
+_migration_lock = threading.RLock()
+_goal_indexes = UserObjectCache(MAX_CACHED_GOAL_INDEXES)
+_mood_conversion_lock = threading.Lock()
+
+
+def _normalize_user(user_data):
+    """Ensures a user record has 'goals', 'moods', and 'journals' keys."""
+    for key in ("goals", "moods", "journals"):
+        if key not in user_data:
+            user_data[key] = []
+    return user_data
+
+
+def shard_name(username):
+    """Encodes a username into a safe directory name (no slashes or dot-only names)."""
+    return quote(username, safe="").replace(".", "%2E")
+
+
+def shard_dir(username):
+    """Returns the directory holding a single user's data."""
+    return os.path.join(DATA_DIR, shard_name(username))
+
+
+def profile_path(username):
+    """Returns the path of a user's profile (password, email, goals)."""
+    return os.path.join(shard_dir(username), USER_FILE)
+
+
+def rollups_path(username):
+    """Returns the path of a user's precomputed mood rollups."""
+    return os.path.join(shard_dir(username), ROLLUPS_FILE)
+
+
+def log_path(username, collection):
+    """Returns the path of a user's append-only log for 'moods' or 'journals'."""
+    return os.path.join(shard_dir(username), f"{collection}.jsonl")
+
+
+def mood_store_path(username):
+    """Returns the directory of a user's mood store."""
+    return os.path.join(shard_dir(username), MOOD_STORE_DIR)
+
+
+def archive_dir(username):
+    """Returns the directory holding a user's archived months (see storage.archive)."""
+    return os.path.join(shard_dir(username), ARCHIVE_DIR)
+
+
+def archive_summary_path(username):
+    """Returns the path of a user's archive summary."""
+    return os.path.join(archive_dir(username), SUMMARY_FILE)
+
+
+def reflections_path(username):
+    """Returns the path of a user's reflection log."""
+    return os.path.join(shard_dir(username), REFLECTIONS_FILE)
+
+
+def credentials_path():
+    """Returns the path of the credential index shared by all users."""
+    return os.path.join(DATA_DIR, CREDENTIALS_FILE)
+
+
+def migrate_users_json(legacy_path=LEGACY_USER_DATA_FILE):
+    """
+    Splits the legacy users.json into one shard per user.
+    Existing shards are never overwritten, so running this twice is safe.
+    Returns the number of users that were migrated.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    migrated = 0
+    if os.path.exists(legacy_path):
+        with open(legacy_path, "r") as file:
+            try:
+                users = json.load(file)
+            except json.JSONDecodeError:
+                users = {}
+        for username, user_data in users.items():
+            if os.path.exists(profile_path(username)):
+                continue # Already migrated (or re-registered since), keep the newer shard
+            user_data = _normalize_user(user_data)
+            save_user(username, user_data)
+            for collection in LOG_COLLECTIONS:
+                replace_entries(username, collection, user_data[collection])
+            migrated += 1
+    # Leave a marker so we don't re-read the legacy file on every process start
+    with open(os.path.join(DATA_DIR, MIGRATION_MARKER), "w") as file:
+        file.write(str(migrated))
+    return migrated
+
+
+def ensure_migrated():
+    """Runs the users.json migration once per process, if it hasn't been done yet."""
+    global _migration_checked, _migrating
+    if _migration_checked:
+        return
+    with _migration_lock: # Other sessions wait until the migration has finished
+        if _migration_checked or _migrating:
+            return # _migrating: the migration itself saves through functions that call us
+        _migrating = True
+        try:
+            if not os.path.exists(os.path.join(DATA_DIR, MIGRATION_MARKER)):
+                migrate_users_json()
+        finally:
+            _migration_checked = True
+            _migrating = False
+
+
+def _build_credentials():
+    """Builds the credential index from every user's profile (the first time it is needed)."""
+    credentials = {}
+    for username in _shard_usernames(): # Runs on the writer thread, which must not wait for the migration
+        profile = read_json(profile_path(username)) or {}
+        credentials[username] = {"password": profile.get("password", ""), "email": profile.get("email", "")}
+    return credentials
+
+
+def _set_credentials(username, profile, build_missing):
+    """Returns a mutate function that records a user's credentials in the index (None if unchanged)."""
+    record = {"password": profile.get("password", ""), "email": profile.get("email", "")}
+
+    def update(credentials):
+        if credentials is None:
+            if not build_missing:
+                return None # Built from the profiles, this one included, when first needed
+            return _build_credentials()
+        if credentials.get(username) == record:
+            return None
+        credentials[username] = record
+        return credentials
+    return update
+
+
+def load_credentials():
+    """
+    Returns the credential index {username: {'password', 'email'}}, shared through the process-wide cache.
+    It must not be modified; it is rebuilt from the profiles if missing.
+    """
+    ensure_migrated()
+    path = credentials_path()
+    credentials = file_cache.get(path, read_json)
+    if credentials is None:
+        # Built inside the writer so it is ordered with any registration happening right now
+        writer.update_json(path, lambda current: current if current is not None else _build_credentials())
+        credentials = file_cache.get(path, read_json)
+    return credentials
+
+
+def rebuild_credentials():
+    """Recomputes the credential index from every user's profile."""
+    ensure_migrated()
+    writer.update_json(credentials_path(), lambda current: _build_credentials())
+
+
+def get_credentials(username):
+    """Returns a user's {'password', 'email'} from the credential index, or None if there is no such user."""
+    record = load_credentials().get(username)
+    return dict(record) if record is not None else None
+
+
+def user_exists(username):
+    """Checks whether a user exists, using the credential index instead of their shard."""
+    return username in load_credentials()
+
+
+def create_user(username, password, email):
+    """
+    Creates a user's shard with empty goals, moods, and journals. Raises ValueError if the username is taken.
+    The profile and the credential index entry are written in the same commit.
+    """
+    ensure_migrated()
+    profile = {"password": password, "email": email, "goals": []}
+
+    def create(current):
+        if current is not None:
+            raise ValueError(f"Username {username!r} already exists.")
+        return profile
+    writer.update_json(profile_path(username), create, derived=[(credentials_path(), _set_credentials(username, profile, True))])
+
+
+def _split_log_collections(username, profile):
+    """Moves moods/journals still embedded in an older user.json into their logs."""
+    embedded = [c for c in LOG_COLLECTIONS if c in profile]
+    if not embedded:
+        return profile
+    for collection in embedded:
+        entries = profile.pop(collection)
+        stored = mood_store.exists(mood_store_path(username)) if collection == "moods" else os.path.exists(log_path(username, collection))
+        if entries and not stored:
+            replace_entries(username, collection, entries)
+    save_user(username, profile)
+    return profile
+
+
+def _load_log(path):
+    """Parses a log; if it needs compaction, that is handed to the writer instead of done by the reader."""
+    return read_entries(path, on_dirty=lambda dirty_path: writer.compact(dirty_path, wait=False))
+
+
+def read_log(username, collection):
+    """
+    Returns a user's moods or journals, parsed once and shared through the process-wide cache.
+    The returned list is a copy, but journal entry dicts are shared and must not be modified.
+    """
+    if collection == "moods":
+        return load_moods(username).entries()
+    return list(file_cache.get(log_path(username, collection), _load_log))
+
+
+def read_log_page(username, collection, limit, cursor=None):
+    """
+    Returns (newest entries first, cursor of the next older page) from a user's moods or journals.
+    Journal cursors are byte offsets into the log; mood cursors are row numbers in the mood store.
+    Once the hot entries run out, paging carries on into the archived months (cursors ('archive', month, row)).
+    """
+    if isinstance(cursor, (list, tuple)):
+        return _read_archive_page(username, collection, limit, [], cursor[1], cursor[2])
+    if collection == "journals":
+        page, cursor = read_tail(log_path(username, collection), limit, before=cursor)
+    else:
+        moods = load_moods(username)
+        end = len(moods) if cursor is None else min(cursor, len(moods))
+        start = max(0, end - limit)
+        page, cursor = [moods.entry(i) for i in range(end - 1, start - 1, -1)], (start if start > 0 else None)
+    if cursor is None and load_archive_summary(username):
+        return _read_archive_page(username, collection, limit, page) # Only now are archived months opened
+    return page, cursor
+
+
+def _read_archive_page(username, collection, limit, page, month=None, end=None):
+    """Fills page (newest first) from the archived months, starting before row `end` of `month`."""
+    months = months_in_range(load_archive_summary(username), collection)
+    for current in reversed(months):
+        if month is not None and current > month:
+            continue
+        if len(page) == limit and (current != month or end is None):
+            return page, ("archive", current, None) # From the top of a month that hasn't been opened yet
+        entries = _load_segment(username, collection, current)
+        row = end if current == month and end is not None else len(entries)
+        while row > 0:
+            if len(page) == limit:
+                return page, ("archive", current, row)
+            row -= 1
+            page.append(entries[row])
+    return page, None
+
+
+def _convert_mood_log(username):
+    """Moves a mood log written before the mood store existed into the store, keeping it as moods.jsonl.migrated."""
+    path = log_path(username, "moods")
+    if not os.path.exists(path):
+        return
+    with _mood_conversion_lock: # Appends wait too, so none can land in the store before the old history
+        if not os.path.exists(path):
+            return
+        store = mood_store_path(username)
+        if not mood_store.exists(store):
+            writer.replace(store, read_entries(path))
+        os.replace(path, f"{path}.migrated")
+
+
+def load_archive_summary(username):
+    """Returns a user's archive summary (shared, must not be modified), or None if nothing has been archived."""
+    return file_cache.get(archive_summary_path(username), read_json)
+
+
+def _load_segment(username, collection, month):
+    return file_cache.get(segment_path(archive_dir(username), collection, month), read_segment)
+
+
+def read_archive(username, collection, start=None, end=None):
+    """Returns a user's archived moods or journals with timestamps in [start, end), opening only the months it needs."""
+    summary = load_archive_summary(username)
+    if not summary:
+        return []
+    low = time_key(start) if start is not None else None
+    high = time_key(end) if end is not None else None
+    entries = []
+    for month in months_in_range(summary, collection, start, end):
+        for entry in _load_segment(username, collection, month):
+            key = sort_key(entry)
+            if (low is None or key >= low) and (high is None or key < high):
+                entries.append(entry)
+    return entries
+
+
+def iter_archive(username, collection):
+    """Yields a user's archived moods or journals, oldest month first, one segment in memory at a time."""
+    for month in months_in_range(load_archive_summary(username), collection):
+        yield from read_segment(segment_path(archive_dir(username), collection, month))
+
+
+def archive_user(username, horizon):
+    """
+    Moves a user's moods and journal entries older than horizon (an ISO timestamp) into monthly archive
+    segments and records them in the archive summary. Each collection is moved on the writer thread, so
+    no append can slip in between reading the hot entries and rewriting them. Segments are written before
+    the hot entries are removed, and adding an entry to a segment twice is a no-op, so an interrupted run
+    only needs to be repeated. Returns {collection: number of entries moved}.
+    """
+    ensure_migrated()
+    _convert_mood_log(username)
+    directory = archive_dir(username)
+    moved = {}
+    for collection, path, log in (("moods", mood_store_path(username), mood_store), ("journals", log_path(username, "journals"), entry_log)):
+        months = {} # month -> full segment contents, for the summary
+
+        def archive(path, collection=collection, log=log, months=months):
+            entries = mood_store.read_store(path).entries() if collection == "moods" else read_entries(path)
+            kept, archived = split(entries, horizon)
+            for month, month_entries in archived.items():
+                segment = segment_path(directory, collection, month)
+                months[month] = write_segment(segment, month_entries)
+                file_cache.invalidate(segment)
+            if archived:
+                log.write_entries(path, kept)
+            return len(entries) - len(kept)
+
+        def summarize(summary, collection=collection, months=months):
+            return update_summary(summary, collection, horizon, months) if months else None
+
+        moved[collection] = writer.call(path, archive, derived=[(archive_summary_path(username), summarize)])
+    return moved
+
+
+def load_moods(username):
+    """Returns a user's moods as MoodArrays, loaded once and shared through the process-wide cache (must not be modified)."""
+    _convert_mood_log(username)
+    return file_cache.get(mood_store_path(username), mood_store.read_store, mood_store.stamp)
+
+
+def _load_reflections(path):
+    return {record["entry_id"]: record for record in _load_log(path)} # Later reflections replace earlier ones
+
+
+def load_reflections(username):
+    """Returns {entry id: {'entry_id', 'timestamp', 'text'}} for a user (shared, must not be modified)."""
+    ensure_migrated()
+    return file_cache.get(reflections_path(username), _load_reflections)
+
+
+def save_reflection(username, entry_id, text, created_at):
+    """Attaches a reflection to a journal entry by appending it to the user's reflection log."""
+    ensure_migrated()
+    writer.append(reflections_path(username), {"timestamp": created_at, "entry_id": entry_id, "text": text})
+
+
+def load_user(username, include_entries=True):
+    """
+    Loads a single user's data from their shard. Returns None if the user doesn't exist.
+    Moods and journals are rebuilt from their logs; pass include_entries=False to skip them
+    when a page only needs the profile and goals.
+    """
+    ensure_migrated()
+    path = profile_path(username)
+    if not os.path.exists(path):
+        return None
+    cached = file_cache.get(path, read_json) # Re-parsed only when the file changes
+    if cached is None:
+        return None
+    user_data = dict(cached)
+    user_data = _split_log_collections(username, user_data)
+    # Callers get their own copies all the way down: the cached goals and journal entries are shared by every session
+    user_data["goals"] = copy.deepcopy(user_data.get("goals", []))
+    if include_entries:
+        for collection in LOG_COLLECTIONS:
+            user_data[collection] = read_log(username, collection)
+        user_data["journals"] = copy.deepcopy(user_data["journals"]) # Moods are built fresh from the mood store
+    return user_data
+
+
+def load_goal_index(username):
+    """Returns the index over a user's goals, rebuilt only when their profile changes."""
+    ensure_migrated()
+    path = profile_path(username)
+
+    def build():
+        user_data = load_user(username, include_entries=False)
+        return GoalIndex(user_data["goals"] if user_data else [])
+
+    return _goal_indexes.get(username, file_cache.version(path), build)
+
+
+def save_user(username, user_data):
+    """
+    Saves a single user's profile and goals to their shard.
+    Moods and journals are not rewritten here; use append_mood/append_journal or replace_entries.
+    """
+    profile = {key: value for key, value in user_data.items() if key not in LOG_COLLECTIONS}
+    writer.update_json(
+        profile_path(username), lambda current: profile,
+        derived=[(credentials_path(), _set_credentials(username, profile, False))]
+    )
+
+
+def update_profile(username, mutate):
+    """
+    Applies mutate(profile) to the latest copy of a user's profile through the group-commit writer.
+    profile is None if the user doesn't exist; mutate returns the profile to write, or None for no change.
+    """
+    ensure_migrated()
+    return writer.update_json(profile_path(username), mutate)
+
+
+def set_credentials(username, password, email):
+    """Changes a user's password and email, in their profile and in the credential index in the same commit."""
+    ensure_migrated()
+    fields = {"password": password, "email": email}
+
+    def update(profile):
+        if profile is None:
+            raise KeyError(username)
+        profile.update(fields)
+        return profile
+
+    writer.update_json(profile_path(username), update, derived=[(credentials_path(), _set_credentials(username, fields, False))])
+
+
+def append_mood(username, entry):
+    """Appends one mood entry to the user's mood store."""
+    ensure_migrated()
+    _convert_mood_log(username)
+    path = mood_store_path(username)
+
+    def fold(rollups):
+        if rollups is None:
+            return _full_rollups(username, path) # The store already contains the new entry
+        return add_mood(rollups, entry)
+
+    writer.append(path, entry, derived=[(rollups_path(username), fold)])
+
+
+def append_entries(username, collection, entries):
+    """Appends a batch of moods or journals in a single commit (bulk imports)."""
+    ensure_migrated()
+    if collection == "journals":
+        writer.extend(log_path(username, "journals"), entries)
+        return
+    _convert_mood_log(username)
+    path = mood_store_path(username)
+
+    def fold(rollups):
+        if rollups is None:
+            return _full_rollups(username, path) # The store already contains the new entries
+        for entry in entries:
+            add_mood(rollups, entry)
+        return rollups
+
+    writer.extend(path, entries, derived=[(rollups_path(username), fold)])
+
+
+def append_journal(username, entry):
+    """Appends one journal entry to the user's journal log."""
+    ensure_migrated()
+    writer.append(log_path(username, "journals"), entry)
+
+
+def replace_entries(username, collection, entries):
+    """Rewrites a user's moods or journals at once (migrations and bulk saves); archived months are left alone."""
+    if collection == "moods":
+        _convert_mood_log(username) # So the old log can't be converted over the new moods later
+        entries = list(entries) # The mood store sorts them by time itself
+        summary = archive_summary_path(username) # Only the hot moods are replaced; archived months keep counting
+        writer.replace(
+            mood_store_path(username), entries,
+            derived=[(rollups_path(username), lambda rollups: merge_rollups(build_rollups(entries), archived_rollups(read_json(summary))))]
+        )
+        return
+    entries = sorted(entries, key=lambda e: str(e.get("timestamp", ""))) # Logs are kept in timestamp order
+    writer.replace(log_path(username, collection), entries)
+
+
+def load_rollups(username):
+    """Returns a user's mood rollups, building them from the mood store the first time."""
+    ensure_migrated()
+    path = rollups_path(username)
+    rollups = file_cache.get(path, read_json)
+    if rollups is None:
+        _convert_mood_log(username)
+        store = mood_store_path(username)
+        # Built inside the writer so it is ordered with any mood being appended right now
+        writer.update_json(path, lambda current: current if current is not None else _full_rollups(username, store))
+        rollups = file_cache.get(path, read_json)
+    elif any(period in rollups for period in DROPPED_PERIODS):
+        writer.update_json(path, _drop_periods) # Once per user, so appends stop carrying the dead weight
+        rollups = file_cache.get(path, read_json)
+    return rollups
+
+
+def _drop_periods(rollups):
+    if rollups is None:
+        return None
+    return {period: buckets for period, buckets in rollups.items() if period not in DROPPED_PERIODS}
+
+
+def rebuild_rollups(username):
+    """Recomputes a user's mood rollups from the full mood store (and the archive summary)."""
+    _convert_mood_log(username)
+    store = mood_store_path(username)
+    writer.update_json(rollups_path(username), lambda current: _full_rollups(username, store))
+
+
+def _full_rollups(username, store):
+    """Builds rollups over every mood: the hot store's, plus the archived months' from the summary."""
+    rollups = build_rollups(mood_store.read_store(store).entries())
+    return merge_rollups(rollups, archived_rollups(read_json(archive_summary_path(username))))
+
+
+def compact_user(username):
+    """Compacts a user's journal log and rewrites their mood store."""
+    _convert_mood_log(username)
+    writer.compact(log_path(username, "journals"))
+    writer.compact(mood_store_path(username))
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, TypeError):
+        return "-"
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def data_version(username):
+    """
+    Returns a token that changes whenever a user's profile, goals, moods or journals change.
+    Unlike the file cache's versions it is built from file stats only, so it can be compared across processes and runs.
+    """
+    store = mood_store.generation_path(mood_store_path(username))
+    paths = [
+        profile_path(username), log_path(username, "journals"), log_path(username, "moods"), archive_summary_path(username),
+        store, store and os.path.join(store, mood_store.FILES[0][0]) # Appends grow the timestamps file last
+    ]
+    return "|".join(_file_stamp(path) for path in paths)
+
+
+def list_usernames():
+    """Lists every user that has a shard."""
+    ensure_migrated()
+    return _shard_usernames()
+
+
+def _shard_usernames():
+    if not os.path.isdir(DATA_DIR):
+        return []
+    return sorted(
+        unquote(name) for name in os.listdir(DATA_DIR)
+        if os.path.exists(os.path.join(DATA_DIR, name, USER_FILE))
+    )
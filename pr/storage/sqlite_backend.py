@@ -0,0 +1,371 @@
+import hashlib
+import json
+import sqlite3
+import threading
+
+from storage.base import GOAL_STATUSES, StorageBackend
+from storage.rollups import DROPPED_PERIODS, PERIODS, bucket_keys, empty_rollups
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    email TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS moods (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    mood_text TEXT NOT NULL,
+    mood_emoji TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_moods_user_time ON moods (username, timestamp);
+CREATE TABLE IF NOT EXISTS mood_rollups (
+    username TEXT NOT NULL,
+    period TEXT NOT NULL, -- 'day', or 'skipped' for unparseable timestamps
+    bucket TEXT NOT NULL,
+    mood TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (username, period, bucket, mood)
+);
+CREATE TABLE IF NOT EXISTS journals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    content TEXT NOT NULL,
+    entry_id TEXT -- The entry's own "id" (NULL for entries saved before ids existed)
+);
+CREATE INDEX IF NOT EXISTS idx_journals_user_time ON journals (username, timestamp);
+CREATE TABLE IF NOT EXISTS reflections (
+    username TEXT NOT NULL,
+    entry_id TEXT NOT NULL, -- search.entry_id() of the journal entry
+    timestamp TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (username, entry_id)
+);
+CREATE TABLE IF NOT EXISTS goals (
+    username TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    due_date TEXT,
+    status TEXT NOT NULL,
+    PRIMARY KEY (username, id)
+);
+CREATE INDEX IF NOT EXISTS idx_goals_user_status ON goals (username, status);
+CREATE INDEX IF NOT EXISTS idx_goals_user_due ON goals (username, due_date);
+"""
+
+GOAL_COLUMNS = ("id", "title", "description", "due_date", "status")
+# ORDER BY clause for each list_goals() order; undated goals go last ascending and first descending
+GOAL_ORDER_BY = {
+    None: "position",
+    "due_asc": "due_date IS NULL, due_date, position",
+    "due_desc": "due_date IS NULL DESC, due_date DESC, position",
+    "status": "CASE status " + " ".join(f"WHEN '{status}' THEN {i}" for i, status in enumerate(GOAL_STATUSES))
+              + f" ELSE {len(GOAL_STATUSES)} END, position"
+}
+
+
+class SqliteBackend(StorageBackend):
+    """
+    SQLite storage. History views and dashboard queries are indexed range scans on
+    (username, timestamp) and (username, status) instead of loading everything into Python.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local() # Streamlit serves sessions from several threads
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self._add_missing_columns(conn)
+            self._drop_old_rollups(conn)
+            self._backfill_rollups(conn)
+
+    def _add_missing_columns(self, conn):
+        """Upgrades databases created before newer columns were added."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(journals)")}
+        if "entry_id" not in columns:
+            conn.execute("ALTER TABLE journals ADD COLUMN entry_id TEXT")
+
+    def _drop_old_rollups(self, conn):
+        """Removes rollup rows for periods that are no longer kept (e.g. weekly counts)."""
+        conn.executemany("DELETE FROM mood_rollups WHERE period = ?", [(period,) for period in DROPPED_PERIODS])
+
+    def _backfill_rollups(self, conn):
+        """Builds rollups for moods stored before the mood_rollups table existed."""
+        if conn.execute("SELECT 1 FROM mood_rollups LIMIT 1").fetchone() is not None:
+            return
+        for row in conn.execute("SELECT username, timestamp, mood_text FROM moods").fetchall():
+            self._fold_mood(conn, row["username"], row["timestamp"], row["mood_text"])
+
+    def _fold_mood(self, conn, username, timestamp, mood_text):
+        """Adds one mood to the daily rollups, in the caller's transaction."""
+        keys = bucket_keys(timestamp)
+        rows = [(period, keys[period], mood_text) for period in PERIODS] if keys else [("skipped", "", "")]
+        conn.executemany(
+            """
+            INSERT INTO mood_rollups (username, period, bucket, mood, count) VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT (username, period, bucket, mood) DO UPDATE SET count = count + 1
+            """,
+            [(username, period, bucket, mood) for period, bucket, mood in rows]
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Users ---
+    def list_usernames(self):
+        rows = self._connect().execute("SELECT username FROM users ORDER BY username")
+        return [row["username"] for row in rows]
+
+    def user_exists(self, username):
+        row = self._connect().execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone()
+        return row is not None
+
+    def get_profile(self, username):
+        row = self._connect().execute(
+            "SELECT password, email FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def update_profile(self, username, password, email):
+        with self._connect() as conn:
+            updated = conn.execute("UPDATE users SET password = ?, email = ? WHERE username = ?", (password, email, username))
+        if not updated.rowcount:
+            raise KeyError(username)
+
+    def create_user(self, username, password, email):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, password, email) VALUES (?, ?, ?)",
+                    (username, password, email)
+                )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Username {username!r} already exists.")
+
+    # --- Moods and journals ---
+    def _range_query(self, table, columns, username, start, end):
+        sql = f"SELECT {', '.join(columns)} FROM {table} WHERE username = ?"
+        params = [username]
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND timestamp < ?"
+            params.append(end)
+        sql += " ORDER BY timestamp, id"
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def append_mood(self, username, entry):
+        with self._connect() as conn:
+            self._insert_mood(conn, username, entry)
+
+    def _insert_mood(self, conn, username, entry):
+        conn.execute(
+            "INSERT INTO moods (username, timestamp, mood_text, mood_emoji, description) VALUES (?, ?, ?, ?, ?)",
+            (username, entry["timestamp"], entry["mood_text"], entry.get("mood_emoji", ""), entry.get("description", ""))
+        )
+        self._fold_mood(conn, username, entry["timestamp"], entry["mood_text"]) # Same transaction as the insert
+
+    # SQLite keeps every entry in its indexed tables, so nothing is archived and archived=True changes nothing
+    def list_moods(self, username, start=None, end=None, archived=False):
+        return self._range_query("moods", ("timestamp", "mood_text", "mood_emoji", "description"), username, start, end)
+
+    def mood_columns(self, username, start=None, end=None):
+        sql = "SELECT timestamp, mood_text FROM moods WHERE username = ?"
+        params = [username]
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND timestamp < ?"
+            params.append(end)
+        sql += " ORDER BY timestamp, id"
+        cursor = self._connect().cursor()
+        cursor.row_factory = None # Plain tuples, transposed straight into columns
+        rows = cursor.execute(sql, params).fetchall()
+        timestamps, mood_texts = zip(*rows) if rows else ((), ())
+        return {"timestamp": list(timestamps), "mood_text": list(mood_texts)}
+
+    def get_mood_rollups(self, username):
+        rollups = empty_rollups()
+        rows = self._connect().execute(
+            "SELECT period, bucket, mood, count FROM mood_rollups WHERE username = ?", (username,)
+        )
+        for row in rows:
+            if row["period"] == "skipped":
+                rollups["skipped"] = row["count"]
+            elif row["period"] in PERIODS:
+                rollups[row["period"]].setdefault(row["bucket"], {})[row["mood"]] = row["count"]
+        return rollups
+
+    def append_journal(self, username, entry):
+        with self._connect() as conn:
+            self._insert_journal(conn, username, entry)
+
+    def _insert_journal(self, conn, username, entry):
+        conn.execute(
+            "INSERT INTO journals (username, timestamp, content, entry_id) VALUES (?, ?, ?, ?)",
+            (username, entry["timestamp"], entry["content"], entry.get("id"))
+        )
+
+    def list_journals(self, username, start=None, end=None, archived=False):
+        entries = self._range_query("journals", ("timestamp", "content", "entry_id AS id"), username, start, end)
+        for entry in entries:
+            if entry["id"] is None:
+                del entry["id"] # Same shape as the JSON backend for entries saved without an id
+        return entries
+
+    def journal_version(self, username):
+        return self._table_version(username, "journals")
+
+    def mood_version(self, username):
+        return self._table_version(username, "moods")
+
+    def data_version(self, username):
+        conn = self._connect()
+        profile = conn.execute("SELECT password, email FROM users WHERE username = ?", (username,)).fetchone()
+        goals = conn.execute(
+            "SELECT id, position, title, description, due_date, status FROM goals WHERE username = ? ORDER BY id", (username,)
+        )
+        # The profile and goals are updated in place, so they are hashed rather than counted
+        rows = [tuple(profile) if profile is not None else None] + [tuple(row) for row in goals]
+        digest = hashlib.sha1(json.dumps(rows).encode("utf-8"))
+        return f"{self._table_version(username, 'moods')}|{self._table_version(username, 'journals')}|{digest.hexdigest()}"
+
+    def _table_version(self, username, table):
+        row = self._connect().execute(
+            f"SELECT COUNT(*), MAX(id) FROM {table} WHERE username = ?", (username,)
+        ).fetchone()
+        return tuple(row)
+
+    def page_entries(self, username, collection, limit, cursor=None):
+        columns = {
+            "moods": "timestamp, mood_text, mood_emoji, description",
+            "journals": "timestamp, content, entry_id AS id"
+        }[collection]
+        # Keyset pagination on (timestamp, id): walks the (username, timestamp) index backwards from the cursor
+        # (Row ids are table-qualified: journals also return their own entry id as "id")
+        sql = f"SELECT {columns}, {collection}.id AS row_id FROM {collection} WHERE username = ?"
+        params = [username]
+        if cursor is not None:
+            sql += f" AND (timestamp < ? OR (timestamp = ? AND {collection}.id < ?))"
+            params += [cursor[0], cursor[0], cursor[1]]
+        sql += f" ORDER BY timestamp DESC, {collection}.id DESC LIMIT ?"
+        params.append(limit + 1) # One extra row tells whether there is an older page
+        rows = [dict(row) for row in self._connect().execute(sql, params)]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]["timestamp"], rows[-1]["row_id"])
+        for row in rows:
+            del row["row_id"]
+            if collection == "journals" and row["id"] is None:
+                del row["id"]
+        return rows, next_cursor
+
+    def replace_entries(self, username, collection, entries):
+        insert = {"moods": self._insert_mood, "journals": self._insert_journal}[collection]
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {collection} WHERE username = ?", (username,))
+            if collection == "moods":
+                conn.execute("DELETE FROM mood_rollups WHERE username = ?", (username,))
+            for entry in entries:
+                insert(conn, username, entry)
+
+    def append_entries(self, username, collection, entries):
+        insert = {"moods": self._insert_mood, "journals": self._insert_journal}[collection]
+        with self._connect() as conn: # One transaction for the whole batch
+            for entry in entries:
+                insert(conn, username, entry)
+
+    def iter_entries(self, username, collection, archived=False):
+        columns = {
+            "moods": "timestamp, mood_text, mood_emoji, description",
+            "journals": "timestamp, content, entry_id AS id"
+        }[collection]
+        # Rows are fetched as the caller iterates, not all at once
+        rows = self._connect().execute(
+            f"SELECT {columns} FROM {collection} WHERE username = ? ORDER BY timestamp, {collection}.id", (username,)
+        )
+        for row in rows:
+            entry = dict(row)
+            if collection == "journals" and entry["id"] is None:
+                del entry["id"]
+            yield entry
+
+    # --- Reflections ---
+    def save_reflection(self, username, entry_id, text, created_at):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO reflections (username, entry_id, timestamp, text) VALUES (?, ?, ?, ?)
+                ON CONFLICT (username, entry_id) DO UPDATE SET timestamp = excluded.timestamp, text = excluded.text
+                """,
+                (username, entry_id, created_at, text)
+            )
+
+    def get_reflections(self, username):
+        rows = self._connect().execute("SELECT entry_id, timestamp, text FROM reflections WHERE username = ?", (username,))
+        return {row["entry_id"]: dict(row) for row in rows}
+
+    # --- Goals ---
+    def list_goals(self, username, statuses=None, order=None):
+        if order not in GOAL_ORDER_BY:
+            raise ValueError(f"Unknown goal order: {order}")
+        sql = f"SELECT {', '.join(GOAL_COLUMNS)} FROM goals WHERE username = ?"
+        params = [username]
+        if statuses is not None:
+            statuses = list(statuses)
+            if not statuses:
+                return []
+            sql += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        sql += f" ORDER BY {GOAL_ORDER_BY[order]}"
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def get_goal(self, username, goal_id):
+        row = self._connect().execute(
+            f"SELECT {', '.join(GOAL_COLUMNS)} FROM goals WHERE username = ? AND id = ?", (username, goal_id)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def upsert_goal(self, username, goal):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO goals (username, id, position, title, description, due_date, status)
+                VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM goals WHERE username = ?), ?, ?, ?, ?)
+                ON CONFLICT (username, id) DO UPDATE SET
+                    title = excluded.title,
+                    description = excluded.description,
+                    due_date = excluded.due_date,
+                    status = excluded.status
+                """,
+                (username, goal["id"], username, goal["title"], goal.get("description", ""), goal.get("due_date"), goal["status"])
+            )
+
+    def delete_goal(self, username, goal_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM goals WHERE username = ? AND id = ?", (username, goal_id))
+
+    def count_goals_by_status(self, username):
+        counts = {status: 0 for status in GOAL_STATUSES}
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS n FROM goals WHERE username = ? GROUP BY status", (username,)
+        )
+        for row in rows:
+            if row["status"] in counts:
+                counts[row["status"]] = row["n"]
+        return counts
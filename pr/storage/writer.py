@@ -0,0 +1,271 @@
+import collections
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import metrics
+from storage import entry_log, mood_store
+from storage.cache import file_cache
+
+
+def read_json(path):
+    """Parses a JSON file, returning None if it is missing or corrupt."""
+    if not os.path.exists(path):
+        return None
+    with metrics.timer("json_parse"), open(path, "r") as file:
+        try:
+            return json.load(file)
+        except json.JSONDecodeError:
+            return None
+        finally:
+            metrics.count("bytes_read", file.tell())
+
+
+def atomic_write_json(path, data, indent=4):
+    """Writes JSON to a temp file and renames it over the target so readers never see a half-written file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, indent=indent)
+        metrics.count("bytes_written", file.tell())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class _Job:
+    def __init__(self, path, kind, payload, derived=(), run=None):
+        self.path = path
+        self.kind = kind # "update", "append", "extend", "replace", "compact" or "call"
+        self.payload = payload
+        self.derived = derived # (path, mutate) JSON updates to apply after this job commits
+        self.run = run # The rerun waiting on this job (see metrics.start_run), credited with the commit's metrics
+        self.result = None
+        self.future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+def _fail(jobs, error):
+    """Resolves every job that isn't done yet with error, so no caller is left waiting."""
+    for job in jobs:
+        if not job.future.done():
+            job.future.set_exception(error)
+
+
+class GroupCommitWriter:
+    """
+    Single writer for every session in the process.
+    Mutations are queued and applied by one background thread. Jobs arriving within `window`
+    seconds are committed together: each JSON file is read once, every queued mutation is applied
+    to the fresh copy, and it is written back once (temp file + rename); log appends to the same
+    file share one write and one fsync. Because mutations run against the latest data on disk,
+    concurrent sessions can't overwrite each other's updates.
+    """
+
+    def __init__(self, window=0.005, max_batch=256):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=1000) # Recent submit-to-commit times in seconds
+        self.batches = 0
+        self.jobs = 0
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="soulsync-writer", daemon=True)
+                self._thread.start()
+
+    def _submit(self, path, kind, payload, derived=()):
+        job = _Job(path, kind, payload, derived, metrics.current_run())
+        self._ensure_started()
+        self._queue.put(job)
+        with metrics.timer("write_wait"):
+            return job.future.result() # Block until committed so the caller's rerun sees the write
+
+    def update_json(self, path, mutate, derived=()):
+        """
+        Applies mutate(doc) to the current contents of a JSON file and writes it back.
+        doc is None if the file doesn't exist yet; mutate returns the document to write
+        (or None to leave the file untouched). Exceptions raised by mutate are re-raised here.
+        derived (path, mutate) updates are applied in the same commit if mutate succeeds.
+        """
+        return self._submit(path, "update", mutate, derived)
+
+    def append(self, path, entry, derived=()):
+        """
+        Appends one entry to a JSON Lines log or a mood store (storage.mood_store).
+        derived is a list of (path, mutate) JSON updates that keep summaries of the log in step;
+        they run in the same commit, right after the append, so no other write can slip in between.
+        """
+        return self._submit(path, "append", entry, derived)
+
+    def extend(self, path, entries, derived=()):
+        """Like append, but for a batch of entries (bulk imports); they are written together."""
+        return self._submit(path, "extend", list(entries), derived)
+
+    def replace(self, path, entries, derived=()):
+        """Atomically replaces a JSON Lines log, then applies any derived (path, mutate) updates."""
+        return self._submit(path, "replace", entries, derived)
+
+    def compact(self, path, wait=True):
+        """Compacts a JSON Lines log (or rewrites a mood store). With wait=False the compaction is only scheduled."""
+        if wait:
+            return self._submit(path, "compact", None)
+        self._ensure_started()
+        self._queue.put(_Job(path, "compact", None))
+
+    def call(self, path, fn, derived=()):
+        """
+        Runs fn(path) on the writer thread, in order with every other write to the log or mood store
+        at path, and returns its result. For multi-step maintenance like archiving old entries.
+        """
+        return self._submit(path, "call", fn, derived)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except Exception as e:
+                _fail(batch, e) # The writer serves every session, so it must outlive any one bad batch
+
+    def _commit(self, batch):
+        # Every rerun waiting on the batch waited for all of it
+        with metrics.recording_for(job.run for job in batch), metrics.timer("write_commit"):
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        by_path = collections.OrderedDict()
+        for job in batch:
+            by_path.setdefault(job.path, []).append(job)
+        for path, jobs in by_path.items():
+            try:
+                with metrics.recording_for(job.run for job in jobs): # Bytes read and written go to the reruns that asked
+                    directory = os.path.dirname(path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    if jobs[0].kind == "update":
+                        self._commit_json(path, jobs)
+                    else:
+                        self._commit_log(path, jobs)
+            except Exception as e:
+                _fail(jobs, e) # Only this path's jobs fail; the rest of the batch still commits
+            file_cache.invalidate(path)
+        # Summaries derived from the logs (e.g. mood rollups) are updated once the log writes are done
+        derived = collections.OrderedDict()
+        for job in batch:
+            if job.future.done():
+                continue # Failed, so its summaries must not change either
+            for derived_path, mutate in job.derived:
+                derived.setdefault(derived_path, []).append(_Job(derived_path, "update", mutate, run=job.run))
+        for path, jobs in derived.items():
+            try:
+                with metrics.recording_for(job.run for job in jobs):
+                    self._commit_json(path, jobs)
+            except Exception as e:
+                _fail(jobs, e)
+            file_cache.invalidate(path)
+        now = time.perf_counter()
+        with self._stats_lock:
+            self.batches += 1
+            self.jobs += len(batch)
+            self._latencies.extend(now - job.submitted_at for job in batch)
+        for job in batch:
+            if not job.future.done():
+                job.future.set_result(job.result)
+
+    def _commit_json(self, path, jobs):
+        try:
+            doc = read_json(path)
+        except (OSError, ValueError) as e: # E.g. unreadable, or not UTF-8 (corrupt JSON reads as None)
+            _fail(jobs, e)
+            return
+        changed = False
+        applied = []
+        for job in jobs:
+            try:
+                new_doc = job.payload(doc)
+            except Exception as e:
+                job.future.set_exception(e)
+                continue
+            if new_doc is not None:
+                doc = new_doc
+                changed = True
+            applied.append(job)
+        if changed:
+            try:
+                atomic_write_json(path, doc)
+            except Exception as e:
+                for job in applied:
+                    job.future.set_exception(e)
+
+    def _commit_log(self, path, jobs):
+        # Logs are JSON Lines files; a path without the .jsonl extension is a mood store directory
+        log = entry_log if path.endswith(".jsonl") else mood_store
+        pending = []
+
+        def flush():
+            # All appends queued since the last rewrite go out in one write + fsync
+            if not pending:
+                return
+            try:
+                log.append_entries(path, [entry for job in pending for entry in (job.payload if job.kind == "extend" else [job.payload])])
+            except Exception as e:
+                for job in pending:
+                    job.future.set_exception(e)
+            pending.clear()
+
+        for job in jobs:
+            if job.kind in ("append", "extend"):
+                pending.append(job)
+                continue
+            flush()
+            try:
+                if job.kind == "replace":
+                    log.write_entries(path, job.payload)
+                elif job.kind == "compact" and os.path.exists(path):
+                    log.compact(path)
+                elif job.kind == "call":
+                    job.result = job.payload(path)
+            except Exception as e:
+                job.future.set_exception(e)
+        flush()
+
+    def stats(self):
+        """Returns queue depth, batch counts, and commit latency percentiles in milliseconds."""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            batches, jobs = self.batches, self.jobs
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "jobs": jobs,
+            "avg_batch_size": jobs / batches if batches else 0.0,
+            "commit_latency_p50_ms": percentile(0.50),
+            "commit_latency_p95_ms": percentile(0.95),
+            "commit_latency_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+writer = GroupCommitWriter()
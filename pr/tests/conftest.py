@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # The app's modules live in pr/
+
+import insights
+import search
+import storage
+from storage import create_backend, shards
+from storage.cache import UserObjectCache, file_cache
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs a test in an empty working directory with fresh process-wide storage state."""
+    monkeypatch.chdir(tmp_path) # The JSON store lives in ./user_data
+    monkeypatch.setattr(shards, "_migration_checked", False)
+    monkeypatch.setattr(shards, "_goal_indexes", UserObjectCache(shards.MAX_CACHED_GOAL_INDEXES))
+    monkeypatch.setattr(search, "_indexes", UserObjectCache(search.MAX_CACHED_INDEXES))
+    monkeypatch.setattr(search, "_archived_indexes", UserObjectCache(search.MAX_CACHED_INDEXES))
+    monkeypatch.setattr(insights, "_insights", UserObjectCache(insights.MAX_CACHED_INSIGHTS))
+    monkeypatch.setattr(storage, "_backend", None)
+    file_cache.clear()
+    yield tmp_path
+    file_cache.clear()
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request, workdir, monkeypatch):
+    """Each backend in turn, also installed as the process-wide one returned by get_backend()."""
+    instance = create_backend(request.param, str(workdir / "test.db"))
+    monkeypatch.setattr(storage, "_backend", instance)
+    return instance
@@ -0,0 +1,82 @@
+import hashlib
+import json
+
+import pytest
+
+from analytics import aggregate
+from storage import create_backend
+
+
+def _populate(backend, users):
+    for n in range(users):
+        username = f"user{n}"
+        backend.create_user(username, "secret", "")
+        # 2025-01-06 is a Monday; everyone logs a happy Monday, only user0 a sad Tuesday
+        backend.append_mood(username, {"timestamp": "2025-01-06T09:00:00", "mood_text": "Happy", "mood_emoji": "😀", "description": ""})
+        backend.append_journal(username, {"id": f"{username}-1", "timestamp": "2025-01-06T21:00:00", "content": "fine"})
+        backend.upsert_goal(username, {"id": "g1", "title": "Run", "description": "", "due_date": None, "status": "Completed"})
+    backend.append_mood("user0", {"timestamp": "2025-01-07T09:00:00", "mood_text": "Sad", "mood_emoji": "😢", "description": ""})
+    backend.upsert_goal("user0", {"id": "g2", "title": "Swim", "description": "", "due_date": None, "status": "Cancelled"})
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def populated(request, workdir, monkeypatch):
+    monkeypatch.delenv(aggregate.KEY_ENV, raising=False)
+    sqlite_path = str(workdir / "test.db")
+    _populate(create_backend(request.param, sqlite_path), 6)
+    return request.param, sqlite_path
+
+
+def _run(populated, **kwargs):
+    return aggregate.run(*populated, workers=1, **kwargs)
+
+
+def test_small_groups_are_left_out(populated):
+    report = _run(populated)
+    assert report["users"] == 6
+    assert report["moods_by_weekday"]["Monday"] == {"moods": 6, "share": {"Happy": 1.0}}
+    assert report["moods_by_weekday"]["Tuesday"] == {"moods": None, "share": {}} # Only user0
+    assert report["journal_entries_by_weekday"]["Monday"] == 6
+    assert report["journal_entries_by_weekday"]["Tuesday"] is None
+    assert report["goals"]["by_status"]["Completed"] == 6
+    assert report["goals"]["by_status"]["Cancelled"] is None
+    assert report["goals"]["completion_rate"] == 1.0
+
+
+def test_too_few_users_report_nothing(workdir, monkeypatch):
+    monkeypatch.delenv(aggregate.KEY_ENV, raising=False)
+    _populate(create_backend("json"), 3)
+    report = aggregate.run("json", workers=1)
+    assert report["users"] is None and report["journal_entries"] is None
+    assert report["goals"]["completion_rate"] is None and report["goals"]["users_with_goals"] is None
+
+
+def test_state_file_does_not_identify_users(populated, workdir):
+    _run(populated)
+    with open(workdir / aggregate.STATE_PATH) as file:
+        state = file.read()
+    for n in range(6):
+        username = f"user{n}"
+        assert username not in state
+        assert hashlib.sha256(username.encode("utf-8")).hexdigest()[:24] not in state
+    key = aggregate.load_key()
+    assert set(json.loads(state)["users"]) == {aggregate.user_key(key, f"user{n}") for n in range(6)}
+
+
+def test_incremental_run_matches_full_run(populated, monkeypatch):
+    _run(populated)
+    backend = create_backend(*populated)
+    backend.append_mood("user1", {"timestamp": "2025-01-07T09:00:00", "mood_text": "Sad", "mood_emoji": "😢", "description": ""})
+    incremental = _run(populated)
+    assert incremental["run"]["reduced"] == 1 and incremental["run"]["reused"] == 5
+    full = _run(populated, full=True)
+    for report in (incremental, full):
+        del report["generated_at"], report["run"]
+    assert incremental == full
+
+    # A different key re-reduces everyone and drops the partials stored under the old keys
+    monkeypatch.setenv(aggregate.KEY_ENV, "ab" * 32)
+    rekeyed = _run(populated)
+    assert rekeyed["run"]["reduced"] == 6 and rekeyed["run"]["removed"] == 6
+    del rekeyed["generated_at"], rekeyed["run"]
+    assert rekeyed == full
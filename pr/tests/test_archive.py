@@ -0,0 +1,62 @@
+import pytest
+
+from storage import create_backend, shards
+from storage.mood_store import MOOD_EMOJIS
+
+HORIZON = "2025-01-01T00:00:00"
+
+
+def _journal(month, day):
+    return {"id": f"j{month}-{day}", "timestamp": f"2024-{month:02d}-{day:02d}T21:00:00", "content": f"entry {month}/{day}"}
+
+
+def _mood(month, day):
+    return {"timestamp": f"2024-{month:02d}-{day:02d}T09:00:00", "mood_text": "Happy", "mood_emoji": MOOD_EMOJIS["Happy"], "description": ""}
+
+
+@pytest.fixture
+def archived(workdir):
+    backend = create_backend("json")
+    backend.create_user("alice", "secret", "")
+    old = {"journals": [_journal(month, day) for month in (10, 11, 12) for day in (1, 2, 3)],
+           "moods": [_mood(month, day) for month in (10, 11, 12) for day in (1, 2, 3)]}
+    hot = {"journals": [dict(_journal(1, day), timestamp=f"2025-01-{day:02d}T21:00:00") for day in (1, 2)],
+           "moods": [dict(_mood(1, day), timestamp=f"2025-01-{day:02d}T09:00:00") for day in (1, 2)]}
+    for collection in ("journals", "moods"):
+        backend.append_entries("alice", collection, old[collection] + hot[collection])
+    assert shards.archive_user("alice", HORIZON) == {"moods": 9, "journals": 9}
+    return backend, old, hot
+
+
+def _pages(backend, collection, limit):
+    pages, cursor = [], None
+    while True:
+        page, cursor = backend.page_entries("alice", collection, limit, cursor=cursor)
+        pages.append(page)
+        if cursor is None:
+            return pages
+        cursor = list(cursor) if isinstance(cursor, tuple) else cursor # Cursors come back from session state as JSON
+
+
+@pytest.mark.parametrize("collection", ["journals", "moods"])
+def test_paging_carries_on_into_the_archive(archived, collection, monkeypatch):
+    backend, old, hot = archived
+    opened = []
+    load_segment = shards._load_segment
+    monkeypatch.setattr(shards, "_load_segment", lambda *args: opened.append(args[2]) or load_segment(*args))
+
+    first, cursor = backend.page_entries("alice", collection, 2)
+    assert first == hot[collection][::-1] and cursor is not None
+    assert opened == [] # The archive isn't touched while the hot entries fill the page
+
+    pages = _pages(backend, collection, 4)
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [entry for page in pages for entry in page] == (old[collection] + hot[collection])[::-1]
+    assert sorted(set(opened)) == ["2024-10", "2024-11", "2024-12"]
+
+
+def test_archive_is_read_only_when_asked_for(archived):
+    backend, old, hot = archived
+    assert backend.list_journals("alice") == hot["journals"]
+    assert backend.list_journals("alice", archived=True) == old["journals"] + hot["journals"]
+    assert backend.archive_summary("alice") == {"horizon": HORIZON, "moods": 9, "journals": 9}
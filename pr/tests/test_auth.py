@@ -0,0 +1,88 @@
+from auth import load_users, save_collection, save_users
+
+
+class RecordingBackend:
+    """Records the writes save_collection makes."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name,) + args[1:])
+
+
+GOALS = [
+    {"id": "g1", "title": "Run", "description": "", "due_date": None, "status": "To Do"},
+    {"id": "g2", "title": "Read", "description": "", "due_date": "2025-01-01", "status": "In Progress"}
+]
+JOURNALS = [{"id": "j1", "timestamp": "2025-01-01T09:00:00", "content": "first"}]
+
+
+def test_save_collection_skips_unchanged():
+    recorder = RecordingBackend()
+    assert not save_collection(recorder, "alice", "goals", GOALS, [dict(goal) for goal in GOALS])
+    assert recorder.calls == []
+
+
+def test_save_collection_writes_only_changed_goals():
+    recorder = RecordingBackend()
+    after = [dict(GOALS[0], status="Completed"), {"id": "g3", "title": "New", "description": "", "due_date": None, "status": "To Do"}]
+    assert save_collection(recorder, "alice", "goals", GOALS, after)
+    assert recorder.calls == [("delete_goal", "g2"), ("upsert_goal", after[0]), ("upsert_goal", after[1])]
+
+
+def test_save_collection_appends_new_entries_only():
+    recorder = RecordingBackend()
+    new = {"id": "j2", "timestamp": "2025-01-02T09:00:00", "content": "second"}
+    save_collection(recorder, "alice", "journals", JOURNALS, JOURNALS + [new])
+    assert recorder.calls == [("append_entries", "journals", [new])]
+
+
+def test_save_collection_replaces_edited_entries():
+    recorder = RecordingBackend()
+    edited = [dict(JOURNALS[0], content="changed")]
+    save_collection(recorder, "alice", "journals", JOURNALS, edited)
+    assert recorder.calls == [("replace_entries", "journals", edited)]
+
+
+def _seed(backend):
+    backend.create_user("alice", "secret", "alice@example.com")
+    for goal in GOALS:
+        backend.upsert_goal("alice", goal)
+    backend.append_journal("alice", JOURNALS[0])
+
+
+def test_save_users_persists_in_place_edits(backend):
+    _seed(backend)
+    users = load_users()
+    users["alice"]["goals"][0]["title"] = "Run a marathon"
+    users["alice"]["journals"][0]["content"] = "rewritten"
+    # The edits must not leak into what the backend hands out before they are saved...
+    assert backend.get_goal("alice", "g1")["title"] == "Run"
+    assert backend.list_journals("alice")[0]["content"] == "first"
+    save_users(users)
+    # ...and must be on disk afterwards
+    assert backend.get_goal("alice", "g1")["title"] == "Run a marathon"
+    assert backend.list_journals("alice")[0]["content"] == "rewritten"
+    assert load_users() == users
+
+
+def test_save_users_persists_profile_changes(backend):
+    _seed(backend)
+    users = load_users()
+    users["alice"]["password"] = "new secret"
+    users["alice"]["email"] = "alice@example.org"
+    save_users(users)
+    assert backend.get_profile("alice") == {"password": "new secret", "email": "alice@example.org"}
+
+
+def test_save_users_leaves_unchanged_users_alone(backend):
+    _seed(backend)
+    version = backend.data_version("alice")
+    save_users(load_users())
+    assert backend.data_version("alice") == version
+
+
+def test_save_users_creates_new_users(backend):
+    save_users({"bob": {"password": "pw", "email": "", "goals": GOALS, "moods": [], "journals": JOURNALS}})
+    assert backend.get_user("bob") == {"password": "pw", "email": "", "goals": GOALS, "moods": [], "journals": JOURNALS}
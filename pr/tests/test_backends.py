@@ -0,0 +1,70 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from storage import create_backend, shards
+from storage.cache import file_cache
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GOAL = {"id": "g1", "title": "Run", "description": "", "due_date": None, "status": "To Do"}
+
+
+@pytest.mark.parametrize("change", [
+    lambda backend: backend.update_profile("alice", "new secret", "alice@example.com"),
+    lambda backend: backend.update_profile("alice", "secret", "alice@example.org"),
+    lambda backend: backend.upsert_goal("alice", dict(GOAL, status="Completed")),
+    lambda backend: backend.append_mood("alice", {"timestamp": "2025-01-01T09:00:00", "mood_text": "Sad", "mood_emoji": "😢", "description": ""}),
+    lambda backend: backend.append_journal("alice", {"id": "j1", "timestamp": "2025-01-01T21:00:00", "content": "hello"})
+], ids=["password", "email", "goal", "mood", "journal"])
+def test_data_version_changes_with_every_kind_of_data(backend, change):
+    backend.create_user("alice", "secret", "alice@example.com")
+    backend.upsert_goal("alice", GOAL)
+    before = backend.data_version("alice")
+    assert backend.data_version("alice") == before
+    time.sleep(0.01) # Past the file timestamp granularity, for the JSON backend's stats
+    change(backend)
+    assert backend.data_version("alice") != before
+
+
+def test_moods_appended_by_another_process_are_seen(workdir):
+    backend = create_backend("json")
+    backend.create_user("alice", "secret", "")
+    backend.append_mood("alice", {"timestamp": "2025-01-01T09:00:00", "mood_text": "Happy", "mood_emoji": "😀", "description": ""})
+    assert len(backend.list_moods("alice")) == 1 # Now cached
+    version = backend.mood_version("alice")
+    subprocess.run([sys.executable, "-c", (
+        "from storage import create_backend; create_backend('json').append_mood('alice', "
+        "{'timestamp': '2025-01-02T09:00:00', 'mood_text': 'Sad', 'mood_emoji': '😢', 'description': ''})"
+    )], cwd=workdir, env=dict(os.environ, PYTHONPATH=APP_DIR), check=True)
+    assert backend.mood_version("alice") != version
+    assert [mood["mood_text"] for mood in backend.list_moods("alice")] == ["Happy", "Sad"]
+    assert len(backend.get_mood_rollups("alice")["day"]) == 2 # Agrees with the history
+
+
+def test_weekly_rollups_from_older_versions_are_dropped(workdir):
+    mood = {"timestamp": "2025-01-01T09:00:00", "mood_text": "Happy", "mood_emoji": "😀", "description": ""}
+    sqlite_path = str(workdir / "test.db")
+    for name in ("json", "sqlite"):
+        backend = create_backend(name, sqlite_path)
+        backend.create_user("alice", "secret", "")
+        backend.append_mood("alice", mood)
+    # What an older version kept next to the daily counts
+    with open(shards.rollups_path("alice")) as file:
+        rollups = json.load(file)
+    with open(shards.rollups_path("alice"), "w") as file:
+        json.dump(dict(rollups, week={"2025-W01": {"Happy": 1}}), file)
+    file_cache.clear()
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.execute("INSERT INTO mood_rollups VALUES ('alice', 'week', '2025-W01', 'Happy', 1)")
+    for name in ("json", "sqlite"):
+        backend = create_backend(name, sqlite_path)
+        backend.append_mood("alice", dict(mood, timestamp="2025-01-02T09:00:00"))
+        assert backend.get_mood_rollups("alice") == {"day": {"2025-01-01": {"Happy": 1}, "2025-01-02": {"Happy": 1}}, "skipped": 0}
+    with open(shards.rollups_path("alice")) as file:
+        assert "week" not in json.load(file)
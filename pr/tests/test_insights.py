@@ -0,0 +1,42 @@
+from insights import get_insights, insights_version, record_journal, record_mood
+
+
+def _journal(n, content):
+    return {"id": f"j{n}", "timestamp": f"2025-01-{n:02d}T09:00:00", "content": content}
+
+
+def _mood(n, mood):
+    return {"timestamp": f"2025-01-{n:02d}T20:00:00", "mood_text": mood, "mood_emoji": "", "description": ""}
+
+
+def _themes(backend):
+    return dict(get_insights(backend, "alice").themes())
+
+
+def test_saves_are_folded_into_loaded_insights(backend):
+    backend.create_user("alice", "secret", "")
+    backend.append_journal("alice", _journal(1, "deadline at work"))
+    insights = get_insights(backend, "alice")
+    previous = insights_version(backend, "alice")
+    backend.append_journal("alice", _journal(2, "another deadline"))
+    record_journal(backend, "alice", _journal(2, "another deadline"), previous)
+    previous = insights_version(backend, "alice")
+    backend.append_mood("alice", _mood(2, "Stressed"))
+    record_mood(backend, "alice", _mood(2, "Stressed"), previous)
+    assert get_insights(backend, "alice") is insights # Folded in, not rebuilt
+    assert insights.n_docs == 2 and insights.mood_counts["Stressed"] == 1
+
+
+def test_changes_saved_elsewhere_in_between_are_not_lost(backend):
+    backend.create_user("alice", "secret", "")
+    backend.append_journal("alice", _journal(1, "deadline at work"))
+    get_insights(backend, "alice")
+    # Another session or process saves an entry and a mood without folding them into our insights
+    backend.append_journal("alice", _journal(2, "deadline again"))
+    backend.append_mood("alice", _mood(3, "Anxious"))
+    previous = insights_version(backend, "alice")
+    backend.append_journal("alice", _journal(3, "third deadline"))
+    record_journal(backend, "alice", _journal(3, "third deadline"), previous)
+    insights = get_insights(backend, "alice")
+    assert insights.n_docs == 3 and insights.mood_counts["Anxious"] == 1
+    assert insights.cooccurrence["deadline"]["Anxious"] == 1
@@ -0,0 +1,79 @@
+import os
+import threading
+
+import pytest
+
+from metrics import METRICS_PATH_ENV, metrics
+from reflection import ReflectionCache, ReflectionService, StubClient
+from storage import create_backend
+
+MOOD = {"timestamp": "2025-01-01T09:00:00", "mood_text": "Happy", "mood_emoji": "😀", "description": ""}
+
+
+def _in_run(fn):
+    run = metrics.start_run()
+    try:
+        fn()
+    finally:
+        metrics.finish_run()
+    return run
+
+
+@pytest.fixture
+def json_backend(workdir):
+    backend = create_backend("json")
+    backend.create_user("alice", "secret", "")
+    return backend
+
+
+def test_writer_thread_commits_count_toward_the_rerun(json_backend):
+    run = _in_run(lambda: json_backend.append_mood("alice", MOOD))
+    assert run["timers"]["write_commit"][0] == 1 and run["counters"]["bytes_written"] > 0
+    run = _in_run(lambda: json_backend.append_journal("alice", {"id": "j1", "timestamp": "2025-01-01T21:00:00", "content": "fine"}))
+    assert run["timers"]["write_commit"][0] == 1 and run["counters"]["bytes_written"] > 0
+
+
+def test_other_reruns_are_not_credited(json_backend):
+    idle = []
+    thread = threading.Thread(target=lambda: idle.append(metrics.start_run()))
+    thread.start()
+    thread.join()
+    _in_run(lambda: json_backend.append_mood("alice", MOOD))
+    assert idle[0]["counters"] == {} and idle[0]["timers"] == {}
+
+
+def test_stream_timing_counts_toward_the_rerun(tmp_path):
+    client = StubClient(reply=lambda entry: "one two")
+    service = ReflectionService(client_factory=lambda: client, cache=ReflectionCache(str(tmp_path / "cache.sqlite")))
+    run = _in_run(lambda: "".join(service.stream("entry")))
+    assert run["timers"]["ai_stream"][0] == 1
+
+
+def test_concurrent_exports_do_not_collide(tmp_path, monkeypatch):
+    path = str(tmp_path / "metrics.json")
+    errors = []
+
+    def export():
+        try:
+            for _ in range(50):
+                metrics.export(path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=export) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and os.listdir(tmp_path) == ["metrics.json"]
+
+    exported = []
+    monkeypatch.setattr(metrics, "export", exported.append)
+    monkeypatch.setattr(metrics, "_last_export", 0.0)
+    monkeypatch.setenv(METRICS_PATH_ENV, path)
+    threads = [threading.Thread(target=metrics.maybe_export) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert exported == [path] # Throttled to one
@@ -0,0 +1,57 @@
+import json
+import os
+
+from auth import load_users
+from storage import copy_users, create_backend, shards
+
+LEGACY = {
+    "alice": {
+        "password": "secret",
+        "email": "alice@example.com",
+        "goals": [{"id": "g1", "title": "Run", "description": "", "due_date": "2025-03-01", "status": "In Progress"}],
+        "moods": [
+            {"timestamp": "2025-01-01T09:00:00.123456", "mood_text": "Happy", "mood_emoji": "😀", "description": "sunny"},
+            {"timestamp": "not a date", "mood_text": "Sad", "mood_emoji": "😢", "description": ""} # Kept as it is
+        ],
+        "journals": [{"timestamp": "2025-01-01T21:00:00", "content": "saved before entries had ids"}]
+    },
+    "bob.smith/2": {"password": "pw", "email": ""} # Collections missing; awkward characters for a directory name
+}
+
+
+def _expected():
+    expected = json.loads(json.dumps(LEGACY))
+    for user_data in expected.values():
+        for collection in ("goals", "moods", "journals"):
+            user_data.setdefault(collection, [])
+    expected["alice"]["moods"].sort(key=lambda mood: mood["timestamp"] != "not a date") # Unparseable timestamps sort first
+    return expected
+
+
+def test_users_json_migrates_into_shards(workdir):
+    with open(shards.LEGACY_USER_DATA_FILE, "w") as file:
+        json.dump(LEGACY, file)
+    assert load_users() == _expected()
+    assert os.path.exists(shards.LEGACY_USER_DATA_FILE) # Kept as a backup
+    assert {shards.shard_name(name) for name in LEGACY} <= set(os.listdir(shards.DATA_DIR))
+
+
+def test_migration_never_overwrites_a_shard(workdir):
+    with open(shards.LEGACY_USER_DATA_FILE, "w") as file:
+        json.dump(LEGACY, file)
+    load_users()
+    create_backend("json").update_profile("alice", "changed", "alice@example.com")
+    assert shards.migrate_users_json() == 0
+    assert load_users()["alice"]["password"] == "changed"
+
+
+def test_migrated_users_copy_into_sqlite_unchanged(workdir):
+    with open(shards.LEGACY_USER_DATA_FILE, "w") as file:
+        json.dump(LEGACY, file)
+    sqlite = create_backend("sqlite", str(workdir / "test.db"))
+    assert copy_users(create_backend("json"), sqlite) == 2
+    copied = {name: sqlite.get_user(name) for name in sqlite.list_usernames()}
+    expected = _expected()
+    for users in (copied, expected):
+        users["alice"]["moods"].sort(key=json.dumps) # Where unparseable timestamps sort is up to the backend
+    assert copied == expected
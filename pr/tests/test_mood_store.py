@@ -0,0 +1,67 @@
+import os
+
+from metrics import metrics
+from storage import mood_store
+
+
+def _mood(day, mood="Happy", description="ok"):
+    return {
+        "timestamp": f"2025-01-{day:02d}T09:00:00",
+        "mood_text": mood,
+        "mood_emoji": mood_store.MOOD_EMOJIS[mood],
+        "description": description
+    }
+
+
+def test_append_and_read_round_trip(tmp_path):
+    entries = [_mood(1), _mood(2, "Sad", "rainy ☔"), _mood(3, "Neutral", "")]
+    mood_store.append_entries(str(tmp_path), entries[:1])
+    mood_store.append_entries(str(tmp_path), entries[1:])
+    assert mood_store.read_store(str(tmp_path)).entries() == entries
+
+
+def test_irregular_entries_are_kept_whole(tmp_path):
+    entries = [
+        {"timestamp": "not a date", "mood_text": "Happy", "mood_emoji": "😀", "description": "x"},
+        dict(_mood(2), note="extra field"),
+        dict(_mood(3), mood_text="Bored", mood_emoji="🥱")
+    ]
+    mood_store.append_entries(str(tmp_path), entries)
+    moods = mood_store.read_store(str(tmp_path))
+    assert moods.entries() == entries
+    assert moods.irregular_rows() == [0, 1, 2]
+
+
+def test_out_of_order_append_rewrites_in_timestamp_order(tmp_path):
+    mood_store.append_entries(str(tmp_path), [_mood(1), _mood(5)])
+    before = mood_store.generation_path(str(tmp_path))
+    mood_store.append_entries(str(tmp_path), [_mood(3, "Angry")])
+    assert mood_store.generation_path(str(tmp_path)) != before
+    assert [e["timestamp"][:10] for e in mood_store.read_store(str(tmp_path)).entries()] == ["2025-01-01", "2025-01-03", "2025-01-05"]
+
+
+def test_append_reads_only_the_last_row(tmp_path):
+    mood_store.append_entries(str(tmp_path), [_mood(1 + day % 28, description="x" * 100) for day in range(28)])
+    read = metrics.counters.get("bytes_read", 0)
+    mood_store.append_entries(str(tmp_path), [_mood(28)])
+    assert metrics.counters.get("bytes_read", 0) - read == 16 # Last timestamp and description end
+    assert len(mood_store.read_store(str(tmp_path))) == 29
+
+
+def test_torn_append_is_ignored_and_trimmed(tmp_path):
+    mood_store.append_entries(str(tmp_path), [_mood(1)])
+    path = mood_store.generation_path(str(tmp_path))
+    # An append that crashed half-way through writing its timestamp
+    with open(os.path.join(path, "codes.u8"), "ab") as file:
+        file.write(bytes([1]))
+    with open(os.path.join(path, mood_store.DESCRIPTIONS_FILE), "ab") as file:
+        file.write(b"lost")
+    with open(os.path.join(path, "desc_ends.u64"), "ab") as file:
+        file.write((13).to_bytes(8, "little"))
+    with open(os.path.join(path, "timestamps.i64"), "ab") as file:
+        file.write(b"\x00\x01\x02\x03")
+    assert mood_store.read_store(str(tmp_path)).entries() == [_mood(1)]
+    mood_store.append_entries(str(tmp_path), [_mood(2, "Excited", "next")])
+    mood_store.append_entries(str(tmp_path), [_mood(3)])
+    assert mood_store.read_store(str(tmp_path)).entries() == [_mood(1), _mood(2, "Excited", "next"), _mood(3)]
+    assert os.path.getsize(os.path.join(path, "timestamps.i64")) == 3 * 8
@@ -0,0 +1,43 @@
+import json
+
+from storage.ndjson import export_ndjson, import_ndjson
+
+GOAL = {"id": "g1", "title": "Run", "description": "", "due_date": None, "status": "To Do"}
+MOOD = {"timestamp": "2025-01-01T09:00:00", "mood_text": "Happy", "mood_emoji": "😀", "description": ""}
+JOURNAL = {"id": "j1", "timestamp": "2025-01-01T21:00:00", "content": "good day"}
+
+
+def _write(path, records):
+    with open(path, "w") as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+
+
+def test_export_import_round_trip(backend, workdir):
+    backend.create_user("alice", "secret", "alice@example.com")
+    backend.upsert_goal("alice", GOAL)
+    backend.append_mood("alice", MOOD)
+    backend.append_journal("alice", JOURNAL)
+    path = str(workdir / "backup.ndjson")
+    assert export_ndjson(backend, path)["invalid"] == 0
+    _write(path, [dict(json.loads(line), username="bob") for line in open(path)]) # Import it back as another user
+    stats = import_ndjson(backend, path)
+    assert (stats["users"], stats["goals"], stats["moods"], stats["journals"], stats["invalid"]) == (1, 1, 1, 1, 0)
+    assert backend.list_goals("bob") == [GOAL]
+    assert backend.list_moods("bob") == [MOOD] and backend.list_journals("bob") == [JOURNAL]
+
+
+def test_accept_invalid_skips_records_the_backend_cannot_store(backend, workdir):
+    path = str(workdir / "backup.ndjson")
+    _write(path, [
+        {"type": "user", "username": "alice", "password": "secret", "email": ""},
+        {"type": "goal", "username": "alice", "goal": {"id": "g0"}}, # Nothing but an id
+        {"type": "goal", "username": "alice", "goal": dict(GOAL, status="Someday")}, # Invalid, but storable
+        {"type": "journal", "username": "alice", "entry": {"timestamp": "2025-01-01T21:00:00"}},
+        {"type": "journal", "username": "alice", "entry": JOURNAL}
+    ])
+    stats = import_ndjson(backend, path, accept_invalid=True)
+    assert stats["invalid"] == 3 and stats["goals"] == 1 and stats["journals"] == 1
+    assert backend.list_goals("alice") == [dict(GOAL, status="Someday")]
+    with open(f"{path}.rejects") as file:
+        assert len(file.readlines()) == 3 # Every invalid record is reported, imported or not
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from reflection import ReflectionCache, ReflectionService, ReflectionTimeout, StubClient
+
+REPLY = "one two three four five"
+
+
+@pytest.fixture
+def make_service(tmp_path):
+    def make(**stub):
+        client = StubClient(reply=lambda entry: REPLY, **stub)
+        return ReflectionService(client_factory=lambda: client, cache=ReflectionCache(str(tmp_path / "cache.sqlite"))), client
+    return make
+
+
+def test_chunks_arrive_before_the_reply_is_complete(make_service):
+    service, client = make_service(chunk_delay=0.05)
+    start = time.perf_counter()
+    stream = service.stream("entry")
+    assert next(stream) == "one "
+    assert time.perf_counter() - start < 0.1 # The other four chunks are still on their way
+    assert "".join(stream) == "two three four five"
+    assert service.cache.get(service.cache_key("entry")) == REPLY
+    assert list(service.stream("entry")) == [REPLY] and client.calls == 1 # From the cache
+
+
+def test_timeout_keeps_the_partial_output_but_does_not_cache_it(make_service):
+    service, client = make_service(chunk_delay=0.1)
+    parts = []
+    with pytest.raises(ReflectionTimeout):
+        for part in service.stream("entry", timeout=0.25):
+            parts.append(part)
+    assert parts and "".join(parts) != REPLY
+    assert service.cache.get(service.cache_key("entry")) is None
+
+
+def test_stopping_early_stops_the_call(make_service):
+    service, client = make_service(chunk_delay=0.05)
+    stream = service.stream("entry")
+    next(stream)
+    stream.close() # What Streamlit does when it reruns the script mid-stream
+    time.sleep(0.2)
+    assert service._streams == {}
+    assert service.cache.get(service.cache_key("entry")) is None # Partial text is never cached
+    assert "".join(service.stream("entry")) == REPLY and client.calls == 2
+
+
+def test_concurrent_identical_streams_share_one_call(make_service):
+    service, client = make_service(latency=0.1, chunk_delay=0.02)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append("".join(service.stream("entry")))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [REPLY] * 3
+    assert client.calls == 1 and service.stats()["joined"] == 2
+
+
+def test_errors_reach_every_reader(make_service):
+    service, client = make_service()
+
+    def fail(entry):
+        time.sleep(0.1) # Long enough for the second reader to join
+        return 1 / 0
+
+    client.reply = fail
+    errors = []
+
+    def read():
+        try:
+            list(service.stream("entry"))
+        except ZeroDivisionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 2 and client.calls == 1
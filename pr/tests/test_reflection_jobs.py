@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from reflection import ReflectionCache, ReflectionService, StubClient
+from reflection_jobs import QueueFull, RateLimiter, ReflectionQueue
+
+
+def _entry(n):
+    return {"id": f"j{n}", "timestamp": f"2025-01-{n:02d}T21:00:00", "content": f"entry {n}"}
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(gate=None, **options):
+        def reply(entry):
+            if gate is not None:
+                gate.wait(5) # Holds every job as running until the test lets go
+            return f"reflection on {entry}"
+
+        client = StubClient(reply=reply)
+        service = ReflectionService(client_factory=lambda: client, cache=ReflectionCache(str(tmp_path / "cache.sqlite")))
+        queue = ReflectionQueue(service, workers=1, limiter=RateLimiter(rate=0), **options)
+        queues.append(queue)
+        return queue, client
+
+    yield make
+    for queue in queues:
+        queue.shutdown()
+
+
+def test_results_are_attached_to_their_entries(backend, make_queue):
+    backend.create_user("alice", "secret", "")
+    for n in (1, 2):
+        backend.append_journal("alice", _entry(n))
+    queue, client = make_queue()
+    assert queue.backfill(backend, "alice") == 2
+    assert queue.join(5)
+    reflections = backend.get_reflections("alice")
+    assert {key: value["text"] for key, value in reflections.items()} == {"j1": "reflection on entry 1", "j2": "reflection on entry 2"}
+    assert queue.status("alice") == {} and queue.stats()["completed"] == 2
+    assert queue.backfill(backend, "alice") == 0 # Nothing left to do
+
+
+def test_pending_entry_is_not_queued_twice(backend, make_queue):
+    backend.create_user("alice", "secret", "")
+    gate = threading.Event()
+    queue, client = make_queue(gate)
+    assert queue.submit(backend, "alice", _entry(1)) == queue.submit(backend, "alice", _entry(1)) == "j1"
+    assert queue.pending("alice") == 1
+    gate.set()
+    assert queue.join(5) and client.calls == 1
+
+
+def test_per_user_cap(backend, make_queue):
+    for username in ("alice", "bob"):
+        backend.create_user(username, "secret", "")
+    gate = threading.Event()
+    queue, client = make_queue(gate, max_pending_per_user=2)
+    for n in (1, 2, 3):
+        backend.append_journal("alice", _entry(n))
+    queue.submit(backend, "alice", _entry(1))
+    queue.submit(backend, "alice", _entry(2))
+    with pytest.raises(QueueFull):
+        queue.submit(backend, "alice", _entry(3))
+    with pytest.raises(QueueFull):
+        queue.backfill(backend, "alice") # Entry 3 is left, but nothing fits: not the same as nothing to do
+    queue.submit(backend, "bob", _entry(1)) # Other users aren't held up
+    gate.set()
+    assert queue.join(5) and queue.backfill(backend, "alice") == 1
+
+
+def test_rate_limiter_paces_calls_after_a_burst():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(rate=2, burst=3, clock=lambda: now[0], sleep=sleep)
+    assert [limiter.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire() == pytest.approx(0.5) and limiter.acquire() == pytest.approx(0.5)
+    now[0] += 10 # An idle spell refills the bucket, but only up to the burst
+    assert [limiter.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire() == pytest.approx(0.5)
+    assert sleeps == [pytest.approx(0.5)] * 3
@@ -0,0 +1,44 @@
+from search import JournalIndex, get_journal_index, index_journal_entry, journal_index_version
+
+
+def _entry(n, content, timestamp=None):
+    return {"id": f"j{n}", "timestamp": timestamp or f"2025-01-{n:02d}T09:00:00", "content": content}
+
+
+def _save(backend, entry):
+    previous = journal_index_version(backend, "alice")
+    backend.append_journal("alice", entry)
+    index_journal_entry(backend, "alice", entry, previous)
+
+
+def _found(index, query):
+    return sorted(entry["id"] for entry in index.search(query, per_page=100)[0])
+
+
+def test_saved_entry_is_folded_into_the_loaded_index(backend):
+    backend.create_user("alice", "secret", "")
+    backend.append_journal("alice", _entry(1, "walked the dog"))
+    index = get_journal_index(backend, "alice")
+    _save(backend, _entry(2, "the dog slept"))
+    assert get_journal_index(backend, "alice") is index # Folded in, not rebuilt
+    assert _found(index, "dog") == ["j1", "j2"]
+
+
+def test_entry_saved_elsewhere_in_between_is_not_lost(backend):
+    backend.create_user("alice", "secret", "")
+    backend.append_journal("alice", _entry(1, "walked the dog"))
+    get_journal_index(backend, "alice")
+    backend.append_journal("alice", _entry(2, "dog park")) # Another session or process, which can't fold into our index
+    _save(backend, _entry(3, "dog again"))
+    assert _found(get_journal_index(backend, "alice"), "dog") == ["j1", "j2", "j3"]
+
+
+def test_date_filter_compares_times_and_skips_missing_timestamps():
+    index = JournalIndex()
+    index.add(_entry(1, "tea", "2025-01-01T23:30:00"))
+    index.add(_entry(2, "tea", "2025-01-02T08:00:00+02:00"))
+    index.add({"id": "j3", "timestamp": None, "content": "tea"})
+    index.add({"id": "j4", "timestamp": "yesterday", "content": "tea"})
+    results, total = index.search("tea", start="2025-01-02", end="2025-01-03")
+    assert [entry["id"] for entry in results] == ["j2"] and total == 1
+    assert _found(index, "tea") == ["j1", "j2", "j3", "j4"] # Without a range they still match
@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from storage.writer import GroupCommitWriter, read_json
+
+
+def _within(fn, seconds=5):
+    """Runs fn on another thread and fails the test, instead of hanging it, if it doesn't return in time."""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start() # A daemon, so a stuck call can't keep pytest from exiting
+    return future.result(timeout=seconds)
+
+
+def test_update_json_applies_mutations(tmp_path):
+    writer = GroupCommitWriter()
+    path = str(tmp_path / "sub" / "doc.json")
+    writer.update_json(path, lambda doc: {"n": 1})
+    writer.update_json(path, lambda doc: dict(doc, n=doc["n"] + 1))
+    assert read_json(path) == {"n": 2}
+
+
+def test_unreadable_file_fails_only_its_own_jobs(tmp_path):
+    writer = GroupCommitWriter()
+    bad = tmp_path / "bad.json"
+    bad.write_bytes(b"\xff\xfe")
+    with pytest.raises(UnicodeDecodeError):
+        _within(lambda: writer.update_json(str(bad), lambda doc: {"n": 1}))
+    good = str(tmp_path / "good.json")
+    _within(lambda: writer.update_json(good, lambda doc: {"n": 1})) # The writer thread is still there
+    assert read_json(good) == {"n": 1}
+
+
+def test_a_failing_batch_resolves_every_caller(tmp_path, monkeypatch):
+    writer = GroupCommitWriter()
+
+    def broken(batch):
+        raise RuntimeError("disk on fire")
+
+    monkeypatch.setattr(writer, "_commit_batch", broken)
+    with pytest.raises(RuntimeError):
+        _within(lambda: writer.update_json(str(tmp_path / "doc.json"), lambda doc: {"n": 1}))
+    monkeypatch.undo()
+    _within(lambda: writer.append(str(tmp_path / "log.jsonl"), {"timestamp": "2025-01-01T00:00:00", "content": "ok"}))